@@ -0,0 +1,206 @@
+#library imports
+from collections import OrderedDict
+import numpy as np
+import os
+import re
+import time
+
+def normalize_question(question):
+    """
+    Normalizes a question before it is used as cache key: lower case, without punctuation and repeated whitespace.
+
+    Args:
+        question (str): question string
+
+    Return:
+        str: normalized question
+    """
+
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+class answer_cache():
+    """
+    This class is used to cache answers by normalized question, falling back to a nearest-neighbour lookup over cached question embeddings.
+
+    Attributes:
+        max_entries: The maximum number of cached answers per endpoint, the least recently used answer is dropped first.
+        ttl: The number of seconds an answer stays valid.
+        similarity_threshold: The cosine similarity above which the answer of a cached question is reused.
+        index_version_file: The file touched by index_in_es after reindexing, all answers are dropped when it changes.
+
+    Methods:
+        normalize: This method is used to normalize a question before it is used as cache key.
+        get: This method is used to look up the answer of the exact same (normalized) question.
+        get_similar: This method is used to look up the answer of the most similar cached question.
+        put: This method is used to cache an answer.
+        clear: This method is used to drop all cached answers.
+        stats: This method is used to report hit and miss counts and the latency saved.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, similarity_threshold=0.97, index_version_file=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.index_version_file = index_version_file
+
+        # endpoint -> OrderedDict of normalized question -> entry
+        self.entries = {}
+
+        # endpoint -> (list of normalized questions, matrix of their unit length embeddings), rebuilt lazily
+        self.embedding_index = {}
+
+        self.index_version = self.read_index_version()
+        self.counts = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "latency_saved_seconds": 0.0}
+
+    def normalize(self, question):
+        return normalize_question(question)
+
+    def read_index_version(self):
+        if self.index_version_file is None:
+            return None
+        try:
+            stat = os.stat(self.index_version_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def check_index_version(self):
+        '''
+        Drop all cached answers if the document index has been rebuilt since they were cached.
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+
+        index_version = self.read_index_version()
+        if index_version != self.index_version:
+            self.clear()
+            self.index_version = index_version
+
+    def hit(self, entry, kind):
+        self.counts[kind] += 1
+        self.counts["latency_saved_seconds"] += entry["compute_seconds"]
+        return entry["answer"]
+
+    def get(self, endpoint, question):
+        '''
+        Look up the answer of the exact same (normalized) question.
+
+        Args:
+            endpoint (str): Name of the endpoint the answer was generated by.
+            question (str): question string.
+
+        Returns:
+            str: Cached answer, None on a miss.
+        '''
+
+        self.check_index_version()
+
+        entries = self.entries.get(endpoint)
+        key = self.normalize(question)
+        if not entries or key not in entries:
+            return None
+
+        entry = entries[key]
+        if time.time() - entry["created"] > self.ttl:
+            self.remove(endpoint, key)
+            return None
+
+        entries.move_to_end(key)
+        return self.hit(entry, "exact_hits")
+
+    def get_similar(self, endpoint, embedding):
+        '''
+        Look up the answer of the cached question with the most similar embedding.
+
+        Args:
+            endpoint (str): Name of the endpoint the answer was generated by.
+            embedding (np.ndarray): Question embedding from the DPR query encoder.
+
+        Returns:
+            str: Cached answer if the similarity is above the threshold, None otherwise.
+        '''
+
+        entries = self.entries.get(endpoint)
+        if embedding is None or not entries:
+            self.counts["misses"] += 1
+            return None
+
+        if endpoint not in self.embedding_index:
+            keys = list(entries.keys())
+            self.embedding_index[endpoint] = (keys, np.stack([entries[key]["embedding"] for key in keys]))
+        keys, matrix = self.embedding_index[endpoint]
+
+        similarities = matrix @ self.unit(embedding)
+        best = int(np.argmax(similarities))
+        key = keys[best]
+
+        if similarities[best] < self.similarity_threshold:
+            self.counts["misses"] += 1
+            return None
+
+        entry = entries[key]
+        if time.time() - entry["created"] > self.ttl:
+            self.remove(endpoint, key)
+            self.counts["misses"] += 1
+            return None
+
+        entries.move_to_end(key)
+        return self.hit(entry, "semantic_hits")
+
+    def put(self, endpoint, question, embedding, answer, compute_seconds):
+        '''
+        Cache an answer.
+
+        Args:
+            endpoint (str): Name of the endpoint the answer was generated by.
+            question (str): question string.
+            embedding (np.ndarray): Question embedding from the DPR query encoder.
+            answer (str): Generated answer.
+            compute_seconds (float): Time it took to generate the answer, reported as saved on every hit.
+
+        Returns:
+            None
+        '''
+
+        self.check_index_version()
+
+        entries = self.entries.setdefault(endpoint, OrderedDict())
+        key = self.normalize(question)
+
+        entries[key] = {
+            "answer": answer,
+            "embedding": self.unit(embedding),
+            "created": time.time(),
+            "compute_seconds": compute_seconds
+        }
+        entries.move_to_end(key)
+
+        # drop the least recently used answers
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+        self.embedding_index.pop(endpoint, None)
+
+    def remove(self, endpoint, key):
+        self.entries[endpoint].pop(key, None)
+        self.embedding_index.pop(endpoint, None)
+
+    def clear(self):
+        self.entries = {}
+        self.embedding_index = {}
+
+    def unit(self, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def stats(self):
+        lookups = self.counts["exact_hits"] + self.counts["semantic_hits"] + self.counts["misses"]
+        return {
+            **self.counts,
+            "hit_rate": (lookups - self.counts["misses"]) / lookups if lookups else 0.0,
+            "entries": sum(len(entries) for entries in self.entries.values())
+        }
@@ -0,0 +1,65 @@
+# library imports
+from latency_stats import latency_stats
+from answer_selection import best_answer, top_document, span_window, NO_CONTEXT_ANSWER
+
+class answer_router():
+    """
+    This class is used to answer directly with the reader span when the reader is confident, and to send only uncertain questions to the answer generator.
+
+    Attributes:
+        confidence_threshold: The reader confidence at or above which the extractive answer is returned as is.
+        context_window: The number of characters around the answer span passed to the generator, 0 passes the whole document.
+        latencies: Counts and recent latencies of the requests per endpoint and route.
+
+    Methods:
+        route: This method is used to decide how a pipeline prediction is answered.
+        record: This method is used to record the latency of a routed request.
+        stats: This method is used to report the count, share and latency of every route.
+    """
+
+    def __init__(self, confidence_threshold=0.9, context_window=600, latency_window=1000):
+        self.confidence_threshold = confidence_threshold
+        self.context_window = context_window
+        self.latencies = latency_stats(latency_window)
+        self.routes = {}
+
+    def route(self, prediction):
+        '''
+        Decide how a prediction of the retriever and reader pipeline is answered.
+
+        Args:
+            prediction (dict): pipeline output with "answers" and "documents"
+
+        Returns:
+            str: "extractive" if the reader answer is returned, "generative" if the generator has to answer, "no_context" if nothing was retrieved
+            str: the answer for "extractive" and "no_context", the context for the generator for "generative"
+        '''
+
+        answer, document = best_answer(prediction.get("answers", []), prediction["documents"])
+
+        # the reader is confident, its span is the answer
+        if answer is not None and (answer.score or 0) >= self.confidence_threshold and answer.answer.strip():
+            return "extractive", answer.answer
+
+        # the reader is uncertain, generate from the text around its best span
+        if answer is not None:
+            return "generative", span_window(document.content, answer, self.context_window)
+
+        # the reader found nothing, generate from the best retrieved document
+        document = top_document(prediction["documents"])
+        if document is not None:
+            return "generative", document.content
+
+        return "no_context", NO_CONTEXT_ANSWER
+
+    def record(self, endpoint, route, seconds):
+        self.routes.setdefault(endpoint, set()).add(route)
+        self.latencies.record((endpoint, route), seconds)
+
+    def stats(self):
+        stats = {}
+        for endpoint, routes in self.routes.items():
+            summaries = {route: self.latencies.summary((endpoint, route)) for route in routes}
+            total = sum(summary["count"] for summary in summaries.values())
+            stats[endpoint] = {route: {**summary, "share": summary["count"] / total} for route, summary in summaries.items()}
+        return {"confidence_threshold": self.confidence_threshold, "context_window": self.context_window, "endpoints": stats}
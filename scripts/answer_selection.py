@@ -0,0 +1,109 @@
+# default answer when retrieval finds no document to answer from
+NO_CONTEXT_ANSWER = "Sorry, I could not find any information about that on the Duke websites."
+
+def top_document(documents):
+    """
+    Returns the retrieved document with the highest score.
+
+    Args:
+        documents (list): haystack Documents returned by the retriever
+
+    Return:
+        haystack.Document: highest scoring document, None if there are no documents
+    """
+
+    best = None
+    for document in documents:
+        if best is None or (document.score or 0) > (best.score or 0):
+            best = document
+    return best
+
+def best_answer(answers, documents):
+    """
+    Returns the highest confidence reader answer that points to a retrieved document, and that document.
+
+    The documents are indexed by id, so the join costs one dictionary lookup per answer.
+
+    Args:
+        answers (list): haystack Answers returned by the reader
+        documents (list): haystack Documents returned by the retriever
+
+    Return:
+        haystack.Answer: best answer, None if no answer points to a retrieved document
+        haystack.Document: document of the best answer, None if there is no best answer
+    """
+
+    documents_by_id = {document.id: document for document in documents}
+
+    best, best_document = None, None
+    for answer in answers:
+        document = documents_by_id.get(answer.document_ids[0]) if answer.document_ids else None
+        if document is not None and (best is None or (answer.score or 0) > (best.score or 0)):
+            best, best_document = answer, document
+
+    return best, best_document
+
+def answer_document(answers, documents):
+    """
+    Returns the document the highest confidence reader answer was extracted from.
+
+    When the reader returns no answers, or none of them points to a retrieved document,
+    the highest scoring retrieved document is returned instead.
+
+    Args:
+        answers (list): haystack Answers returned by the reader
+        documents (list): haystack Documents returned by the retriever
+
+    Return:
+        haystack.Document: document of the best answer, None if there are no documents
+    """
+
+    _, document = best_answer(answers, documents)
+    return document if document is not None else top_document(documents)
+
+def span_window(content, answer, window_chars):
+    """
+    Returns the text around the span of an extractive answer, widened to whole words.
+
+    Args:
+        content (str): text of the document the answer was extracted from
+        answer (haystack.Answer): extractive answer with its offsets in the document
+        window_chars (int): number of characters kept on each side of the span, 0 keeps the whole document
+
+    Return:
+        str: window of the document around the answer span
+    """
+
+    if not window_chars or not answer.offsets_in_document:
+        return content
+
+    span = answer.offsets_in_document[0]
+    start = max(0, span.start - window_chars)
+    end = min(len(content), span.end + window_chars)
+
+    # do not cut words in half
+    if start > 0:
+        start = content.rfind(" ", 0, start) + 1
+    if end < len(content):
+        end = content.find(" ", end)
+        end = len(content) if end == -1 else end
+
+    return content[start:end]
+
+def select_context(prediction):
+    """
+    Returns the context passed to answer generation for a pipeline prediction.
+
+    Args:
+        prediction (dict): output of a retriever-only or retriever and reader pipeline
+
+    Return:
+        str: content of the selected document, None if nothing was retrieved
+    """
+
+    if prediction.get("answers"):
+        document = answer_document(prediction["answers"], prediction["documents"])
+    else:
+        document = top_document(prediction["documents"])
+
+    return document.content if document is not None else None
@@ -0,0 +1,93 @@
+# library imports
+from haystack.schema import Document, Answer
+import pandas as pd
+import argparse
+import random
+import timeit
+
+from answer_selection import select_context
+
+def make_prediction(rng, documents_count=10, answers_count=5):
+    """
+    Function to build a pipeline prediction like the ones of the retriever and reader pipeline.
+
+    Args:
+        rng (random.Random): random number generator
+        documents_count (int): number of retrieved documents
+        answers_count (int): number of reader answers
+
+    Returns:
+        dict: prediction with "documents" and "answers"
+    """
+
+    documents = [Document(content=f"passage {i} " * 50, score=1 - i / documents_count) for i in range(documents_count)]
+    answers = [
+        Answer(answer=f"answer {i}", type="extractive", score=rng.random(), context="", document_ids=[rng.choice(documents).id])
+        for i in range(answers_count)
+    ]
+    answers.sort(key=lambda answer: answer.score, reverse=True)
+    return {"documents": documents, "answers": answers}
+
+def pandas_select_v0(prediction):
+    """
+    The previous chat_v0 path: sort the documents by score in a DataFrame and take the first one.
+    """
+
+    answers = pd.DataFrame([i.to_dict() for i in prediction["documents"]])
+    answers.sort_values(by="score", ascending=False, inplace=True)
+    return answers["content"].head(1).values[0]
+
+def pandas_select_v1(prediction):
+    """
+    The previous chat_v1 and chat_v2 path: merge answers and documents in DataFrames and take the first row.
+    The merge keeps the order of the documents, so this is the best retrieved document with an answer, not the document of the best answer.
+    """
+
+    answers = pd.DataFrame([i.to_dict() for i in prediction["answers"]])
+    answers['document_ids'] = answers['document_ids'].apply(lambda x: x[0])
+    documents = pd.DataFrame([i.to_dict() for i in prediction["documents"]])
+    merge = pd.merge(documents, answers, left_on="id", right_on="document_ids", how="inner")
+    return merge["content"].head(1).values[0]
+
+def benchmark(predictions_count, repeat):
+    """
+    Function to compare the time per call of the pandas paths and select_context, and how often both select the same context.
+
+    Args:
+        predictions_count (int): number of random predictions
+        repeat (int): number of timing runs, the fastest one is reported
+
+    Returns:
+        pd.DataFrame: microseconds per call and share of identical selections
+    """
+
+    rng = random.Random(42)
+    predictions = [make_prediction(rng) for _ in range(predictions_count)]
+    retriever_predictions = [{"documents": prediction["documents"]} for prediction in predictions]
+
+    def time_per_call(select, inputs):
+        seconds = min(timeit.repeat(lambda: [select(prediction) for prediction in inputs], number=1, repeat=repeat))
+        return seconds / len(inputs) * 1e6
+
+    def same_context(pandas_select, inputs):
+        return sum(pandas_select(prediction) == select_context(prediction) for prediction in inputs) / len(inputs)
+
+    results = pd.DataFrame([
+        {"path": "chat_v0", "pandas_us": time_per_call(pandas_select_v0, retriever_predictions), "select_context_us": time_per_call(select_context, retriever_predictions), "same_context": same_context(pandas_select_v0, retriever_predictions)},
+        {"path": "chat_v1/chat_v2", "pandas_us": time_per_call(pandas_select_v1, predictions), "select_context_us": time_per_call(select_context, predictions), "same_context": same_context(pandas_select_v1, predictions)}
+    ])
+    results["speedup"] = results["pandas_us"] / results["select_context_us"]
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_answer_selection',
+                    description='This script compares the time to select the answer context with pandas and with the answer selection module.')
+    parser.add_argument('--predictions', type=int, default=200, help='Number of random predictions')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing runs, the fastest one is reported')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the benchmark and print the results
+    print(benchmark(args.predictions, args.repeat).round(1).to_string())
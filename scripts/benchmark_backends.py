@@ -0,0 +1,185 @@
+# library imports
+from haystack.nodes import DensePassageRetriever, FARMReader
+from collections import Counter
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+import time
+from tqdm import tqdm
+
+from helper_functions import get_elasticsearch_document_store, ONNX_INTRA_OP_THREADS
+from answer_selection import top_document
+from benchmark_retrieval import load_labels, recall_at_k
+from t5_qa import t5_qa
+from onnx_backend import t5_qa_onnx, onnx_query_encoder, load_onnx_reader
+
+logging.getLogger("haystack").setLevel(logging.ERROR)
+
+def timed(fn, *args, **kwargs):
+    """
+    Function to call a function and measure how long it takes.
+
+    Args:
+        fn (function): function to call
+        *args: positional arguments of the function
+        **kwargs: keyword arguments of the function
+
+    Returns:
+        return value of the function
+        float: time in milliseconds
+    """
+
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def token_f1(prediction, reference):
+    """
+    Function to get the SQuAD style token overlap F1 of two answers.
+
+    Args:
+        prediction (str): answer to score
+        reference (str): answer to compare with
+
+    Returns:
+        float: F1 between 0 and 1
+    """
+
+    prediction_tokens, reference_tokens = prediction.lower().split(), reference.lower().split()
+    common = sum((Counter(prediction_tokens) & Counter(reference_tokens)).values())
+    if not prediction_tokens or not reference_tokens or common == 0:
+        return float(prediction_tokens == reference_tokens)
+    precision, recall = common / len(prediction_tokens), common / len(reference_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+def top_answer(prediction):
+    """
+    Function to get the text of the best reader answer.
+
+    Args:
+        prediction (dict): reader prediction
+
+    Returns:
+        str: answer text, "" if there is no answer
+    """
+
+    answers = [answer for answer in prediction["answers"] if answer.answer]
+    return max(answers, key=lambda answer: answer.score or 0).answer if answers else ""
+
+def compare(test_questions_file_path, labels_file_path, data_directory, intra_op_threads):
+    """
+    Function to run the DPR question encoder, the reader and T5 with the PyTorch and the ONNX backend on the test questions.
+    Both backends get the same documents and contexts, so only the model differs.
+
+    Args:
+        test_questions_file_path (str): Path to the .csv file containing the test questions
+        labels_file_path (str): Path to the .csv file with the relevant sources of the test questions
+        data_directory (str): Directory where the scraped webpages are stored
+        intra_op_threads (int): Number of threads a single ONNX operator may use, 0 uses all cores
+
+    Returns:
+        pd.DataFrame: answers, agreement and latency of both backends per question
+    """
+
+    questions = pd.read_csv(test_questions_file_path).iloc[:, 0].tolist()
+    labels = load_labels(labels_file_path, data_directory)
+
+    # PyTorch models, as used by default
+    document_store = get_elasticsearch_document_store(os.environ.get("ELASTICSEARCH_HOST", "localhost"), "document")
+    dpr_retriever = DensePassageRetriever(
+        document_store=document_store,
+        query_embedding_model="facebook/dpr-question_encoder-single-nq-base",
+        passage_embedding_model="facebook/dpr-ctx_encoder-single-nq-base"
+    )
+    torch_reader = FARMReader(model_name_or_path="deepset/roberta-base-squad2", use_gpu=True)
+    torch_t5 = t5_qa()
+
+    # int8 ONNX models
+    onnx_dpr = onnx_query_encoder(intra_op_threads=intra_op_threads)
+    onnx_reader = load_onnx_reader(intra_op_threads=intra_op_threads)
+    onnx_t5 = t5_qa_onnx(intra_op_threads=intra_op_threads)
+
+    rows = []
+    for question in tqdm(questions):
+        row = {"questions": question}
+
+        # DPR question embeddings and the documents they retrieve
+        torch_embedding, row["dpr_torch_ms"] = timed(dpr_retriever.embed_queries, [question])
+        onnx_embedding, row["dpr_onnx_ms"] = timed(onnx_dpr.embed_queries, [question])
+        torch_documents = document_store.query_by_embedding(torch_embedding[0], top_k=10)
+        onnx_documents = document_store.query_by_embedding(onnx_embedding[0], top_k=10)
+        row["dpr_cosine"] = float(np.dot(torch_embedding[0], onnx_embedding[0]) / (np.linalg.norm(torch_embedding[0]) * np.linalg.norm(onnx_embedding[0])))
+        row["dpr_top10_overlap"] = len(set(d.id for d in torch_documents) & set(d.id for d in onnx_documents)) / 10
+        if question in labels:
+            row["dpr_torch_recall@10"] = recall_at_k(torch_documents, labels[question], 10)
+            row["dpr_onnx_recall@10"] = recall_at_k(onnx_documents, labels[question], 10)
+
+        # reader answers on the same documents
+        torch_prediction, row["reader_torch_ms"] = timed(torch_reader.predict, query=question, documents=torch_documents, top_k=5)
+        onnx_prediction, row["reader_onnx_ms"] = timed(onnx_reader.predict, query=question, documents=torch_documents, top_k=5)
+        row["reader_torch_answer"], row["reader_onnx_answer"] = top_answer(torch_prediction), top_answer(onnx_prediction)
+        row["reader_f1"] = token_f1(row["reader_onnx_answer"], row["reader_torch_answer"])
+
+        # T5 answers on the same context, beam search and greedy decoding in PyTorch and greedy decoding in ONNX
+        document = top_document(torch_documents)
+        context = document.content if document is not None else ""
+        row["t5_torch_answer"], row["t5_torch_ms"] = timed(torch_t5.generate_answer, question, context)
+        row["t5_torch_greedy_answer"], row["t5_torch_greedy_ms"] = timed(lambda: "".join(torch_t5.stream_answer(question, context)))
+        row["t5_onnx_answer"], row["t5_onnx_ms"] = timed(onnx_t5.generate_answer, question, context)
+        row["t5_f1"] = token_f1(row["t5_onnx_answer"], row["t5_torch_answer"])
+        row["t5_greedy_f1"] = token_f1(row["t5_onnx_answer"], row["t5_torch_greedy_answer"])
+
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+def summarize(results):
+    """
+    Function to summarize the latency and agreement of both backends per model.
+
+    Args:
+        results (pd.DataFrame): output of compare
+
+    Returns:
+        pd.DataFrame: median latency of both backends, speedup and agreement per model
+    """
+
+    agreement = {
+        "dpr": ("dpr_cosine", "dpr_top10_overlap", "dpr_torch_recall@10", "dpr_onnx_recall@10"),
+        "reader": ("reader_f1",),
+        "t5": ("t5_f1", "t5_greedy_f1")
+    }
+
+    rows = []
+    for model, columns in agreement.items():
+        row = {
+            "model": model,
+            "torch_p50_ms": results[f"{model}_torch_ms"].median(),
+            "onnx_p50_ms": results[f"{model}_onnx_ms"].median()
+        }
+        row["speedup"] = row["torch_p50_ms"] / row["onnx_p50_ms"]
+        for column in columns:
+            row[column.split("_", 1)[1]] = results[column].mean()
+        rows.append(row)
+
+    return pd.DataFrame(rows).set_index("model")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_backends',
+                    description='This script compares the accuracy and latency of the PyTorch and the int8 ONNX Runtime backend for DPR, the reader and T5 on the test questions.')
+    parser.add_argument('test_questions_file_path', type=str, help='Path to the .csv file containing the test questions')
+    parser.add_argument('--labels_file_path', type=str, default="../performance_testing/retrieval_labels.csv", help='Path to the .csv file with the relevant sources of the test questions')
+    parser.add_argument('--data_directory', type=str, default="../data", help='Directory where the scraped webpages are stored')
+    parser.add_argument('--intra_op_threads', type=int, default=ONNX_INTRA_OP_THREADS, help='Number of threads a single ONNX operator may use, 0 uses all cores')
+    parser.add_argument('--output_file_path', type=str, default="../performance_testing/backend_comparison.csv", help='Path to the .csv file the answers of both backends are saved to')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # compare the backends, save the answers and print the summary
+    results = compare(args.test_questions_file_path, args.labels_file_path, args.data_directory, args.intra_op_threads)
+    results.to_csv(args.output_file_path, index=False)
+    print(summarize(results).round(3).to_string())
@@ -0,0 +1,88 @@
+# library imports
+import pandas as pd
+import argparse
+import time
+
+from corpus_reader import list_corpus_files, read_files
+
+def load_with_concat(files):
+    """
+    Function to load files the way index_in_es used to, growing a DataFrame with pd.concat for every file.
+
+    Args:
+        files (list): Paths of the text files
+
+    Returns:
+        pd.DataFrame: Text of the files
+    """
+
+    i = 0
+    for file in files:
+        with open(file) as f:
+                text = f.read()
+        if i == 0:
+            temp = pd.DataFrame({"text": [text]})
+        else:
+            temp = pd.concat([temp, pd.DataFrame({"text": [text]})])
+        i += 1
+    return temp
+
+def load_with_reader(files, data_directory, max_workers):
+    """
+    Function to load files with the streaming corpus reader.
+
+    Args:
+        files (list): Paths of the text files
+        data_directory (str): Directory where the scraped webpages are stored
+        max_workers (int): Number of threads reading files
+
+    Returns:
+        pd.DataFrame: Path, website and text of the files
+    """
+
+    return pd.DataFrame(read_files(files, data_directory, max_workers))
+
+def benchmark(data_directory, file_counts, max_workers):
+    """
+    Function to compare the load time of both approaches for a growing number of files.
+
+    Args:
+        data_directory (str): Directory where the scraped webpages are stored
+        file_counts (list): Numbers of files to load
+        max_workers (int): Number of threads reading files
+
+    Returns:
+        pd.DataFrame: Load time in seconds per file count
+    """
+
+    all_files = list(list_corpus_files(data_directory))
+
+    results = []
+    for file_count in file_counts:
+        files = all_files[:file_count]
+
+        start = time.perf_counter()
+        load_with_concat(files)
+        concat_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_with_reader(files, data_directory, max_workers)
+        reader_seconds = time.perf_counter() - start
+
+        results.append({"files": len(files), "concat_seconds": concat_seconds, "reader_seconds": reader_seconds})
+
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_corpus_loading',
+                    description='This script compares the corpus load time of the pd.concat loop with the streaming corpus reader.')
+    parser.add_argument('data_directory', type=str, help='Directory where the scraped webpages are stored')
+    parser.add_argument('--file_counts', type=int, nargs='+', default=[500, 1000, 2000, 4000, 8000, 16000], help='Numbers of files to load')
+    parser.add_argument('--max_workers', type=int, default=8, help='Number of threads reading files')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the benchmark and print the load times
+    print(benchmark(args.data_directory, args.file_counts, args.max_workers).round(3))
@@ -0,0 +1,96 @@
+# library imports
+import pandas as pd
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from get_subpages import get_subpages, subpage_crawler
+from benchmark_execution_model import start_server
+import fixture_website
+
+def check_links(file_name, base):
+    """
+    Function to check that the saved links are exactly the links of the fixture website, all checked.
+
+    Args:
+        file_name (str): path of the json file written by the crawler
+        base (str): website link
+
+    Returns:
+        bool: True if the crawl is complete and correct
+    """
+
+    with open(file_name) as f:
+        links = json.load(f)
+    return set(links) == fixture_website.expected_links(base) and all(value == "Checked" for value in links.values())
+
+def check_resume(base, directory, interrupt_after):
+    """
+    Function to interrupt a crawl and resume it from its checkpoint.
+
+    Args:
+        base (str): website link
+        directory (str): directory for the json file
+        interrupt_after (float): seconds after which the first crawl is cancelled
+
+    Returns:
+        dict: pages checked before and after the interruption, and whether the result is complete
+    """
+
+    file_name = os.path.join(directory, "resume.json")
+    crawler = subpage_crawler(base, file_name, concurrency=4)
+    try:
+        asyncio.run(asyncio.wait_for(crawler.crawl(), interrupt_after))
+    except asyncio.TimeoutError:
+        pass
+
+    summary = get_subpages(base, file_name, resume=True)
+    return {"checked_before": crawler.checked, "checked_after_resume": summary["pages_checked"], "correct": check_links(file_name, base)}
+
+def benchmark(concurrencies, pages, latency_ms, port):
+    """
+    Function to crawl the fixture website with a growing number of concurrent requests.
+
+    Args:
+        concurrencies (list): numbers of webpages fetched at the same time, 1 fetches one page at a time like the previous crawler
+        pages (int): number of pages of the fixture website
+        latency_ms (float): response time of the fixture website
+        port (int): port of the fixture website
+
+    Returns:
+        pd.DataFrame: pages per second and correctness per concurrency
+    """
+
+    fixture_website.settings["pages"] = pages
+    fixture_website.settings["latency_ms"] = latency_ms
+    server = start_server(fixture_website.app, port)
+    base = f"http://127.0.0.1:{port}"
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for concurrency in concurrencies:
+            file_name = os.path.join(directory, f"crawl_{concurrency}.json")
+            summary = get_subpages(base, file_name, concurrency=concurrency, per_host=concurrency)
+            results.append({"concurrency": concurrency, **summary, "correct": check_links(file_name, base)})
+
+        print("resume:", check_resume(base, directory, interrupt_after=1))
+
+    server.should_exit = True
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_crawler',
+                    description='This script crawls a local fixture website, checks that every link is found and reports pages per second.')
+    parser.add_argument('--concurrencies', type=int, nargs='+', default=[1, 4, 16, 64], help='Numbers of webpages fetched at the same time')
+    parser.add_argument('--pages', type=int, default=500, help='Number of pages of the fixture website')
+    parser.add_argument('--latency_ms', type=float, default=20, help='Response time of the fixture website')
+    parser.add_argument('--port', type=int, default=8098, help='Port of the fixture website')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the benchmark and print the results
+    print(benchmark(args.concurrencies, args.pages, args.latency_ms, args.port).round(2).to_string())
@@ -0,0 +1,182 @@
+# library imports
+from fastapi import FastAPI, Request
+from starlette.responses import JSONResponse
+import pandas as pd
+import aiohttp
+import openai
+import argparse
+import asyncio
+import threading
+import time
+import uuid
+import uvicorn
+
+from chatgpt_qa import chatgpt_qa
+from openai_client import openai_client
+from inference_pool import inference_pool, server_busy
+import fake_openai_server
+
+def stub_model(question, latency_ms):
+    """
+    Stub for a pipeline or model call, sleeping releases the GIL in the same way torch does while it computes.
+
+    Args:
+        question (str): question string
+        latency_ms (float): time the call takes
+
+    Returns:
+        str: context string
+    """
+
+    time.sleep(latency_ms / 1000)
+    return f"Context for: {question}"
+
+def build_app(mode, model_latency_ms, pool):
+    """
+    Function to build a chat app with a stubbed model and the stubbed OpenAI service.
+
+    Args:
+        mode (str): "inline" calls the model and OpenAI on the event loop, "pooled" uses the inference pool and the async client
+        model_latency_ms (float): time a model call takes
+        pool (inference_pool): inference pool used in "pooled" mode
+
+    Returns:
+        FastAPI: app
+    """
+
+    app = FastAPI()
+    chatgpt_qa_obj = chatgpt_qa("fake-key", openai_client("fake-key", api_base="http://127.0.0.1:8099/v1"))
+
+    @app.exception_handler(server_busy)
+    async def server_busy_handler(request: Request, exc: server_busy):
+        return JSONResponse(content={"message": "server busy, please try again later"}, status_code=503)
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    @app.get("/chat_v2/{question}")
+    async def chat_v2(question: str):
+        if mode == "inline":
+            context = stub_model(question, model_latency_ms)
+            answer = chatgpt_qa_obj.generate_answer(question, context)
+        else:
+            context = await pool.run(stub_model, question, model_latency_ms)
+            answer = await chatgpt_qa_obj.generate_answer_async(question, context)
+        return {"id": str(uuid.uuid4()), "choices": [{"text": answer}]}
+
+    return app
+
+def start_server(app, port):
+    """
+    Function to start a uvicorn server in a background thread.
+
+    Args:
+        app (FastAPI): app to serve
+        port (int): port to listen on
+
+    Returns:
+        uvicorn.Server: server, set should_exit to stop it
+    """
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def run_load(port, concurrency, duration):
+    """
+    Function to send requests from concurrent clients and probe the responsiveness of the event loop at the same time.
+
+    Args:
+        port (int): port of the app
+        concurrency (int): number of concurrent clients
+        duration (float): length of the test in seconds
+
+    Returns:
+        dict: throughput, latency percentiles and error counts
+    """
+
+    latencies, ping_latencies, statuses = [], [], []
+    deadline = time.perf_counter() + duration
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+
+        async def client(i):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                async with session.get(f"http://127.0.0.1:{port}/chat_v2/question {i}") as response:
+                    await response.read()
+                    statuses.append(response.status)
+                if response.status == 200:
+                    latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            # a trivial endpoint, like the auth middleware, should not wait for model calls
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                async with session.get(f"http://127.0.0.1:{port}/ping") as response:
+                    await response.read()
+                ping_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(probe(), *[client(i) for i in range(concurrency)])
+
+    latencies, ping_latencies = pd.Series(latencies) * 1000, pd.Series(ping_latencies) * 1000
+    return {
+        "throughput_rps": len(latencies) / duration,
+        "p50_ms": latencies.quantile(0.5),
+        "p99_ms": latencies.quantile(0.99),
+        "ping_p99_ms": ping_latencies.quantile(0.99),
+        "rejected_503": statuses.count(503),
+        "errors": sum(status not in (200, 503) for status in statuses)
+    }
+
+def benchmark(concurrency, duration, model_latency_ms, openai_latency_ms, workers, max_pending):
+    """
+    Function to compare inline blocking calls with the inference pool and async OpenAI client.
+
+    Args:
+        concurrency (int): number of concurrent clients
+        duration (float): length of each test in seconds
+        model_latency_ms (float): time a stubbed model call takes
+        openai_latency_ms (float): time the stubbed OpenAI service takes
+        workers (int): inference pool workers
+        max_pending (int): inference pool queue length
+
+    Returns:
+        pd.DataFrame: results of both execution models
+    """
+
+    # start the stubbed OpenAI service and point the client at it
+    fake_openai_server.settings["latency_ms"] = openai_latency_ms
+    openai_server = start_server(fake_openai_server.app, 8099)
+    openai.api_base = "http://127.0.0.1:8099/v1"
+
+    results = {}
+    for port, mode in [(8061, "inline"), (8062, "pooled")]:
+        pool = inference_pool(max_workers=workers, max_pending=max_pending)
+        server = start_server(build_app(mode, model_latency_ms, pool), port)
+        results[mode] = asyncio.run(run_load(port, concurrency, duration))
+        server.should_exit = True
+
+    openai_server.should_exit = True
+    return pd.DataFrame(results).T
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_execution_model',
+                    description='This script load tests blocking calls on the event loop against the inference pool using a stubbed model and a stubbed OpenAI service.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='Length of each test in seconds')
+    parser.add_argument('--model_latency_ms', type=float, default=100, help='Time a stubbed model call takes')
+    parser.add_argument('--openai_latency_ms', type=float, default=500, help='Time the stubbed OpenAI service takes')
+    parser.add_argument('--workers', type=int, default=2, help='Inference pool workers')
+    parser.add_argument('--max_pending', type=int, default=16, help='Inference pool queue length')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the load test and print the results
+    print(benchmark(args.concurrency, args.duration, args.model_latency_ms, args.openai_latency_ms, args.workers, args.max_pending).round(1))
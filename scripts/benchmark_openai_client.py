@@ -0,0 +1,206 @@
+# library imports
+import pandas as pd
+import numpy as np
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from chatgpt_qa import chatgpt_qa
+from openai_client import openai_client, circuit_breaker
+from benchmark_execution_model import start_server
+import fake_openai_server
+
+# failures injected by the fake OpenAI service, settings of the client and what has to hold afterwards
+SCENARIOS = [
+    {
+        "name": "healthy",
+        "fake": {},
+        "client": {},
+        "check": lambda result: result["openai"] == result["requests"] and result["retries"] == 0
+    },
+    {
+        "name": "30% server errors",
+        "fake": {"error_rate": 0.3, "error_status": 500},
+        "client": {},
+        "check": lambda result: result["openai"] >= 0.95 * result["requests"] and result["retries"] > 0 and result["opened"] == 0
+    },
+    {
+        "name": "30% rate limited",
+        "fake": {"error_rate": 0.3, "error_status": 429},
+        "client": {},
+        "check": lambda result: result["openai"] >= 0.95 * result["requests"] and result["retries"] > 0 and result["opened"] == 0
+    },
+    {
+        "name": "5% slow, no hedging",
+        "fake": {"slow_rate": 0.05, "slow_ms": 2000},
+        "client": {"hedge": False},
+        "check": lambda result: result["openai"] == result["requests"]
+    },
+    {
+        "name": "5% slow, hedging",
+        "fake": {"slow_rate": 0.05, "slow_ms": 2000},
+        "client": {"hedge": True, "hedge_min_ms": 0},
+        "check": lambda result: result["openai"] == result["requests"] and result["hedge_wins"] > 0 and result["over_1s"] < 0.03 * result["requests"]
+    },
+    {
+        "name": "outage",
+        "fake": {"error_rate": 1.0, "error_status": 503},
+        "client": {},
+        "check": lambda result: result["fallback"] == result["requests"] and result["opened"] > 0 and result["attempts"] < result["requests"]
+    },
+    {
+        "name": "hanging upstream",
+        "fake": {"slow_rate": 1.0, "slow_ms": 10000},
+        "client": {"timeout": 0.5, "deadline": 1.0},
+        "check": lambda result: result["fallback"] == result["requests"] and result["max_ms"] < 1500
+    },
+    {
+        "name": "outage, streaming",
+        "fake": {"error_rate": 1.0, "error_status": 503},
+        "client": {},
+        "stream": True,
+        "check": lambda result: result["fallback"] == result["requests"] and result["opened"] > 0
+    },
+    {
+        "name": "30% server errors, streaming",
+        "fake": {"error_rate": 0.3, "error_status": 500},
+        "client": {},
+        "stream": True,
+        "check": lambda result: result["openai"] >= 0.95 * result["requests"] and result["opened"] == 0
+    }
+]
+
+FALLBACK_ANSWER = "fallback answer"
+
+async def fallback(question, context):
+    await asyncio.sleep(0.01)
+    return FALLBACK_ANSWER
+
+async def stream_fallback(question, context):
+    await asyncio.sleep(0.01)
+    for token in FALLBACK_ANSWER.split(" "):
+        yield token + " "
+
+async def run_requests(chatgpt_qa_obj, requests, concurrency, stream):
+    """
+    Function to ask questions from concurrent clients and record how every answer was generated and how long it took.
+
+    Args:
+        chatgpt_qa_obj (chatgpt_qa): answer generator with the client under test
+        requests (int): number of questions
+        concurrency (int): number of concurrent clients
+        stream (bool): stream the answers
+
+    Returns:
+        list: source ("openai", "fallback" or "error") and latency in seconds of every answer
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if stream:
+                    answer = "".join([token async for token in chatgpt_qa_obj.stream_answer_async(f"question {i}", "context", fallback=stream_fallback)])
+                else:
+                    answer = await chatgpt_qa_obj.generate_answer_async(f"question {i}", "context", fallback=fallback)
+                source = "fallback" if answer.strip() == FALLBACK_ANSWER else "openai"
+            except Exception:
+                source = "error"
+            return source, time.perf_counter() - start
+
+    return await asyncio.gather(*[ask(i) for i in range(requests)])
+
+async def run_scenario(scenario, port, requests, concurrency, latency_ms, seed):
+    """
+    Function to run a scenario with a new client, and check what has to hold afterwards.
+
+    Args:
+        scenario (dict): injected failures, settings of the client and the check
+        port (int): port of the fake OpenAI service
+        requests (int): number of questions
+        concurrency (int): number of concurrent clients
+        latency_ms (float): latency of the fake OpenAI service without injected slowness
+        seed (int): seed of the injected failures and of the backoff jitter
+
+    Returns:
+        dict: answers by source, latency percentiles, client counts and whether the check passed
+    """
+
+    fake_openai_server.settings.update({"latency_ms": latency_ms, "token_latency_ms": 0, "error_rate": 0.0, "slow_rate": 0.0, "slow_ms": 0})
+    fake_openai_server.settings.update(scenario["fake"])
+
+    # every scenario gets the same failures in every run
+    fake_openai_server.rng.seed(seed)
+    random.seed(seed)
+
+    # short backoff, so that the scenarios finish quickly
+    settings = {"backoff_base": 0.05, "backoff_max": 0.5, "breaker": circuit_breaker(reset_timeout=30), **scenario["client"]}
+    client = openai_client("fake-key", api_base=f"http://127.0.0.1:{port}/v1", **settings)
+    chatgpt_qa_obj = chatgpt_qa("fake-key", client)
+
+    answers = await run_requests(chatgpt_qa_obj, requests, concurrency, scenario.get("stream", False))
+    await chatgpt_qa_obj.close()
+
+    sources = [source for source, _ in answers]
+    latencies = np.array([seconds for _, seconds in answers]) * 1000
+    stats = client.stats()
+    result = {
+        "scenario": scenario["name"],
+        "requests": requests,
+        "openai": sources.count("openai"),
+        "fallback": sources.count("fallback"),
+        "error": sources.count("error"),
+        "p50_ms": np.percentile(latencies, 50),
+        "p99_ms": np.percentile(latencies, 99),
+        "max_ms": latencies.max(),
+        "over_1s": int((latencies > 1000).sum()),
+        **{name: stats[name] for name in ["attempts", "retries", "timeouts", "hedges", "hedge_wins"]},
+        "opened": stats["breaker"]["opened"],
+        "rejected": stats["breaker"]["rejected"]
+    }
+    result["passed"] = bool(scenario["check"](result))
+    return result
+
+def benchmark(port, requests, concurrency, latency_ms, seed=0):
+    """
+    Function to run every scenario against the fake OpenAI service.
+
+    Args:
+        port (int): port of the fake OpenAI service
+        requests (int): number of questions per scenario
+        concurrency (int): number of concurrent clients
+        latency_ms (float): latency of the fake OpenAI service without injected slowness
+        seed (int): seed of the injected failures and of the backoff jitter
+
+    Returns:
+        pd.DataFrame: result of every scenario
+    """
+
+    openai_server = start_server(fake_openai_server.app, port)
+    try:
+        results = [asyncio.run(run_scenario(scenario, port, requests, concurrency, latency_ms, seed)) for scenario in SCENARIOS]
+    finally:
+        openai_server.should_exit = True
+    return pd.DataFrame(results).set_index("scenario")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_openai_client',
+                    description='This script checks the retries, hedging, circuit breaker and T5 fallback of the OpenAI client against a fake OpenAI service that injects errors and latency.')
+    parser.add_argument('--port', type=int, default=8099, help='Port of the fake OpenAI service')
+    parser.add_argument('--requests', type=int, default=200, help='Number of questions per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients')
+    parser.add_argument('--latency_ms', type=float, default=100, help='Latency of the fake OpenAI service without injected slowness')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the injected failures and of the backoff jitter')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the scenarios, print the results and fail if a check did not hold
+    results = benchmark(args.port, args.requests, args.concurrency, args.latency_ms, args.seed)
+    print(results.round(1).to_string())
+    sys.exit(0 if results["passed"].all() else 1)
@@ -0,0 +1,187 @@
+# library imports
+from haystack.nodes import BM25Retriever, DensePassageRetriever, FARMReader
+import pandas as pd
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from tqdm import tqdm
+
+from helper_functions import get_elasticsearch_document_store, get_faiss_document_store, DOCUMENT_STORE
+from corpus_reader import read_corpus
+from inference_pool import inference_pool
+from hybrid_retrieval import hybrid_retriever
+
+logging.getLogger("haystack").setLevel(logging.ERROR)
+
+def load_labels(labels_file_path, data_directory):
+    """
+    Function to load the relevant source files of the test questions. The same page is often scraped from several
+    websites (e.g. news posts), so every labelled file stands for the group of files with exactly the same text.
+
+    Args:
+        labels_file_path (str): Path to the .csv file with the questions and their relevant sources separated by "|"
+        data_directory (str): Directory where the scraped webpages are stored
+
+    Returns:
+        dict: question to a list of groups of equivalent source paths, without the sources missing from the corpus
+    """
+
+    labels = pd.read_csv(labels_file_path)
+
+    # group the files of the corpus by the hash of their text
+    files_by_hash, hash_by_file = {}, {}
+    for record in read_corpus(data_directory):
+        text_hash = hashlib.sha1(record["text"].encode("utf-8")).hexdigest()
+        files_by_hash.setdefault(text_hash, set()).add(record["path"])
+        hash_by_file[record["path"]] = text_hash
+
+    # a labelled source that is not in the current scrape is skipped, a question without any source left is dropped
+    relevant = {}
+    for row in labels.itertuples():
+        groups = []
+        for source in row.relevant_sources.split("|"):
+            if source in hash_by_file:
+                groups.append(files_by_hash[hash_by_file[source]])
+            else:
+                print(f"WARNING: {source} is not in {data_directory}, skipped")
+        if groups:
+            relevant[row.questions] = groups
+        else:
+            print(f"WARNING: no relevant source of {row.questions!r} is in {data_directory}, question dropped")
+    if not relevant:
+        raise ValueError(f"None of the labelled sources of {labels_file_path} is in {data_directory}")
+    return relevant
+
+def retrievers():
+    """
+    Function to initialize the BM25 and DPR retrievers and the reader in the same way as the chatbot.
+
+    Args:
+        None
+
+    Returns:
+        BM25Retriever: sparse retriever
+        DensePassageRetriever: dense retriever
+        FARMReader: reader
+    """
+
+    document_store = get_elasticsearch_document_store(os.environ.get("ELASTICSEARCH_HOST", "localhost"), "document")
+    dense_document_store = get_faiss_document_store() if DOCUMENT_STORE == "faiss" else document_store
+
+    bm25_retriever = BM25Retriever(document_store=document_store)
+    dpr_retriever = DensePassageRetriever(
+        document_store=dense_document_store,
+        query_embedding_model="facebook/dpr-question_encoder-single-nq-base",
+        passage_embedding_model="facebook/dpr-ctx_encoder-single-nq-base"
+    )
+    reader = FARMReader(model_name_or_path="deepset/roberta-base-squad2", use_gpu=True)
+
+    return bm25_retriever, dpr_retriever, reader
+
+def recall_at_k(documents, groups, k):
+    """
+    Function to get the share of relevant groups that have a document among the first k documents.
+
+    Args:
+        documents (list): retrieved documents, best first
+        groups (list): groups of equivalent relevant source paths
+
+    Returns:
+        float: recall at k
+    """
+
+    sources = set(document.meta.get("source") for document in documents[:k])
+    return sum(1 for group in groups if group & sources) / len(groups)
+
+async def retrieve(retrieve_fn, question, top_k):
+    """
+    Function to retrieve the documents of a question with one retrieval mode and time it.
+
+    Args:
+        retrieve_fn (function): async function that takes a question and top_k and returns ranked documents
+        question (str): question string
+        top_k (int): number of documents returned
+
+    Returns:
+        list: retrieved documents
+        float: retrieval time in seconds
+    """
+
+    start = time.perf_counter()
+    documents = await retrieve_fn(question, top_k)
+    return documents, time.perf_counter() - start
+
+def benchmark(labels_file_path, data_directory, ks, hybrid_top_k, reader_documents, with_reader):
+    """
+    Function to compare recall@k and latency of BM25, DPR and their reciprocal-rank fusion over the labelled test questions.
+
+    Args:
+        labels_file_path (str): Path to the .csv file with the relevant sources of the test questions
+        data_directory (str): Directory where the scraped webpages are stored
+        ks (list): cut-offs of the recall
+        hybrid_top_k (int): number of documents every retriever returns to the fusion
+        reader_documents (dict): retrieval mode to the number of documents passed to the reader
+        with_reader (bool): also time the reader on the documents of every mode
+
+    Returns:
+        pd.DataFrame: mean recall@k, hit@k and median and p95 latency per retrieval mode
+    """
+
+    labels = load_labels(labels_file_path, data_directory)
+    bm25_retriever, dpr_retriever, reader = retrievers()
+    pool = inference_pool(max_workers=2, max_pending=16)
+
+    # every retriever runs on the pool, as in the chatbot
+    retrieve_fns = {
+        "bm25": lambda question, top_k: pool.run(bm25_retriever.retrieve, query=question, top_k=top_k),
+        "dpr": lambda question, top_k: pool.run(dpr_retriever.retrieve, query=question, top_k=top_k)
+    }
+    retrieve_fns["hybrid"] = hybrid_retriever([retrieve_fns["bm25"], retrieve_fns["dpr"]], top_k=hybrid_top_k).retrieve
+    depth = max(ks + list(reader_documents.values()))
+
+    rows = []
+    for question, groups in tqdm(labels.items()):
+        for mode, retrieve_fn in retrieve_fns.items():
+            documents, seconds = asyncio.run(retrieve(retrieve_fn, question, depth))
+            row = {"mode": mode, "question": question, "retrieval_ms": seconds * 1000}
+            for k in ks:
+                row[f"recall@{k}"] = recall_at_k(documents, groups, k)
+                row[f"hit@{k}"] = float(row[f"recall@{k}"] > 0)
+
+            # the reader runs on the documents the chatbot would give it
+            if with_reader:
+                start = time.perf_counter()
+                reader.predict(query=question, documents=documents[:reader_documents[mode]], top_k=5)
+                row["reader_ms"] = (time.perf_counter() - start) * 1000
+            rows.append(row)
+
+    results = pd.DataFrame(rows)
+    summary = results.drop(columns="question").groupby("mode").mean()
+    summary["retrieval_p50_ms"] = results.groupby("mode")["retrieval_ms"].median()
+    summary["retrieval_p95_ms"] = results.groupby("mode")["retrieval_ms"].quantile(0.95)
+    summary["reader_documents"] = pd.Series(reader_documents)
+    return summary.rename(columns={"retrieval_ms": "retrieval_mean_ms"})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_retrieval',
+                    description='This script compares recall@k and latency of BM25, DPR and hybrid retrieval with reciprocal-rank fusion over the labelled test questions.')
+    parser.add_argument('--labels_file_path', type=str, default="../performance_testing/retrieval_labels.csv", help='Path to the .csv file with the relevant sources of the test questions')
+    parser.add_argument('--data_directory', type=str, default="../data", help='Directory where the scraped webpages are stored')
+    parser.add_argument('--ks', type=int, nargs="+", default=[1, 3, 5, 10], help='Cut-offs of the recall')
+    parser.add_argument('--hybrid_top_k', type=int, default=int(os.environ.get("HYBRID_RETRIEVER_TOP_K", 10)), help='Number of documents every retriever returns to the fusion')
+    parser.add_argument('--hybrid_reader_documents', type=int, default=int(os.environ.get("HYBRID_READER_DOCUMENTS", 5)), help='Number of fused documents passed to the reader')
+    parser.add_argument('--reader', action='store_true', help='Also time the reader on the documents of every retrieval mode')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # bm25 and dpr pass their top 10 to the reader, as in chat_v0 and chat_v1
+    reader_documents = {"bm25": 10, "dpr": 10, "hybrid": args.hybrid_reader_documents}
+
+    # run the benchmark and print the results
+    summary = benchmark(args.labels_file_path, args.data_directory, args.ks, args.hybrid_top_k, reader_documents, args.reader)
+    print(summary.round(3).to_string())
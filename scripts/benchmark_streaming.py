@@ -0,0 +1,144 @@
+# library imports
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+import pandas as pd
+import aiohttp
+import openai
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from chatgpt_qa import chatgpt_qa
+from openai_client import openai_client
+from latency_stats import latency_stats
+from streaming import sse_answer
+from benchmark_execution_model import start_server
+import fake_openai_server
+
+def build_app(stats):
+    """
+    Function to build a chat app with the blocking and the streaming ChatGPT endpoint, without retrieval.
+
+    Args:
+        stats (latency_stats): records the time to first token of the streaming endpoint
+
+    Returns:
+        FastAPI: app
+    """
+
+    app = FastAPI()
+    chatgpt_qa_obj = chatgpt_qa("fake-key", openai_client("fake-key", api_base="http://127.0.0.1:8099/v1"))
+
+    @app.get("/chat_v2/{question}")
+    async def chat_v2(question: str):
+        answer = await chatgpt_qa_obj.generate_answer_async(question, "context")
+        return {"id": str(uuid.uuid4()), "choices": [{"text": answer}]}
+
+    @app.get("/chat_v2_stream/{question}")
+    async def chat_v2_stream(question: str):
+        tokens = chatgpt_qa_obj.stream_answer_async(question, "context")
+        return StreamingResponse(sse_answer(tokens, stats, "chat_v2_stream", time.perf_counter()), media_type="text/event-stream")
+
+    return app
+
+async def read_response(session, url, stream):
+    """
+    Function to send a request and time the first piece of the answer and the complete answer.
+
+    Args:
+        session (aiohttp.ClientSession): client session
+        url (str): endpoint url
+        stream (bool): the endpoint sends server-sent events
+
+    Returns:
+        dict: time to first token and total time in milliseconds, and the answer of the final envelope
+    """
+
+    start = time.perf_counter()
+    first_token = None
+    async with session.get(url) as response:
+        if not stream:
+            body = await response.json()
+            total = time.perf_counter() - start
+            return {"ttft_ms": total * 1000, "total_ms": total * 1000, "answer": body["choices"][0]["text"]}
+
+        event = None
+        async for line in response.content:
+            line = line.decode().strip()
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event == "answer":
+                    answer = data["choices"][0]["text"]
+    total = time.perf_counter() - start
+    return {"ttft_ms": first_token * 1000, "total_ms": total * 1000, "answer": answer}
+
+async def run_requests(port, requests):
+    """
+    Function to time the blocking and the streaming endpoint one request at a time.
+
+    Args:
+        port (int): port of the app
+        requests (int): number of requests per endpoint
+
+    Returns:
+        pd.DataFrame: timings per request and endpoint
+    """
+
+    results = []
+    async with aiohttp.ClientSession() as session:
+        for i in range(requests):
+            for endpoint, stream in [("chat_v2", False), ("chat_v2_stream", True)]:
+                result = await read_response(session, f"http://127.0.0.1:{port}/{endpoint}/question {i}", stream)
+                results.append({"endpoint": endpoint, **result})
+    return pd.DataFrame(results)
+
+def benchmark(requests, openai_latency_ms, token_latency_ms):
+    """
+    Function to compare the time to first token of the blocking and the streaming endpoint against the stubbed OpenAI service.
+
+    Args:
+        requests (int): number of requests per endpoint
+        openai_latency_ms (float): time until the stubbed OpenAI service sends the first token
+        token_latency_ms (float): time between streamed tokens
+
+    Returns:
+        pd.DataFrame: median time to first token and total time per endpoint, and whether both endpoints return the same answers
+    """
+
+    # start the stubbed OpenAI service and point the client at it
+    fake_openai_server.settings["latency_ms"] = openai_latency_ms
+    fake_openai_server.settings["token_latency_ms"] = token_latency_ms
+    openai_server = start_server(fake_openai_server.app, 8099)
+    openai.api_base = "http://127.0.0.1:8099/v1"
+
+    stats = latency_stats()
+    server = start_server(build_app(stats), 8063)
+    results = asyncio.run(run_requests(8063, requests))
+    server.should_exit = True
+    openai_server.should_exit = True
+
+    summary = results.groupby("endpoint")[["ttft_ms", "total_ms"]].median()
+    answers = results.pivot_table(index=results.index // 2, columns="endpoint", values="answer", aggfunc="first")
+    summary["same_answers"] = (answers["chat_v2"] == answers["chat_v2_stream"]).all()
+    print("server side:", stats.stats())
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_streaming',
+                    description='This script compares the time to first token of the blocking and the streaming ChatGPT endpoint using a stubbed OpenAI service.')
+    parser.add_argument('--requests', type=int, default=20, help='Number of requests per endpoint')
+    parser.add_argument('--openai_latency_ms', type=float, default=500, help='Time until the stubbed OpenAI service sends the first token')
+    parser.add_argument('--token_latency_ms', type=float, default=20, help='Time between streamed tokens')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the benchmark and print the results
+    print(benchmark(args.requests, args.openai_latency_ms, args.token_latency_ms).round(1).to_string())
@@ -0,0 +1,115 @@
+# library imports
+import pandas as pd
+import argparse
+import random
+import time
+import os
+from tqdm import tqdm
+
+from t5_qa import t5_qa
+
+def sample_contexts(data_directory, n, context_words=250, seed=42):
+    """
+    Function to sample contexts of roughly the size of an indexed chunk from the scraped webpages.
+
+    Args:
+        data_directory (str): Directory where the scraped webpages are stored
+        n (int): Number of contexts to sample
+        context_words (int): Number of words in each context
+        seed (int): Random seed
+
+    Returns:
+        list: List of context strings
+    """
+
+    # list all text files of the scraped websites
+    files = []
+    for root, _, file_names in os.walk(data_directory):
+        files.extend(os.path.join(root, file_name) for file_name in file_names if file_name.endswith(".txt"))
+    files.sort()
+
+    # pick a random window of words from random files
+    rng = random.Random(seed)
+    contexts = []
+    while len(contexts) < n:
+        with open(rng.choice(files)) as f:
+            words = f.read().split()
+        if len(words) < context_words // 2:
+            continue
+        start = rng.randint(0, max(0, len(words) - context_words))
+        contexts.append(" ".join(words[start:start + context_words]))
+
+    return contexts
+
+def time_answers(t5_qa_obj, questions, contexts):
+    """
+    Function to time the answer generation of every question.
+
+    Args:
+        t5_qa_obj (t5_qa): t5_qa object
+        questions (list): List of questions
+        contexts (list): List of contexts
+
+    Returns:
+        pd.Series: Latency of every question in milliseconds
+    """
+
+    latencies = []
+    for question, context in tqdm(zip(questions, contexts), total=len(questions)):
+        start = time.perf_counter()
+        t5_qa_obj.generate_answer(question, context)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return pd.Series(latencies)
+
+def benchmark(test_questions_file_path, data_directory, context_words):
+    """
+    Function to compare the latency of padding every input to the maximum length with length-aware bucketed padding.
+
+    Args:
+        test_questions_file_path (str): Path to the .csv file containing the test questions
+        data_directory (str): Directory where the scraped webpages are stored
+        context_words (int): Number of words in each context
+
+    Returns:
+        pd.DataFrame: p50 and p99 latency in milliseconds of both encode paths
+    """
+
+    # read test questions and pair each of them with a context
+    questions = pd.read_csv(test_questions_file_path).iloc[:, 0].astype(str).tolist()
+    contexts = sample_contexts(data_directory, len(questions), context_words)
+
+    t5_qa_obj = t5_qa()
+    length_buckets = t5_qa_obj.length_buckets
+
+    # warm up the model so that the first measured call does not pay for lazy initialization
+    t5_qa_obj.generate_answer(questions[0], contexts[0])
+
+    results = {}
+
+    # pad every input to max_length, which was the previous behaviour
+    t5_qa_obj.length_buckets = [t5_qa_obj.max_length]
+    results["max_length"] = time_answers(t5_qa_obj, questions, contexts)
+
+    # pad to the nearest length bucket
+    t5_qa_obj.length_buckets = length_buckets
+    results["bucketed"] = time_answers(t5_qa_obj, questions, contexts)
+
+    return pd.DataFrame({
+        name: {"p50_ms": latencies.quantile(0.5), "p99_ms": latencies.quantile(0.99), "mean_ms": latencies.mean()}
+        for name, latencies in results.items()
+        }).T
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_t5',
+                    description='This script compares the T5 answer latency of max_length padding with length-aware bucketed padding.')
+    parser.add_argument('test_questions_file_path', type=str, help='Path to the .csv file containing the test questions')
+    parser.add_argument('data_directory', type=str, help='Directory where the scraped webpages are stored')
+    parser.add_argument('--context_words', type=int, default=250, help='Number of words in each sampled context')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the benchmark and print the latency percentiles
+    print(benchmark(args.test_questions_file_path, args.data_directory, args.context_words).round(1))
@@ -0,0 +1,226 @@
+# library imports
+import pandas as pd
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.parse
+
+def child_pids(pid):
+    """
+    Function to get the ids of the direct child processes of a process.
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        list: ids of the child processes
+    """
+
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the parent id follows the command name, which is in parentheses and may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+def memory_mb(pid):
+    """
+    Function to get the memory of a process. RSS counts shared pages fully in every process, PSS divides them between
+    the processes sharing them, so the PSS of all processes adds up to the memory actually used, and USS only counts
+    the pages of the process alone.
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        dict: RSS, PSS and USS in MB
+    """
+
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+
+    return {
+        "rss_mb": values["Rss"],
+        "pss_mb": values["Pss"],
+        "uss_mb": values["Private_Clean"] + values["Private_Dirty"]
+    }
+
+async def wait_until_ready(port, workers, timeout):
+    """
+    Function to wait until the readiness endpoint of the server answers 200 on enough new connections in a row that
+    every worker has most likely answered.
+
+    Args:
+        port (int): port of the server
+        workers (int): number of worker processes
+        timeout (float): seconds to wait at most
+
+    Returns:
+        float: seconds until the server was ready
+    """
+
+    start = time.perf_counter()
+    ready = 0
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True)) as session:
+        while time.perf_counter() - start < timeout:
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/readyz") as response:
+                    ready = ready + 1 if response.status == 200 else 0
+            except aiohttp.ClientError:
+                ready = 0
+            if ready >= 8 * workers:
+                return time.perf_counter() - start
+            await asyncio.sleep(0.05 if ready else 0.5)
+
+    raise TimeoutError(f"server on port {port} not ready after {timeout} seconds")
+
+async def run_load(port, endpoint, questions, api_key, concurrency, duration):
+    """
+    Function to send requests from concurrent clients, each sending its next question as soon as it has its answer.
+
+    Args:
+        port (int): port of the server
+        endpoint (str): endpoint the questions are sent to, e.g. "chat_v1"
+        questions (list): url quoted questions sent in turn
+        api_key (str): api key of the server
+        concurrency (int): number of concurrent clients
+        duration (float): length of the test in seconds
+
+    Returns:
+        dict: throughput, latency percentiles and error count
+    """
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0), headers={"api-key": api_key}) as session:
+
+        async def client(i):
+            nonlocal errors
+            j = i
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                async with session.get(f"http://127.0.0.1:{port}/{endpoint}/{questions[j % len(questions)]}") as response:
+                    await response.read()
+                if response.status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+                j += concurrency
+
+        await asyncio.gather(*[client(i) for i in range(concurrency)])
+
+    latencies = pd.Series(latencies, dtype=float) * 1000
+    return {
+        "throughput_rps": len(latencies) / duration,
+        "p50_ms": latencies.quantile(0.5),
+        "p99_ms": latencies.quantile(0.99),
+        "errors": errors
+    }
+
+def benchmark_server(shared, workers, port, endpoint, questions, api_key, concurrency, duration, startup_timeout):
+    """
+    Function to start the server with serve.py, load test it and measure the memory of its processes after the test,
+    when the pages the workers wrote to have been copied.
+
+    Args:
+        shared (bool): share the model weights between the workers
+        workers (int): number of worker processes
+        port (int): port of the server
+        endpoint (str): endpoint the questions are sent to
+        questions (list): url quoted questions sent in turn
+        api_key (str): api key of the server
+        concurrency (int): number of concurrent clients
+        duration (float): length of the test in seconds
+        startup_timeout (float): seconds to wait at most for the models to load
+
+    Returns:
+        dict: startup time, memory and throughput of the server
+    """
+
+    # answer every question again, so that the models and not the answer cache or coalescing are measured
+    env = dict(os.environ, ANSWER_CACHE_SIZE="0", SINGLE_FLIGHT="0")
+    command = [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers)] + (["--shared"] if shared else [])
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        result = {"mode": "shared" if shared else "per_worker", "workers": workers}
+        result["startup_s"] = asyncio.run(wait_until_ready(port, workers, startup_timeout))
+        result.update(asyncio.run(run_load(port, endpoint, questions, api_key, concurrency, duration)))
+
+        parent = memory_mb(server.pid)
+        worker_memory = pd.DataFrame([memory_mb(pid) for pid in child_pids(server.pid)])
+        result["parent_pss_mb"] = parent["pss_mb"]
+        result["worker_rss_mb"] = worker_memory["rss_mb"].mean()
+        result["worker_pss_mb"] = worker_memory["pss_mb"].mean()
+        result["worker_uss_mb"] = worker_memory["uss_mb"].mean()
+        result["total_pss_mb"] = parent["pss_mb"] + worker_memory["pss_mb"].sum()
+        return result
+
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+def benchmark(test_questions_file_path, worker_counts, endpoint, concurrency, duration, startup_timeout, port):
+    """
+    Function to compare the memory and throughput of workers with their own models and workers sharing the weights.
+
+    Args:
+        test_questions_file_path (str): Path to the .csv file containing the test questions
+        worker_counts (list): numbers of worker processes to test
+        endpoint (str): endpoint the questions are sent to
+        concurrency (int): number of concurrent clients
+        duration (float): length of each test in seconds
+        startup_timeout (float): seconds to wait at most for the models to load
+        port (int): port of the servers
+
+    Returns:
+        pd.DataFrame: startup time, memory and throughput per mode and number of workers
+    """
+
+    questions = [urllib.parse.quote(str(question), safe="") for question in pd.read_csv(test_questions_file_path).iloc[:, 0]]
+    with open("../config.json") as f:
+        api_key = json.load(f)["api_key"]
+
+    results = []
+    for workers in worker_counts:
+        for shared in (False, True):
+            results.append(benchmark_server(shared, workers, port, endpoint, questions, api_key, concurrency, duration, startup_timeout))
+
+    return pd.DataFrame(results).set_index(["mode", "workers"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='benchmark_workers',
+                    description='This script compares the memory per worker and the throughput of workers with their own models and workers sharing the model weights.')
+    parser.add_argument('test_questions_file_path', type=str, help='Path to the .csv file containing the test questions')
+    parser.add_argument('--workers', type=str, default="1,2,4", help='Comma separated numbers of worker processes to test')
+    parser.add_argument('--endpoint', type=str, default="chat_v1", help='Endpoint the questions are sent to')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=60, help='Length of each test in seconds')
+    parser.add_argument('--startup_timeout', type=float, default=600, help='Seconds to wait at most for the models to load')
+    parser.add_argument('--port', type=int, default=8063, help='Port of the servers')
+
+    # parse arguments
+    args = parser.parse_args()
+    worker_counts = [int(workers) for workers in args.workers.split(",")]
+
+    # run the benchmark and print the results
+    print(benchmark(args.test_questions_file_path, worker_counts, args.endpoint, args.concurrency, args.duration, args.startup_timeout, args.port).round(1).to_string())
@@ -0,0 +1,313 @@
+# library imports
+from collections import Counter
+import argparse
+import random
+import json
+import re
+import os
+
+from corpus_reader import list_corpus_files, read_files, read_corpus
+
+# html tags, html entities and urls, as removed by the texthero remove_angle_brackets, remove_html_tags and remove_urls steps
+MARKUP_PATTERN = r"<[^<>]*>|<[^>]+>|&(?:[a-z0-9]+|#[0-9]{1,6}|#x[0-9a-f]{1,6});|http\S+"
+
+def normalize_whitespace(text):
+    """
+    Replaces non-breaking spaces and collapses all whitespace into single spaces.
+
+    Args:
+        text (str): text to normalize
+
+    Return:
+        str: normalized text
+    """
+
+    return " ".join(text.replace("\xa0", " ").split())
+
+def find_repeated_spans(texts, shingle_size=8, min_fraction=0.05, min_pages=5, min_words=20):
+    """
+    Finds word sequences repeated across the pages of one website, such as navigation menus, headers and footers.
+
+    Every sequence of shingle_size words that appears on enough pages is marked, maximal runs of marked words
+    form candidate spans, and candidates that appear verbatim on enough pages are kept.
+
+    Args:
+        texts (list): whitespace normalized texts of pages of the same website
+        shingle_size (int): number of words in an n-gram
+        min_fraction (float): fraction of pages an n-gram has to appear on
+        min_pages (int): minimum number of pages an n-gram and a span have to appear on
+        min_words (int): minimum number of words in a span
+
+    Return:
+        list: repeated spans, longest first
+    """
+
+    # identical copies of a page (e.g. the same page under several urls) would make their whole text look repeated
+    pages = [text.split(" ") for text in sorted(set(texts))]
+    threshold = max(min_pages, min_fraction * len(pages))
+
+    # count on how many pages every n-gram appears
+    shingle_counts = Counter()
+    for words in pages:
+        shingle_counts.update(set(tuple(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)))
+    repeated_shingles = set(shingle for shingle, count in shingle_counts.items() if count >= threshold)
+    del shingle_counts
+
+    # grow maximal runs of words covered by repeated n-grams
+    span_counts = Counter()
+    for words in pages:
+        covered = [False] * len(words)
+        for i in range(len(words) - shingle_size + 1):
+            if tuple(words[i:i + shingle_size]) in repeated_shingles:
+                covered[i:i + shingle_size] = [True] * shingle_size
+
+        spans, start = set(), None
+        for i, is_covered in enumerate(covered + [False]):
+            if is_covered and start is None:
+                start = i
+            elif not is_covered and start is not None:
+                if i - start >= min_words:
+                    spans.add(" ".join(words[start:i]))
+                start = None
+        span_counts.update(spans)
+
+    # pages with a slightly different menu (e.g. another breadcrumb) still share its start or its end
+    spans = set(frequent_paths(span_counts, min_pages, min_words)) | set(frequent_paths(span_counts, min_pages, min_words, reverse=True))
+    return sorted(spans, key=len, reverse=True)
+
+def frequent_paths(span_counts, min_pages, min_words, reverse=False):
+    """
+    Merges spans into a word trie and returns the longest prefixes (or suffixes) shared by enough pages.
+
+    Args:
+        span_counts (Counter): number of pages every span appears on
+        min_pages (int): minimum number of pages a prefix has to appear on
+        min_words (int): minimum number of words in a prefix
+        reverse (bool): return shared suffixes instead of prefixes
+
+    Return:
+        list: shared prefixes (or suffixes)
+    """
+
+    # every trie node holds the number of pages that share the path to it and its children
+    trie = {}
+    for span, count in span_counts.items():
+        words = span.split(" ")
+        node = trie
+        for word in (words[::-1] if reverse else words):
+            entry = node.setdefault(word, [0, {}])
+            entry[0] += count
+            node = entry[1]
+
+    # walk the trie without recursion, spans can be thousands of words long
+    paths = []
+    stack = [(word, entry, 1, None) for word, entry in trie.items()]
+    while stack:
+        word, (count, children), depth, parent = stack.pop()
+        if count < min_pages:
+            continue
+        path = (word, parent)
+        if depth >= min_words and not any(child_count >= min_pages for child_count, _ in children.values()):
+            words = []
+            while path is not None:
+                words.append(path[0])
+                path = path[1]
+            paths.append(" ".join(words if reverse else words[::-1]))
+        stack.extend((child_word, child_entry, depth + 1, path) for child_word, child_entry in children.items())
+
+    return paths
+
+def build_trie_pattern(phrases):
+    """
+    Builds a regular expression matching any of the phrases, with the phrases merged into a word trie so that
+    shared prefixes (most navigation menus start the same way) are only matched once.
+
+    Args:
+        phrases (list): phrases of single space separated words
+
+    Return:
+        str: regular expression, the longest phrase wins when several match at the same position
+    """
+
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for word in phrase.split(" "):
+            node = node.setdefault(word, {})
+        node[None] = True
+
+    def continuation(node):
+        # follow runs of words without branches iteratively, only branches nest groups
+        words = []
+        while None not in node and len(node) == 1:
+            word, node = next(iter(node.items()))
+            words.append(re.escape(word))
+        pattern = "".join(r"\ " + word for word in words)
+
+        children = sorted(word for word in node if word is not None)
+        if not children:
+            return pattern
+        alternatives = [re.escape(word) + continuation(node[word]) for word in children]
+        branch = r"\ " + (alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")")
+
+        # the greedy optional part makes the longest phrase win
+        return pattern + ("(?:" + branch + ")?" if None in node else branch)
+
+    alternatives = [re.escape(word) + continuation(trie[word]) for word in sorted(trie)]
+    return "(?:" + "|".join(alternatives) + ")"
+
+class boilerplate_stripper():
+    """
+    This class is used to remove markup and learned per-website boilerplate from webpages in a single regex pass per page.
+
+    Attributes:
+        patterns: Dictionary of website to list of boilerplate phrases.
+        removed: Counter of characters removed per boilerplate phrase ("<markup>" for html and urls).
+        hits: Counter of matches per boilerplate phrase.
+
+    Methods:
+        learn: This method is used to learn the boilerplate phrases of a website from a sample of its pages.
+        clean: This method is used to clean the text of a page.
+        save: This method is used to save the learned phrases to a json file.
+        load: This method is used to load phrases from a json file.
+        report: This method is used to report how much text every phrase removed.
+    """
+
+    def __init__(self, patterns=None):
+        self.patterns = {}
+        self.compiled = {}
+        self.removed = Counter()
+        self.hits = Counter()
+
+        for site, phrases in (patterns or {}).items():
+            self.set_patterns(site, phrases)
+
+    def set_patterns(self, site, phrases):
+        self.patterns[site] = phrases
+        boilerplate = r"(?P<boilerplate>(?<!\S)" + build_trie_pattern(phrases) + r"(?!\S))|" if phrases else ""
+        self.compiled[site] = re.compile(boilerplate + "(?P<markup>" + MARKUP_PATTERN + ")")
+
+    def learn(self, site, texts, **kwargs):
+        '''
+        Learn the boilerplate phrases of a website.
+
+        Args:
+            site (str): name of the website
+            texts (list): raw texts of a sample of its pages
+            **kwargs: parameters of find_repeated_spans
+
+        Returns:
+            list: learned phrases
+        '''
+
+        phrases = find_repeated_spans([normalize_whitespace(text) for text in texts], **kwargs)
+        self.set_patterns(site, phrases)
+        return phrases
+
+    def replace(self, match):
+        if match.lastgroup == "boilerplate":
+            self.removed[match.group(0)] += len(match.group(0))
+            self.hits[match.group(0)] += 1
+        else:
+            self.removed["<markup>"] += len(match.group(0))
+            self.hits["<markup>"] += 1
+        return ""
+
+    def clean(self, site, text):
+        '''
+        Clean the text of a page.
+
+        Args:
+            site (str): name of the website the page belongs to
+            text (str): raw text of the page
+
+        Returns:
+            str: cleaned text, None if the page has characters that could not be decoded
+        '''
+
+        if site not in self.compiled:
+            self.set_patterns(site, [])
+
+        text = self.compiled[site].sub(self.replace, normalize_whitespace(text))
+
+        # drop pages with characters that could not be decoded
+        if "�" in text:
+            return None
+        return text
+
+    def save(self, file_name):
+        with open(file_name, "w") as f:
+            json.dump(self.patterns, f)
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name) as f:
+            return cls(json.load(f))
+
+    def report(self, top=20):
+        '''
+        Report how much text the phrases removed.
+
+        Args:
+            top (int): number of phrases to report
+
+        Returns:
+            list: (characters removed, matches, phrase) tuples of the phrases that removed the most text
+        '''
+
+        return [(removed, self.hits[phrase], phrase) for phrase, removed in self.removed.most_common(top)]
+
+def learn_boilerplate(data_directory, site_names=None, sample_size=500, seed=42, **kwargs):
+    """
+    Learns the boilerplate phrases of every website from a random sample of its pages.
+
+    Args:
+        data_directory (str): Directory where the scraped webpages are stored
+        site_names (list): Only learn these websites, None learns all of them
+        sample_size (int): Maximum number of pages per website used for learning
+        seed (int): Random seed of the sample
+        **kwargs: parameters of find_repeated_spans
+
+    Return:
+        boilerplate_stripper: stripper with the learned phrases
+    """
+
+    files_by_site = {}
+    for file in list_corpus_files(data_directory, site_names):
+        files_by_site.setdefault(os.path.relpath(file, data_directory).split(os.sep)[0], []).append(file)
+
+    stripper = boilerplate_stripper()
+    rng = random.Random(seed)
+    for site, files in files_by_site.items():
+        sample = rng.sample(files, min(sample_size, len(files)))
+        stripper.learn(site, [record["text"] for record in read_files(sample, data_directory)], **kwargs)
+
+    return stripper
+
+if __name__ == "__main__":
+    # create parser
+    parser = argparse.ArgumentParser(
+                    prog='boilerplate',
+                    description='This script learns the boilerplate of every scraped website, and reports how much text every learned phrase removes from the corpus.')
+    parser.add_argument('data_directory', type=str, help='Directory where the scraped webpages are stored')
+    parser.add_argument('--output', type=str, default='../boilerplate_patterns.json', help='Path of the json file the learned phrases are saved to')
+    parser.add_argument('--sites', type=str, nargs='*', help='Only learn these websites, e.g. bme.duke.edu')
+    parser.add_argument('--top', type=int, default=20, help='Number of phrases to report')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # learn the boilerplate and save it
+    stripper = learn_boilerplate(args.data_directory, args.sites)
+    stripper.save(args.output)
+
+    # clean the whole corpus to measure what every phrase removes
+    total, dropped = 0, 0
+    for record in read_corpus(args.data_directory, args.sites):
+        total += len(record["text"])
+        if stripper.clean(record["site"], record["text"]) is None:
+            dropped += 1
+
+    print(f"{sum(len(phrases) for phrases in stripper.patterns.values())} phrases learned, {dropped} pages dropped for undecodable characters")
+    for removed, hits, phrase in stripper.report(args.top):
+        print(f"{removed / max(total, 1):7.2%} {hits:7d}  {phrase[:100]}")
@@ -0,0 +1,263 @@
+# library imports
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+import pandas as pd
+import argparse
+import glob
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+
+# fields logged with the answer of the request being handled, e.g. its id and the retrieved documents
+current_record = ContextVar("current_record", default=None)
+
+def begin_record(**fields):
+    """
+    Function to start the log record of a request, the tasks the request starts add to the same record.
+
+    Args:
+        **fields: fields of the record, e.g. request_id and endpoint
+
+    Returns:
+        dict: record of the request
+    """
+
+    record = dict(fields)
+    current_record.set(record)
+    return record
+
+def annotate(**fields):
+    """
+    Function to add fields to the log record of the current request, outside of a request it does nothing.
+
+    Args:
+        **fields: fields of the record, e.g. documents or route
+
+    Returns:
+        None
+    """
+
+    record = current_record.get()
+    if record is not None:
+        record.update(fields)
+
+class json_formatter(logging.Formatter):
+    """
+    This class is used to format log records as JSON lines. The fields passed as extra={"chat": {...}} are logged as
+    they are, other records are logged with their message.
+    """
+
+    def format(self, record):
+        entry = {"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(), "level": record.levelname}
+        entry.update(getattr(record, "chat", None) or {"message": record.getMessage()})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class dropping_queue_handler(QueueHandler):
+    """
+    This class is used to hand log records to the background writer without ever blocking the caller. Records are
+    dropped and counted when the writer falls too far behind.
+
+    Attributes:
+        dropped: The number of records dropped because the queue was full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def gzip_rotator(source, dest):
+    """
+    Function to compress a rotated log file.
+
+    Args:
+        source (str): path of the log file that was written so far
+        dest (str): path of the compressed file
+
+    Returns:
+        None
+    """
+
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def rotating_file_handler(path, max_bytes, when, backup_count):
+    """
+    Function to create a file handler that rotates by time if when is set, and by size otherwise, and compresses
+    the rotated files.
+
+    Args:
+        path (str): path of the log file
+        max_bytes (int): size in bytes after which the file is rotated, 0 never rotates by size
+        when (str): interval after which the file is rotated, e.g. "midnight" or "H", "" rotates by size
+        backup_count (int): number of rotated files kept
+
+    Returns:
+        logging.Handler: file handler writing JSON lines
+    """
+
+    if when:
+        handler = TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding="utf-8", utc=True)
+    else:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = gzip_rotator
+    handler.setFormatter(json_formatter())
+    return handler
+
+def start_chat_log(logger, path, max_bytes=100 * 1024 * 1024, when="", backup_count=30, queue_size=10000):
+    """
+    Function to write the records of a logger as JSON lines from a background thread. The caller only puts the record
+    on a queue, formatting, writing, rotation and compression happen on the writer thread.
+
+    Args:
+        logger (logging.Logger): logger, e.g. the chat logger
+        path (str): path of the log file
+        max_bytes (int): size in bytes after which the file is rotated, 0 never rotates by size
+        when (str): interval after which the file is rotated, e.g. "midnight", "" rotates by size
+        backup_count (int): number of rotated files kept
+        queue_size (int): number of records waiting to be written, further records are dropped
+
+    Returns:
+        QueueListener: background writer, stop it to write the remaining records before exiting
+        dropping_queue_handler: handler added to the logger, counts dropped records
+    """
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = dropping_queue_handler(log_queue)
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, rotating_file_handler(path, max_bytes, when, backup_count))
+    listener.start()
+    return listener, queue_handler
+
+def rotated_files(path):
+    """
+    Function to get a log file and its rotated files, oldest first.
+
+    Args:
+        path (str): path of the log file
+
+    Returns:
+        list: paths of the rotated files followed by the log file itself
+    """
+
+    # rotated files are named like the log file plus a number or a date and ".gz"
+    suffix = re.compile(re.escape(os.path.basename(path)) + r"\.[\w-]+\.gz$")
+    rotated = [
+        file_path for file_path in glob.glob(glob.escape(path) + ".*.gz") if suffix.match(os.path.basename(file_path))
+    ]
+    files = sorted(rotated, key=os.path.getmtime)
+    return files + ([path] if os.path.exists(path) else [])
+
+def read_file(file_path):
+    """
+    Function to stream the records of a log file, compressed or not. Lines that are not valid JSON, such as a line
+    cut short by a crash, are skipped.
+
+    Args:
+        file_path (str): path of the file
+
+    Returns:
+        generator: records as dictionaries
+    """
+
+    opener = gzip.open if file_path.endswith(".gz") else open
+    with opener(file_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def read_chat_log(pattern, endpoints=None, since=None, until=None):
+    """
+    Function to stream the records of one or more chat logs, e.g. one per worker, with their rotated files, in order
+    of time. Every file is read line by line, so the logs never have to fit into memory.
+
+    Args:
+        pattern (str): path or glob pattern of the log files, without the rotated files
+        endpoints (list): endpoints to keep, None keeps all
+        since (str): ISO time, earlier records are skipped, e.g. "2023-04-01"
+        until (str): ISO time, later records are skipped
+
+    Returns:
+        generator: records as dictionaries
+    """
+
+    paths = sorted(path for path in glob.glob(pattern) if not path.endswith(".gz"))
+
+    # every log is in order of time, so merging them keeps the order
+    streams = [itertools.chain.from_iterable(read_file(file_path) for file_path in rotated_files(path)) for path in paths]
+    for record in heapq.merge(*streams, key=lambda record: record.get("time", "")):
+        if endpoints is not None and record.get("endpoint") not in endpoints:
+            continue
+        if since is not None and record.get("time", "") < since:
+            continue
+        if until is not None and record.get("time", "") >= until:
+            continue
+        yield record
+
+def summarize(records):
+    """
+    Function to summarize the stage timings of chat log records.
+
+    Args:
+        records (iterable): chat log records
+
+    Returns:
+        pd.DataFrame: count, median and 95th percentile in milliseconds per endpoint and stage
+    """
+
+    rows = []
+    for record in records:
+        for stage, milliseconds in record.get("stages_ms", {}).items():
+            rows.append((record.get("endpoint"), stage, milliseconds))
+
+    # an empty or missing log gives an empty report
+    if not rows:
+        return pd.DataFrame(columns=["count", "50%", "95%"], index=pd.MultiIndex.from_tuples([], names=["endpoint", "stage"]), dtype=float)
+
+    timings = pd.DataFrame(rows, columns=["endpoint", "stage", "ms"])
+    return timings.groupby(["endpoint", "stage"])["ms"].describe(percentiles=[0.5, 0.95])[["count", "50%", "95%"]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='chat_logging',
+                    description='This script reads the JSON lines chat logs, including the rotated files, and summarizes the stage timings or exports the records.')
+    parser.add_argument('log_file_pattern', type=str, nargs='?', default="../chat.*.log", help='Path or glob pattern of the chat logs, one per worker, e.g. "../logs/chat.*.log"')
+    parser.add_argument('--endpoint', type=str, action='append', help='Endpoint to keep, can be repeated')
+    parser.add_argument('--since', type=str, help='ISO time, earlier records are skipped')
+    parser.add_argument('--until', type=str, help='ISO time, later records are skipped')
+    parser.add_argument('--output_file_path', type=str, help='Path of a JSON lines file the records are written to instead of summarizing them, compressed if it ends with .gz')
+
+    # parse arguments
+    args = parser.parse_args()
+    records = read_chat_log(args.log_file_pattern, args.endpoint, args.since, args.until)
+
+    # export the records, or print the summary of their stage timings
+    if args.output_file_path:
+        opener = gzip.open if args.output_file_path.endswith(".gz") else open
+        with opener(args.output_file_path, "wt", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        print(summarize(records).round(1).to_string())
@@ -1,107 +1,396 @@
 # library imports
 from fastapi import FastAPI, Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse, Response
 
-from haystack import Pipeline
 from haystack.nodes import FARMReader
 from haystack.nodes import DensePassageRetriever
 from haystack.nodes import BM25Retriever
+from transformers import AutoTokenizer
 
-from helper_functions import get_elasticsearch_document_store
-from t5_qa import t5_qa
+from helper_functions import get_elasticsearch_document_store, get_faiss_document_store
+from helper_functions import INDEX_VERSION_FILE, DOCUMENT_STORE, INFERENCE_BACKEND
+from t5_qa import t5_qa, T5_MODEL_NAME
 from chatgpt_qa import chatgpt_qa
+from micro_batcher import micro_batcher
+from inference_pool import inference_pool, server_busy
+from answer_cache import answer_cache, normalize_question
+from answer_selection import select_context, NO_CONTEXT_ANSWER
+from answer_router import answer_router
+from latency_stats import latency_stats
+from streaming import sse_answer, iterate_in_pool
+from hybrid_retrieval import hybrid_retriever
+from query_embedding_cache import query_embedding_cache
+from model_registry import model_registry
+from stub_models import register_stub_models
+from stage_timing import stage_timer, current_request
+from chat_logging import start_chat_log, begin_record, annotate, current_record
+from single_flight import single_flight
+from context_assembly import assemble_context, huggingface_counter, tiktoken_counter
 
-import pandas as pd
 import os
 import logging
 import json
 import uuid
+import time
+from contextvars import ContextVar
 
 # set logging level for haystack
 logging.getLogger("haystack").setLevel(logging.ERROR)
 
-# define logger for chatbot
+# define logger for chatbot, its records are written as JSON lines by a background thread started with the server
 chat_log = logging.getLogger('chat')
 chat_log.setLevel(logging.INFO)
-handler = logging.FileHandler('../chat.log')
-handler.setLevel(logging.INFO)
-chat_log.addHandler(handler)
+chat_log.propagate = False
+
+# "{pid}" in the path gives every worker process its own log, so that workers never rotate the same file
+CHAT_LOG_FILE = os.environ.get("CHAT_LOG_FILE", "../chat.{pid}.log")
+CHAT_LOG_MAX_BYTES = int(os.environ.get("CHAT_LOG_MAX_BYTES", 100 * 1024 * 1024))
+CHAT_LOG_ROTATE_WHEN = os.environ.get("CHAT_LOG_ROTATE_WHEN", "")
+CHAT_LOG_BACKUP_COUNT = int(os.environ.get("CHAT_LOG_BACKUP_COUNT", 30))
+CHAT_LOG_QUEUE_SIZE = int(os.environ.get("CHAT_LOG_QUEUE_SIZE", 10000))
+chat_log_writer, chat_log_handler = None, None
+
+# log how long every model takes to load
+startup_log = logging.getLogger('startup')
+startup_log.setLevel(logging.INFO)
+startup_log.addHandler(logging.StreamHandler())
 
 def app_initialize():
     '''
-    Function to initialize chatgpt_qa, t5_qa and api key objects.
+    Function to initialize the chatgpt_qa and api key objects.
 
     Args:
         None
     
     Returns:
         chatgpt_qa_obj (chatgpt_qa): Chatgpt_qa object.
-        generative_qa_obj (generative_qa): t5_qa object.
         api_key (str): API key for authentication.
     '''
 
     # load the api key from config.json
-    config = json.load(open("../config.json"))
+    with open("../config.json") as f:
+        config = json.load(f)
     api_key = config["api_key"]
 
-    t5_qa_obj = t5_qa()
     chatgpt_qa_obj = chatgpt_qa(config["openai_api_key"])
 
-    return chatgpt_qa_obj, t5_qa_obj, api_key
+    return chatgpt_qa_obj, api_key
 
-def qna_pipeline_initialize():
+def load_dense_document_store():
     '''
-    Function to initialize elasticsearch document store, retrievers, reader and qna pipeline objects.
+    Function to load the document store used for dense retrieval.
 
     Args:
         None
 
     Returns:
-        ndl_querying_pipeline (haystack.Pipeline): Non Deep Learning based QnA pipeline object.
-        dl_querying_pipeline (haystack.Pipeline): Deep Learning based QnA pipeline object.
+        haystack.document_stores.BaseDocumentStore: FAISS or Elasticsearch document store.
     '''
 
-    # get elasticsearch host from environment variables
-    host = os.environ.get("ELASTICSEARCH_HOST", "localhost")
-    
-    # initialize elasticsearch document store
-    document_store = get_elasticsearch_document_store(host, "document")
+    # use the in-process FAISS index for dense retrieval if selected, BM25 always needs Elasticsearch
+    if DOCUMENT_STORE == "faiss":
+        return get_faiss_document_store()
+    return models.get("document_store")
 
-    # initialize BM25 retriever
-    bm25_retriever = BM25Retriever(document_store=document_store)
+def load_dpr_retriever():
+    '''
+    Function to load the DPR retriever. Only its question encoder is used, dense retrieval queries the document store with
+    the shared question embedding, so the retriever holds no connection to the document store and can be loaded before
+    the server forks its workers.
 
-    # initialize non deep learning based qna pipeline
-    ndl_querying_pipeline = Pipeline()
-    ndl_querying_pipeline.add_node(component=bm25_retriever, name="Retriever", inputs=["Query"])
+    Args:
+        None
+
+    Returns:
+        DensePassageRetriever: DPR retriever object.
+    '''
 
-    # initialize DPR retriever
-    dpr_retriever = DensePassageRetriever(
-        document_store=document_store,
+    return DensePassageRetriever(
+        document_store=None,
         query_embedding_model="facebook/dpr-question_encoder-single-nq-base",
         passage_embedding_model="facebook/dpr-ctx_encoder-single-nq-base"
     )
 
-    # initialize FARM reader
-    reader = FARMReader(model_name_or_path="deepset/roberta-base-squad2", use_gpu=True)
+def load_reader():
+    '''
+    Function to load the FARM reader, the exported ONNX reader runs under ONNX Runtime if selected.
+
+    Args:
+        None
+
+    Returns:
+        FARMReader: Reader object.
+    '''
 
-    # initialize deep learning based qna pipeline
-    dl_querying_pipeline = Pipeline()
-    dl_querying_pipeline.add_node(component=dpr_retriever, name="Retriever", inputs=["Query"])
-    dl_querying_pipeline.add_node(component=reader, name="Reader", inputs=["Retriever"])
+    if INFERENCE_BACKEND == "onnx":
+        from onnx_backend import load_onnx_reader
+        return load_onnx_reader()
+    return FARMReader(model_name_or_path="deepset/roberta-base-squad2", use_gpu=True)
 
-    return ndl_querying_pipeline, dl_querying_pipeline
+def register_models(models):
+    '''
+    Function to register the loaders of the document stores, retrievers, reader and answer generator.
+
+    Args:
+        models (model_registry): Registry the loaders are added to.
+
+    Returns:
+        None
+    '''
+
+    # get elasticsearch host from environment variables
+    host = os.environ.get("ELASTICSEARCH_HOST", "localhost")
+
+    models.register("document_store", lambda: get_elasticsearch_document_store(host, "document"))
+    models.register("dense_document_store", load_dense_document_store)
+    models.register("bm25_retriever", lambda: BM25Retriever(document_store=models.get("document_store")))
+    models.register("dpr_retriever", load_dpr_retriever)
+    models.register("reader", load_reader)
+
+    # the exported ONNX question encoder and T5 run under ONNX Runtime if selected, onnxruntime is only imported then
+    if INFERENCE_BACKEND == "onnx":
+        from onnx_backend import t5_qa_onnx, onnx_query_encoder
+        models.register("query_encoder", onnx_query_encoder)
+        models.register("t5_qa", t5_qa_onnx)
+    else:
+        # the DPR question encoder of the retriever
+        models.register("query_encoder", lambda: models.get("dpr_retriever"))
+        models.register("t5_qa", t5_qa)
+
+    # count context tokens with the tokenizers of T5 and ChatGPT, the counts of passages are cached
+    max_entries = int(os.environ.get("CONTEXT_TOKEN_CACHE_SIZE", 16384))
+    models.register("t5_token_counter", lambda: huggingface_counter(AutoTokenizer.from_pretrained(T5_MODEL_NAME), max_entries))
+    models.register("gpt_token_counter", lambda: tiktoken_counter("gpt-3.5-turbo", max_entries))
 
 # initialize fastapi app
 app = FastAPI()
 
-ndl_querying_pipeline, dl_querying_pipeline = qna_pipeline_initialize()
-chatgpt_qa_obj, t5_qa_obj, api_key = app_initialize()
+# models load in parallel in the background once the server has started, or on first use if they are not preloaded
+models = model_registry(max_workers=int(os.environ.get("MODEL_LOADER_THREADS", 4)))
+
+# run offline with stubs in place of the models and the search backend, e.g. to load test the server
+STUB_MODELS = os.environ.get("STUB_MODELS", "0") == "1"
+if STUB_MODELS:
+    register_stub_models(models)
+else:
+    register_models(models)
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "all")
+
+# probes and metrics of the deployment, answered without an api key
+PUBLIC_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+# time the stages of the chat endpoints, optionally sending the timings of every request in a Server-Timing header
+timer = stage_timer()
+TIMED_ENDPOINTS = {"chat_v0", "chat_v1", "chat_v2", "chat_v0_stream", "chat_v1_stream", "chat_v2_stream"}
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+chatgpt_qa_obj, api_key = app_initialize()
+
+# run blocking pipeline and model calls on a bounded thread pool so that the event loop stays responsive
+pool = inference_pool(
+    max_workers=int(os.environ.get("INFERENCE_WORKERS", 2)),
+    max_pending=int(os.environ.get("INFERENCE_MAX_PENDING", 16))
+)
+
+# group concurrent t5 requests into batches, the knobs trade latency for throughput
+t5_batcher = micro_batcher(
+    lambda batch: models.get("t5_qa").generate_answers([question for question, _ in batch], [context for _, context in batch]),
+    max_batch_size=int(os.environ.get("T5_MAX_BATCH_SIZE", 8)),
+    max_wait_ms=float(os.environ.get("T5_MAX_WAIT_MS", 10)),
+    executor=pool.executor,
+    max_queue_size=pool.max_pending
+)
+
+# share DPR query embeddings between the answer cache and retrieval, questions that miss the cache are encoded in batches
+query_embeddings = query_embedding_cache(
+    lambda questions: models.get("query_encoder").embed_queries(questions),
+    max_entries=int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 4096)),
+    max_batch_size=int(os.environ.get("QUERY_EMBEDDING_MAX_BATCH_SIZE", 16)),
+    max_wait_ms=float(os.environ.get("QUERY_EMBEDDING_MAX_WAIT_MS", 5)),
+    executor=pool.executor,
+    max_queue_size=pool.max_pending
+)
+
+# cache answers of repeated questions, DPR query embeddings are used to match similar questions
+answer_cache_obj = answer_cache(
+    max_entries=int(os.environ.get("ANSWER_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("ANSWER_CACHE_TTL", 3600)),
+    similarity_threshold=float(os.environ.get("ANSWER_CACHE_SIMILARITY", 0.97)),
+    index_version_file=INDEX_VERSION_FILE
+)
+
+# identical questions to the same endpoint that arrive while the first one is being answered wait for its answer
+# instead of running retrieval, the reader and the (billable) answer generator again
+SINGLE_FLIGHT = os.environ.get("SINGLE_FLIGHT", "1") == "1"
+flights = single_flight()
+
+# the reader endpoints retrieve with DPR alone ("dense"), or with BM25 and DPR at the same time and fuse
+# their rankings ("hybrid"), which gives the reader fewer but better documents
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "dense")
+HYBRID_READER_DOCUMENTS = int(os.environ.get("HYBRID_READER_DOCUMENTS", 5))
+
+# pack the best retrieved passages and the sentences of the reader spans into the token budget of the answer
+# generator, instead of the text of a single document
+CONTEXT_ASSEMBLY = os.environ.get("CONTEXT_ASSEMBLY", "1") == "1"
+CONTEXT_TOKENS = {
+    "t5": int(os.environ.get("T5_CONTEXT_TOKENS", 512)),
+    "gpt": int(os.environ.get("OPENAI_CONTEXT_TOKENS", 1500))
+}
+
+async def sparse_retrieve(question, top_k):
+    '''
+    Retrieve documents for a question with BM25.
+
+    Args:
+        question (str): question string.
+        top_k (int): number of documents returned.
+
+    Returns:
+        list: Documents, best first.
+    '''
+
+    with timer.span("bm25"):
+        bm25_retriever = await models.aget("bm25_retriever")
+        return await pool.run(bm25_retriever.retrieve, query=question, top_k=top_k)
+
+async def dense_retrieve(question, top_k):
+    '''
+    Retrieve documents for a question with DPR, using the shared query embedding instead of encoding the question again.
+
+    Args:
+        question (str): question string.
+        top_k (int): number of documents returned.
+
+    Returns:
+        list: Documents, best first.
+    '''
+
+    with timer.span("query_embedding"):
+        embedding = await query_embeddings.embed(question)
+    with timer.span("dpr"):
+        dense_document_store = await models.aget("dense_document_store")
+        return await pool.run(dense_document_store.query_by_embedding, query_emb=embedding, top_k=top_k)
+
+hybrid_retriever_obj = hybrid_retriever(
+    [sparse_retrieve, dense_retrieve],
+    top_k=int(os.environ.get("HYBRID_RETRIEVER_TOP_K", 10)),
+    rrf_k=int(os.environ.get("HYBRID_RRF_K", 60))
+)
+
+# answer directly with the reader span when the reader is confident, the generator only handles uncertain questions
+router = answer_router(
+    confidence_threshold=float(os.environ.get("READER_CONFIDENCE_THRESHOLD", 0.9)),
+    context_window=int(os.environ.get("READER_CONTEXT_WINDOW", 600))
+)
+
+# time to first token and total time of the streaming endpoints
+stream_stats = latency_stats()
+
+@app.exception_handler(server_busy)
+async def server_busy_handler(request: Request, exc: server_busy):
+    '''
+    Exception handler that sheds load when the inference pool is full.
+
+    Args:
+        request (Request): Request object.
+        exc (server_busy): Exception raised by the inference pool.
+
+    Returns:
+        JSONResponse: JSON response object.
+    '''
+
+    return JSONResponse(
+        content={"message": "server busy, please try again later"}, status_code=503, headers={"Retry-After": "1"}
+    )
+
+@app.on_event("startup")
+async def load_models():
+    '''
+    Start loading the preloaded models in the background, the server accepts connections right away.
+
+    Args:
+        None
+
+    Returns:
+        None
+    '''
+
+    models.start(None if PRELOAD_MODELS == "all" else [name for name in PRELOAD_MODELS.split(",") if name])
+
+@app.on_event("startup")
+async def start_logging():
+    '''
+    Start the background writer of the chat log, in the worker process that serves the requests.
+
+    Args:
+        None
+
+    Returns:
+        None
+    '''
+
+    global chat_log_writer, chat_log_handler
+    chat_log_writer, chat_log_handler = start_chat_log(
+        chat_log,
+        CHAT_LOG_FILE.format(pid=os.getpid()),
+        max_bytes=CHAT_LOG_MAX_BYTES,
+        when=CHAT_LOG_ROTATE_WHEN,
+        backup_count=CHAT_LOG_BACKUP_COUNT,
+        queue_size=CHAT_LOG_QUEUE_SIZE
+    )
+
+@app.on_event("shutdown")
+async def stop_logging():
+    '''
+    Write the remaining chat log records and stop the background writer.
+
+    Args:
+        None
+
+    Returns:
+        None
+    '''
+
+    if chat_log_writer is not None:
+        chat_log_writer.stop()
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    '''
+    Close the pooled connections to OpenAI.
+
+    Args:
+        None
+
+    Returns:
+        None
+    '''
+
+    await chatgpt_qa_obj.close()
+
+def log_answer(question, answer):
+    '''
+    Log the question and answer with the request id, endpoint, stage timings and retrieved documents of the request.
+
+    Args:
+        question (str): question string.
+        answer (str): Answer string.
+
+    Returns:
+        None
+    '''
+
+    timings = current_request.get()
+    record = {**(current_record.get() or {}), "question": question, "answer": answer}
+    if timings is not None:
+        record.update(stages_ms=timer.stages_ms(timings), total_ms=timer.elapsed_ms(timings))
+    chat_log.info("answer", extra={"chat": record})
 
 # define middleware for authentication
 @app.middleware("http")
 async def authentication(request: Request, call_next):
     '''
-    Middleware for authentication.
+    Middleware for authentication and timing of the chat endpoints.
 
     Args:
         request (Request): Request object.
@@ -111,8 +400,26 @@ async def authentication(request: Request, call_next):
         JSONResponse: JSON response object.
     '''
 
-    if request.headers.get('api-key') == api_key:
-        response = await call_next(request)
+    if request.url.path in PUBLIC_PATHS or request.headers.get('api-key') == api_key:
+        # the first part of the path names the endpoint
+        endpoint = request.url.path.strip("/").split("/")[0]
+        if endpoint not in TIMED_ENDPOINTS:
+            return await call_next(request)
+
+        request_id = uuid.uuid4().hex
+        begin_record(request_id=request_id, endpoint=endpoint)
+        timings = timer.begin(endpoint)
+        try:
+            response = await call_next(request)
+        except Exception:
+            timer.end(timings, 500)
+            raise
+        timer.end(timings, response.status_code)
+        response.headers["X-Request-ID"] = request_id
+
+        # streaming responses only include the stages finished before the first event
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = timer.server_timing(timings)
 
     else:
         response = JSONResponse(
@@ -120,6 +427,363 @@ async def authentication(request: Request, call_next):
         )
     return response
 
+async def cached_answer(endpoint, question, generate):
+    '''
+    Return the cached answer of the same or a very similar question, or generate and cache a new one.
+
+    Args:
+        endpoint (str): Name of the endpoint.
+        question (str): question string.
+        generate (function): Coroutine function that generates the answer of a question.
+
+    Returns:
+        str: Answer string.
+    '''
+
+    # exact match on the normalized question
+    with timer.span("answer_cache"):
+        answer = answer_cache_obj.get(endpoint, question)
+    if answer is not None:
+        annotate(cache="exact")
+        return answer
+
+    # nearest neighbour over the embeddings of cached questions
+    with timer.span("query_embedding"):
+        embedding = await query_embeddings.embed(question)
+    with timer.span("answer_cache"):
+        answer = answer_cache_obj.get_similar(endpoint, embedding)
+    if answer is not None:
+        annotate(cache="similar")
+        return answer
+
+    async def compute():
+        start = time.perf_counter()
+        answer = await generate(question)
+        if not used_fallback.get():
+            answer_cache_obj.put(endpoint, question, embedding, answer, time.perf_counter() - start)
+        return answer
+
+    if not SINGLE_FLIGHT:
+        return await compute()
+
+    # share the answer of an identical question that is already being answered, the stages and annotations of
+    # the shared computation are recorded for the request that started it
+    key = (endpoint, normalize_question(question))
+    if key in flights.pending:
+        annotate(cache="coalesced")
+    return await flights.run(key, compute)
+
+async def run_reader_pipeline(question):
+    '''
+    Retrieve documents for a question and run the reader on them, as selected by RETRIEVAL_MODE.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        dict: Prediction with "answers" and "documents".
+    '''
+
+    # get the DPR documents, or the fused BM25 and DPR documents, and run the reader on them
+    with timer.span("retrieval"):
+        if RETRIEVAL_MODE == "hybrid":
+            documents = await hybrid_retriever_obj.retrieve(question, HYBRID_READER_DOCUMENTS)
+        else:
+            documents = await dense_retrieve(question, 10)
+    annotate(documents=[document.id for document in documents])
+    with timer.span("reader"):
+        reader = await models.aget("reader")
+        prediction = await pool.run(reader.predict, query=question, documents=documents, top_k=5)
+    prediction["documents"] = documents
+
+    return prediction
+
+async def generation_context(question, prediction, generator, context):
+    '''
+    Get the context of the answer generator: the retrieved passages packed into its token budget, or the given
+    context if context assembly is turned off or nothing could be packed.
+
+    Args:
+        question (str): question string.
+        prediction (dict): Pipeline output with "documents" and optionally "answers".
+        generator (str): "t5" or "gpt", the generator whose tokenizer and budget are used.
+        context (str): Context selected from a single document.
+
+    Returns:
+        str: Context string.
+    '''
+
+    if not CONTEXT_ASSEMBLY:
+        return context
+
+    with timer.span("context_assembly"):
+        counter = await models.aget(generator + "_token_counter")
+
+        # the question and the prompt around the context are part of the budget, T5 adds a closing </s> token
+        # and the chat format of OpenAI adds a few tokens to every message
+        if generator == "t5":
+            budget = CONTEXT_TOKENS["t5"] - counter.count("question: " + question + "</s> question_context: ") - 1
+        else:
+            budget = CONTEXT_TOKENS["gpt"] - counter.count(chatgpt_qa_obj.create_messages(question, "")[0]["content"]) - 8
+
+        assembled, info = await pool.run(assemble_context, prediction, counter, budget)
+    annotate(context=info)
+    return assembled or context
+
+async def generate_v0(question):
+    '''
+    Generate an answer using the BM25 retriever and the T5 answer correction model.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        str: Answer string.
+    '''
+
+    # get the BM25 documents
+    with timer.span("retrieval"):
+        prediction = {"documents": await sparse_retrieve(question, 10)}
+    annotate(documents=[document.id for document in prediction["documents"]])
+
+    # get the text of the highest scoring document
+    with timer.span("answer_selection"):
+        context = select_context(prediction)
+    if context is None:
+        return NO_CONTEXT_ANSWER
+    context = await generation_context(question, prediction, "t5", context)
+
+    # use generative_qa to correct the answer based on question and context
+    with timer.span("generation"):
+        return await t5_batcher.submit(question, context)
+
+async def generate_v1(question):
+    '''
+    Generate an answer using the DPR retriever, the reader and the T5 answer correction model.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        str: Answer string.
+    '''
+
+    start = time.perf_counter()
+
+    # get predictions from qna pipeline
+    prediction = await run_reader_pipeline(question)
+    
+    # answer with the reader span if the reader is confident, otherwise get the text around it
+    with timer.span("answer_selection"):
+        route, text = router.route(prediction)
+    annotate(route=route)
+
+    # use generative_qa to correct the answer based on question and context
+    if route == "generative":
+        text = await generation_context(question, prediction, "t5", text)
+        with timer.span("generation"):
+            text = await t5_batcher.submit(question, text)
+
+    router.record("chat_v1", route, time.perf_counter() - start)
+    return text
+
+# set when OpenAI was unavailable and T5 answered instead, such answers are not cached
+used_fallback = ContextVar("used_fallback", default=False)
+
+async def t5_fallback(question, context):
+    '''
+    Generate the answer of a ChatGPT endpoint with T5 while OpenAI is unavailable.
+
+    Args:
+        question (str): question string.
+        context (str): context string.
+
+    Returns:
+        str: Answer string.
+    '''
+
+    used_fallback.set(True)
+    annotate(generator="t5_fallback")
+    return await t5_batcher.submit(question, context)
+
+async def t5_stream_fallback(question, context):
+    '''
+    Stream the answer of a ChatGPT endpoint with greedy T5 decoding while OpenAI is unavailable.
+
+    Args:
+        question (str): question string.
+        context (str): context string.
+
+    Returns:
+        async generator: Pieces of the answer.
+    '''
+
+    used_fallback.set(True)
+    annotate(generator="t5_fallback")
+    t5_qa_obj = await models.aget("t5_qa")
+    async for token in iterate_in_pool(pool, t5_qa_obj.stream_answer(question, context)):
+        yield token
+
+async def generate_v2(question):
+    '''
+    Generate an answer using the DPR retriever, the reader and ChatGPT answer correction.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        str: Answer string.
+    '''
+
+    start = time.perf_counter()
+
+    prediction = await run_reader_pipeline(question)
+    
+    # answer with the reader span if the reader is confident, otherwise get the text around it
+    with timer.span("answer_selection"):
+        route, text = router.route(prediction)
+    annotate(route=route)
+
+    # use chatgpt_qa to correct the answer based on question and context, or T5 if OpenAI is unavailable
+    if route == "generative":
+        text = await generation_context(question, prediction, "gpt", text)
+        with timer.span("generation"):
+            text = await chatgpt_qa_obj.generate_answer_async(question, text, fallback=t5_fallback)
+
+    router.record("chat_v2", route, time.perf_counter() - start)
+    return text
+
+async def stream_v0(question):
+    '''
+    Stream an answer using the BM25 retriever and greedy T5 decoding.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        async generator: Pieces of the answer.
+    '''
+
+    # get the BM25 documents
+    with timer.span("retrieval"):
+        prediction = {"documents": await sparse_retrieve(question, 10)}
+    annotate(documents=[document.id for document in prediction["documents"]])
+
+    # get the text of the highest scoring document
+    with timer.span("answer_selection"):
+        context = select_context(prediction)
+    if context is None:
+        yield NO_CONTEXT_ANSWER
+        return
+    context = await generation_context(question, prediction, "t5", context)
+
+    # generate the answer token by token, beam search can only return the answer at the end
+    with timer.span("generation"):
+        t5_qa_obj = await models.aget("t5_qa")
+        async for token in iterate_in_pool(pool, t5_qa_obj.stream_answer(question, context)):
+            yield token
+
+async def stream_v1(question):
+    '''
+    Stream an answer using the DPR retriever, the reader and greedy T5 decoding.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        async generator: Pieces of the answer.
+    '''
+
+    # get predictions from qna pipeline
+    prediction = await run_reader_pipeline(question)
+
+    # answer with the reader span if the reader is confident, otherwise get the text around it
+    with timer.span("answer_selection"):
+        route, text = router.route(prediction)
+    annotate(route=route)
+    if route != "generative":
+        yield text
+        return
+    text = await generation_context(question, prediction, "t5", text)
+
+    # generate the answer token by token, beam search can only return the answer at the end
+    with timer.span("generation"):
+        t5_qa_obj = await models.aget("t5_qa")
+        async for token in iterate_in_pool(pool, t5_qa_obj.stream_answer(question, text)):
+            yield token
+
+async def stream_v2(question):
+    '''
+    Stream an answer using the DPR retriever, the reader and ChatGPT answer correction.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        async generator: Pieces of the answer.
+    '''
+
+    prediction = await run_reader_pipeline(question)
+
+    # answer with the reader span if the reader is confident, otherwise get the text around it
+    with timer.span("answer_selection"):
+        route, text = router.route(prediction)
+    annotate(route=route)
+    if route != "generative":
+        yield text
+        return
+    text = await generation_context(question, prediction, "gpt", text)
+
+    # pass on the tokens as OpenAI streams them, or as T5 generates them if OpenAI is unavailable
+    with timer.span("generation"):
+        async for token in chatgpt_qa_obj.stream_answer_async(question, text, fallback=t5_stream_fallback):
+            yield token
+
+async def streamed_answer(endpoint, question, stream):
+    '''
+    Stream the cached answer of the same or a very similar question, or stream and cache a new one, as server-sent events.
+
+    Args:
+        endpoint (str): Name of the endpoint.
+        question (str): question string.
+        stream (function): Async generator function that streams the answer of a question.
+
+    Returns:
+        StreamingResponse: "token" events with the pieces of the answer and a final "answer" event.
+    '''
+
+    start = time.perf_counter()
+
+    # exact match on the normalized question, then nearest neighbour over the embeddings of cached questions
+    with timer.span("answer_cache"):
+        answer = answer_cache_obj.get(endpoint, question)
+    embedding = None
+    if answer is not None:
+        annotate(cache="exact")
+    else:
+        with timer.span("query_embedding"):
+            embedding = await query_embeddings.embed(question)
+        with timer.span("answer_cache"):
+            answer = answer_cache_obj.get_similar(endpoint, embedding)
+        if answer is not None:
+            annotate(cache="similar")
+
+    async def cached():
+        yield answer
+
+    def on_answer(streamed):
+        # log the question and answer, and cache new answers
+        log_answer(question, streamed)
+        if answer is None and not used_fallback.get():
+            answer_cache_obj.put(endpoint, question, embedding, streamed, time.perf_counter() - start)
+
+    tokens = cached() if answer is not None else stream(question)
+    return StreamingResponse(
+        sse_answer(tokens, stream_stats, endpoint, start, on_answer),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/chat_v0/{question}")
 async def chat_v0(question: str):
     '''
@@ -132,19 +796,10 @@ async def chat_v0(question: str):
         dict: Dictionary containing the answer
     '''
 
-    # get predictions from qna pipeline
-    prediction = ndl_querying_pipeline.run(query=question, params={
-        "Retriever": {"top_k": 10}
-        })
-    answers = pd.DataFrame([i.to_dict() for i in prediction["documents"]])
-    answers.sort_values(by="score", ascending=False, inplace=True)
-    context = answers["content"].head(1).values[0]
-
-    # use generative_qa to correct the answer based on question and context
-    corrected_answer = t5_qa_obj.generate_answer(question, context)
+    corrected_answer = await cached_answer("chat_v0", question, generate_v0)
 
     # log the question and answer
-    chat_log.info(f"Question: {question} Answer: {corrected_answer}")
+    log_answer(question, corrected_answer)
     
     return {"id": str(uuid.uuid4()), "choices": [{"text": corrected_answer}]}
 
@@ -160,26 +815,10 @@ async def chat_v1(question: str):
         dict: Dictionary containing the answer
     '''
 
-    # get predictions from qna pipeline
-    prediction = dl_querying_pipeline.run(query=question, params={
-        "Retriever": {"top_k": 10},
-        "Reader": {"top_k": 5}
-        })
-    
-    # get the highest confidence answer and it's corresponding document
-    answers = pd.DataFrame([i.to_dict() for i in prediction["answers"]])
-    answers['document_ids'] = answers['document_ids'].apply(lambda x: x[0])
-    documents = pd.DataFrame([i.to_dict() for i in prediction["documents"]])
-    merge = pd.merge(documents, answers, left_on="id", right_on="document_ids", how="inner")
-
-    # get the text from the document
-    context = merge["content"].head(1).values[0]
-
-    # use generative_qa to correct the answer based on question and context
-    corrected_answer = t5_qa_obj.generate_answer(question, context)
+    corrected_answer = await cached_answer("chat_v1", question, generate_v1)
 
     # log the question and answer
-    chat_log.info(f"Question: {question} Answer: {corrected_answer}")
+    log_answer(question, corrected_answer)
     
     return {"id": str(uuid.uuid4()), "choices": [{"text": corrected_answer}]}
 
@@ -195,24 +834,124 @@ async def chat_v2(question: str):
         dict: Dictionary containing the answer
     '''
 
-    prediction = dl_querying_pipeline.run(query=question, params={
-        "Retriever": {"top_k": 10},
-        "Reader": {"top_k": 5}
-        })
-    
-   # get the highest confidence answer and it's corresponding document
-    answers = pd.DataFrame([i.to_dict() for i in prediction["answers"]])
-    answers['document_ids'] = answers['document_ids'].apply(lambda x: x[0])
-    documents = pd.DataFrame([i.to_dict() for i in prediction["documents"]])
-    merge = pd.merge(documents, answers, left_on="id", right_on="document_ids", how="inner")
+    corrected_answer = await cached_answer("chat_v2", question, generate_v2)
+
+    # log the question and answer
+    log_answer(question, corrected_answer)
 
-    # get the text from the document
-    context = merge["content"].head(1).values[0]
+    return {"id": str(uuid.uuid4()), "choices": [{"text": corrected_answer}]}
 
-    # use chatgpt_qa to correct the answer based on question and context
-    corrected_answer = chatgpt_qa_obj.generate_answer(question, context)
+@app.get("/chat_v0_stream/{question}")
+async def chat_v0_stream(question: str):
+    '''
+    Streaming chat endpoint based on non-deep learning approach.
 
-    # log the question and answer
-    chat_log.info(f"Question: {question} Answer: {corrected_answer}")
+    Args:
+        question (str): question string.
+
+    Returns:
+        StreamingResponse: Server-sent events with the pieces of the answer, the last event contains the answer like /chat_v0
+    '''
+
+    return await streamed_answer("chat_v0_stream", question, stream_v0)
+
+@app.get("/chat_v1_stream/{question}")
+async def chat_v1_stream(question: str):
+    '''
+    Streaming chat endpoint based on T5 answer correction model.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        StreamingResponse: Server-sent events with the pieces of the answer, the last event contains the answer like /chat_v1
+    '''
+
+    return await streamed_answer("chat_v1_stream", question, stream_v1)
+
+@app.get("/chat_v2_stream/{question}")
+async def chat_v2_stream(question: str):
+    '''
+    Streaming chat endpoint based on ChatGPT answer correction.
+
+    Args:
+        question (str): question string.
+
+    Returns:
+        StreamingResponse: Server-sent events with the pieces of the answer, the last event contains the answer like /chat_v2
+    '''
+
+    return await streamed_answer("chat_v2_stream", question, stream_v2)
+
+@app.get("/stats")
+async def stats():
+    '''
+    Endpoint reporting runtime statistics of the chatbot.
+
+    Args:
+        None
+
+    Returns:
+        dict: Dictionary containing the statistics
+    '''
+
+    return {
+        "answer_cache": answer_cache_obj.stats(),
+        "single_flight": flights.stats(),
+        "openai": chatgpt_qa_obj.stats(),
+        "context_tokens": {
+            name: models.get(name).stats() for name in ["t5_token_counter", "gpt_token_counter"] if models.entries[name]["state"] == "ready"
+        },
+        "query_embeddings": query_embeddings.stats(),
+        "t5_batches": t5_batcher.stats(),
+        "answer_routes": router.stats(),
+        "streaming": stream_stats.stats(),
+        "chat_log": {
+            "queued": chat_log_handler.queue.qsize() if chat_log_handler is not None else 0,
+            "dropped": chat_log_handler.dropped if chat_log_handler is not None else 0
+        }
+    }
+
+@app.get("/healthz")
+async def healthz():
+    '''
+    Liveness endpoint, answers as soon as the server accepts connections.
+
+    Args:
+        None
+
+    Returns:
+        dict: Dictionary containing the status
+    '''
+
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    '''
+    Readiness endpoint, answers 503 until all preloaded models are loaded.
+
+    Args:
+        None
+
+    Returns:
+        JSONResponse: Readiness and the state and load time of every model
+    '''
+
+    ready = models.ready()
+    return JSONResponse(content={"ready": ready, "models": models.status()}, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    '''
+    Endpoint exporting the stage and request latency histograms in the Prometheus text format.
+
+    Args:
+        None
+
+    Returns:
+        Response: Metrics
+    '''
 
-    return {"id": str(uuid.uuid4()), "choices": [{"text": corrected_answer}]}
\ No newline at end of file
+    content, content_type = timer.metrics()
+    return Response(content=content, media_type=content_type)
@@ -1,33 +1,105 @@
 #library imports
 import openai
 
+from openai_client import openai_client, openai_unavailable
+
 class chatgpt_qa():
     """
     This class is used to generate answers to questions based on the context provided using Chat GPT.
 
     Attributes:
         openai_api_key: The openai_api_key to be used for the model.
+        client: The pooled OpenAI client with deadlines, retries and a circuit breaker used by the async methods.
+        fallbacks: The number of answers generated by the fallback because OpenAI was unavailable.
 
     Methods:
+        create_messages: This method is used to build the chat prompt from the question and context.
         generate_answer: This method is used to generate answers to questions based on the context provided.
+        generate_answer_async: This method is used to generate answers without blocking the event loop while waiting for OpenAI.
+        stream_answer_async: This method is used to get the answer in pieces as OpenAI generates it.
+        close: This method is used to close the connections of the client.
+        stats: This method is used to report the calls, retries and fallbacks of the client.
     """
 
-    def __init__(self, openai_api_key):
-        openai.api_key = openai_api_key
+    def __init__(self, openai_api_key, client=None):
+        self.openai_api_key = openai_api_key
+        self.client = client or openai_client(openai_api_key)
+        self.fallbacks = 0
 
-    def generate_answer(self, question, context):
-        completion = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user",
-                "content": f"""
+    def create_messages(self, question, context):
+        return [
+            {"role": "user",
+            "content": f"""
                 Answer the question using the given context. If you are not sure about the answer, answer with "I don't have enough context to answer this question.".
 
                 Context: {context}
 
                 Question: {question}
                 """
-                }
-            ]
+            }
+        ]
+
+    def generate_answer(self, question, context):
+        completion = openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=self.create_messages(question, context),
+            api_key=self.openai_api_key,
+            request_timeout=self.client.timeout
         )
-        return dict(completion.choices[0].message)["content"].replace("\n", "")
\ No newline at end of file
+        return dict(completion.choices[0].message)["content"].replace("\n", "")
+
+    async def generate_answer_async(self, question, context, fallback=None):
+        '''
+        Generate an answer without blocking the event loop, with the fallback if OpenAI is unavailable.
+
+        Args:
+            question (str): question string.
+            context (str): context string.
+            fallback (function): Coroutine function that takes the question and context and generates an answer,
+                e.g. with T5. None raises openai_unavailable instead.
+
+        Returns:
+            str: Answer string.
+        '''
+
+        try:
+            content = await self.client.chat_completion(self.create_messages(question, context))
+        except openai_unavailable:
+            if fallback is None:
+                raise
+            self.fallbacks += 1
+            return await fallback(question, context)
+        return content.replace("\n", "")
+
+    async def stream_answer_async(self, question, context, fallback=None):
+        '''
+        Get the answer in pieces as OpenAI generates it, or from the fallback if OpenAI is unavailable before the first piece.
+
+        Args:
+            question (str): question string.
+            context (str): context string.
+            fallback (function): Async generator function that takes the question and context and streams an answer,
+                e.g. with T5. None raises openai_unavailable instead.
+
+        Returns:
+            async generator: Pieces of the answer.
+        '''
+
+        started = False
+        try:
+            async for content in self.client.stream_chat_completion(self.create_messages(question, context)):
+                started = True
+                yield content.replace("\n", "")
+        except openai_unavailable:
+            # a stream that broke off cannot be continued by another model
+            if started or fallback is None:
+                raise
+            self.fallbacks += 1
+            async for token in fallback(question, context):
+                yield token
+
+    async def close(self):
+        await self.client.close()
+
+    def stats(self):
+        return {**self.client.stats(), "fallbacks": self.fallbacks}
@@ -0,0 +1,227 @@
+# library imports
+from collections import OrderedDict
+import re
+import threading
+
+from answer_cache import normalize_question
+
+# a sentence ends at ".", "!" or "?" followed by whitespace, or at a line break
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# a sentence is only dropped as the cut off part of a longer sentence if it has at least this many words, shorter ones
+# ("Yes.", a course number, a date) are as likely to be content of their own
+MIN_FRAGMENT_WORDS = 6
+
+class token_counter():
+    """
+    This class is used to count the tokens of texts with the tokenizer of a generator. The counts of passages and
+    sentences are kept in a bounded LRU, so a passage retrieved again, e.g. for a popular topic, is not tokenized again.
+
+    Attributes:
+        count_fn: Function that takes a list of texts and returns their numbers of tokens.
+        max_entries: The maximum number of cached counts, the least recently used count is dropped first.
+
+    Methods:
+        count: This method is used to get the number of tokens of a text.
+        count_many: This method is used to get the numbers of tokens of several texts, tokenizing the misses together.
+        stats: This method is used to report hit and miss counts.
+    """
+
+    def __init__(self, count_fn, max_entries=16384):
+        self.count_fn = count_fn
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counts = {"hits": 0, "misses": 0}
+
+        # counts are looked up on the event loop and on the inference pool
+        self.lock = threading.Lock()
+
+    def count(self, text):
+        return self.count_many([text])[0]
+
+    def count_many(self, texts):
+        '''
+        Get the numbers of tokens of texts from the cache, the texts that miss are tokenized in one call.
+
+        Args:
+            texts (list): texts to count.
+
+        Returns:
+            list: number of tokens of every text.
+        '''
+
+        with self.lock:
+            missing = list(dict.fromkeys(text for text in texts if text not in self.entries))
+            self.counts["hits"] += len(texts) - len(missing)
+            self.counts["misses"] += len(missing)
+
+        # tokenize outside of the lock, a text counted twice at the same time gets the same count
+        counted = dict(zip(missing, self.count_fn(missing))) if missing else {}
+
+        with self.lock:
+            for text, tokens in counted.items():
+                self.entries[text] = tokens
+            result = []
+            for text in texts:
+                tokens = counted.get(text)
+                if tokens is None:
+                    tokens = self.entries[text]
+                    self.entries.move_to_end(text)
+                result.append(tokens)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        lookups = self.counts["hits"] + self.counts["misses"]
+        return {**self.counts, "hit_rate": self.counts["hits"] / lookups if lookups else 0.0, "entries": len(self.entries)}
+
+def huggingface_counter(tokenizer, max_entries=16384):
+    """
+    Function to count tokens with a Hugging Face tokenizer, e.g. the one of T5.
+
+    Args:
+        tokenizer (transformers.PreTrainedTokenizer): tokenizer of the generator
+        max_entries (int): maximum number of cached counts
+
+    Returns:
+        token_counter: counter of the tokenizer
+    """
+
+    return token_counter(
+        lambda texts: [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]], max_entries
+    )
+
+def tiktoken_counter(model_name="gpt-3.5-turbo", max_entries=16384):
+    """
+    Function to count tokens like the OpenAI models do.
+
+    Args:
+        model_name (str): name of the OpenAI model
+        max_entries (int): maximum number of cached counts
+
+    Returns:
+        token_counter: counter of the model's encoding
+    """
+
+    import tiktoken
+
+    encoding = tiktoken.encoding_for_model(model_name)
+    return token_counter(lambda texts: [len(ids) for ids in encoding.encode_batch(list(texts))], max_entries)
+
+def split_sentences(text):
+    """
+    Function to split a text into sentences, with their positions so that reader spans can be matched to them.
+
+    Args:
+        text (str): text of a passage
+
+    Returns:
+        list: (start, end) character offsets of every sentence
+    """
+
+    sentences, start = [], 0
+    for match in SENTENCE_END.finditer(text):
+        if match.start() > start:
+            sentences.append((start, match.start()))
+        start = match.end()
+    if start < len(text):
+        sentences.append((start, len(text)))
+    return sentences
+
+def ranked_passages(prediction):
+    """
+    Function to order the retrieved documents for the context: documents with reader answers first, by the
+    confidence of their best answer, then the other documents in the order of the retriever.
+
+    Args:
+        prediction (dict): pipeline output with "documents", best first, and optionally "answers"
+
+    Returns:
+        list: documents, best first
+        dict: document id to the reader spans (start, end) found in the document
+    """
+
+    # the documents of the hybrid retriever are in the fused order, their scores are of different retrievers
+    documents = prediction.get("documents", [])
+    documents_by_id = {document.id: document for document in documents}
+
+    best_score, spans = {}, {}
+    for answer in prediction.get("answers", []):
+        if not answer.document_ids or answer.document_ids[0] not in documents_by_id or not answer.offsets_in_document:
+            continue
+        document_id = answer.document_ids[0]
+        best_score[document_id] = max(best_score.get(document_id, 0), answer.score or 0)
+        spans.setdefault(document_id, []).append((answer.offsets_in_document[0].start, answer.offsets_in_document[0].end))
+
+    answered = sorted(best_score, key=best_score.get, reverse=True)
+    return [documents_by_id[document_id] for document_id in answered] + [document for document in documents if document.id not in best_score], spans
+
+def assemble_context(prediction, counter, budget, separator="\n"):
+    """
+    Function to pack the most useful retrieved text into a token budget. The sentences with reader spans are taken
+    first, then the passages in ranked order, sentence by sentence until the budget is used up. Sentences seen before
+    are skipped, e.g. the overlap between neighbouring chunks of a page or the same page scraped from several websites.
+    Every passage keeps its sentences in their original order.
+
+    Args:
+        prediction (dict): pipeline output with "documents" and optionally "answers"
+        counter (token_counter): counts tokens with the tokenizer of the generator
+        budget (int): number of tokens the context may take
+        separator (str): text put between passages
+
+    Returns:
+        str: context, None if nothing was retrieved
+        dict: number of passages, sentences, tokens and skipped duplicate sentences of the context
+    """
+
+    documents, spans = ranked_passages(prediction)
+    info = {"passages": 0, "sentences": 0, "tokens": 0, "duplicates": 0}
+    if not documents:
+        return None, info
+
+    # candidates in order of priority: reader span sentences of every passage, then all sentences of every passage
+    sentences = {document.id: split_sentences(document.content) for document in documents}
+    candidates = []
+    for document in documents:
+        for i, (start, end) in enumerate(sentences[document.id]):
+            if any(start < span_end and span_start < end for span_start, span_end in spans.get(document.id, [])):
+                candidates.append((document.id, i))
+    candidates += [(document.id, i) for document in documents for i in range(len(sentences[document.id]))]
+    documents_by_id = {document.id: document for document in documents}
+
+    texts = {(document.id, i): document.content[start:end].strip() for document in documents for i, (start, end) in enumerate(sentences[document.id])}
+    tokens = dict(zip(texts, counter.count_many(list(texts.values()))))
+
+    selected, seen, page_sentences, used = {}, set(), {}, 0
+    for key in dict.fromkeys(candidates):
+        document = documents_by_id[key[0]]
+        normalized = " " + normalize_question(texts[key]) + " "
+        if not normalized.strip():
+            continue
+
+        # the same sentence in another passage, or a sentence cut off by the chunk window that is part of a sentence
+        # already taken from the same page, documents without a source page (e.g. indexed before the source was
+        # stored) are only compared with themselves
+        source = document.meta.get("source") or document.id
+        fragment = len(normalized.split()) >= MIN_FRAGMENT_WORDS and any(normalized in sentence for sentence in page_sentences.get(source, []))
+        if normalized in seen or fragment:
+            info["duplicates"] += 1
+            continue
+
+        # tokens at the joins can differ from the sum of the parts, one token per sentence is kept in reserve
+        # a sentence that does not fit is skipped, a shorter one further down may still fit
+        if used + tokens[key] + 1 > budget:
+            continue
+
+        selected.setdefault(document.id, {})[key[1]] = texts[key]
+        seen.add(normalized)
+        page_sentences.setdefault(source, []).append(normalized)
+        used += tokens[key] + 1
+
+    passages = [
+        " ".join(text for _, text in sorted(selected[document.id].items())) for document in documents if document.id in selected
+    ]
+
+    info.update(passages=len(passages), sentences=sum(len(sentences) for sentences in selected.values()), tokens=used)
+    return (separator.join(passages) or None), info
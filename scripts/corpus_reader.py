@@ -0,0 +1,106 @@
+# library imports
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import os
+
+def list_corpus_files(data_directory, site_names=None):
+    """
+    Lists the text files of the scraped websites, walking every website directory recursively to any depth.
+
+    Args:
+        data_directory (str): Directory where the scraped webpages are stored
+        site_names (list): Only list files of these websites (e.g. ["bme.duke.edu"]), None lists all of them
+
+    Return:
+        generator: Paths of the text files in a stable order
+    """
+
+    # every directory directly under the data directory is one scraped website
+    sites = sorted(entry.name for entry in os.scandir(data_directory) if entry.is_dir())
+    if site_names:
+        sites = [site for site in sites if site in site_names]
+
+    for site in sites:
+        for root, directories, file_names in os.walk(os.path.join(data_directory, site)):
+            directories.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(".txt"):
+                    yield os.path.join(root, file_name)
+
+def read_file(file, data_directory):
+    """
+    Reads a text file into a corpus record.
+
+    Args:
+        file (str): Path of the text file
+        data_directory (str): Directory where the scraped webpages are stored
+
+    Return:
+        dict: Path relative to the data directory, website and text of the file
+    """
+
+    path = os.path.relpath(file, data_directory)
+    with open(file, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+
+    return {"path": path, "site": path.split(os.sep)[0], "text": text}
+
+def read_files(files, data_directory, max_workers=8, prefetch=256):
+    """
+    Reads text files in parallel on a thread pool and yields them in order, at most prefetch files are held in memory.
+
+    Args:
+        files (iterable): Paths of the text files
+        data_directory (str): Directory where the scraped webpages are stored
+        max_workers (int): Number of threads reading files
+        prefetch (int): Number of files read ahead of the consumer
+
+    Return:
+        generator: Corpus records with path, site and text
+    """
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for file in files:
+            pending.append(executor.submit(read_file, file, data_directory))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def read_corpus(data_directory, site_names=None, max_workers=8, prefetch=256):
+    """
+    Streams the scraped webpages of all (or some) websites.
+
+    Args:
+        data_directory (str): Directory where the scraped webpages are stored
+        site_names (list): Only read these websites, None reads all of them
+        max_workers (int): Number of threads reading files
+        prefetch (int): Number of files read ahead of the consumer
+
+    Return:
+        generator: Corpus records with path, site and text
+    """
+
+    return read_files(list_corpus_files(data_directory, site_names), data_directory, max_workers, prefetch)
+
+def batched(records, batch_size):
+    """
+    Groups a stream of records into lists.
+
+    Args:
+        records (iterable): Records to group
+        batch_size (int): Number of records per list
+
+    Return:
+        generator: Lists of at most batch_size records
+    """
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
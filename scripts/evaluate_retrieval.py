@@ -0,0 +1,427 @@
+# library imports
+from concurrent.futures import ProcessPoolExecutor
+from haystack.document_stores import InMemoryDocumentStore
+from haystack.nodes import BM25Retriever, DensePassageRetriever, PreProcessor
+from haystack import Document
+import multiprocessing
+import numpy as np
+import pandas as pd
+import argparse
+import glob
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+import torch
+
+logging.getLogger("haystack").setLevel(logging.ERROR)
+logger = logging.getLogger("Evaluate Retrieval")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+from benchmark_retrieval import load_labels, recall_at_k
+from corpus_reader import read_corpus, batched
+from hybrid_retrieval import reciprocal_rank_fusion
+from index_in_es import PREPROCESSOR_SETTINGS, get_boilerplate_stripper, chunk_id, hash_text
+
+RETRIEVERS = ["bm25", "dpr", "hybrid"]
+
+def write_records(records, file_path):
+    """
+    Function to write records as compressed JSON lines, the file is replaced atomically so that an interrupted run
+    never leaves a partial file behind.
+
+    Args:
+        records (iterable): records as dictionaries
+        file_path (str): path of the .jsonl.gz file
+
+    Returns:
+        int: number of records written
+    """
+
+    count = 0
+    with gzip.open(file_path + ".tmp", "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(file_path + ".tmp", file_path)
+    return count
+
+def read_records(file_path):
+    with gzip.open(file_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def build_snapshot(data_directory, snapshot_directory, boilerplate_file, rebuild=False):
+    """
+    Function to clean the corpus once, in the same way as index_in_es.py, and save it as the snapshot every
+    configuration is chunked from. The chunks of the previous snapshot are deleted when it is rebuilt, the embeddings
+    are kept since they only depend on the text of a chunk.
+
+    Args:
+        data_directory (str): Directory where the scraped webpages are stored
+        snapshot_directory (str): Directory of the snapshot, its chunks and the embedding cache
+        boilerplate_file (str): Path of the json file with the learned boilerplate phrases
+        rebuild (bool): Clean the corpus again even if a snapshot exists
+
+    Returns:
+        str: path of the cleaned corpus
+    """
+
+    corpus_file = os.path.join(snapshot_directory, "corpus.jsonl.gz")
+    if os.path.exists(corpus_file) and not rebuild:
+        return corpus_file
+
+    os.makedirs(snapshot_directory, exist_ok=True)
+    for file_path in glob.glob(os.path.join(snapshot_directory, "chunks_*.jsonl.gz")):
+        os.remove(file_path)
+
+    # clean data in a single pass, webpages with characters that could not be decoded are dropped
+    stripper = get_boilerplate_stripper(data_directory, boilerplate_file)
+    cleaned = (
+        {"path": record["path"], "text": text}
+        for record in read_corpus(data_directory)
+        for text in [stripper.clean(record["site"], record["text"])] if text is not None
+    )
+    files = write_records(cleaned, corpus_file)
+    logger.info(f"Snapshot of {files} files saved to {corpus_file}")
+    return corpus_file
+
+def chunk_snapshot(snapshot_directory, split_length, split_overlap, batch_size=1000):
+    """
+    Function to split the cleaned corpus into chunks with the given settings, the chunks are saved next to the
+    snapshot and reused by later runs.
+
+    Args:
+        snapshot_directory (str): Directory of the snapshot
+        split_length (int): number of words per chunk
+        split_overlap (int): number of words shared by neighbouring chunks
+        batch_size (int): Number of webpages split at once
+
+    Returns:
+        str: path of the chunks
+    """
+
+    chunks_file = os.path.join(snapshot_directory, f"chunks_{split_length}_{split_overlap}.jsonl.gz")
+    if os.path.exists(chunks_file):
+        return chunks_file
+
+    preprocessor = PreProcessor(**{**PREPROCESSOR_SETTINGS, "split_length": split_length, "split_overlap": split_overlap, "progress_bar": False})
+
+    def chunks():
+        for batch in batched(read_records(os.path.join(snapshot_directory, "corpus.jsonl.gz")), batch_size):
+            list_of_docs = [Document(record["text"], meta={"source": record["path"]}) for record in batch]
+
+            # same ids as in the index, duplicate chunks of a file are kept once
+            seen = set()
+            for doc in preprocessor.process(documents=list_of_docs):
+                id = chunk_id(doc.meta["source"], doc.content)
+                if id not in seen:
+                    seen.add(id)
+                    yield {"id": id, "source": doc.meta["source"], "content": doc.content}
+
+    write_records(chunks(), chunks_file)
+    return chunks_file
+
+class embedding_cache():
+    """
+    This class is used to keep the DPR passage embeddings of chunks on disk, keyed by the hash of their text, so that
+    configurations that produce the same chunks, and later runs, never embed a chunk twice.
+
+    Attributes:
+        directory: The directory the embeddings are saved to, one .npz file per batch of new embeddings.
+        embeddings: The embeddings loaded so far, by hash of the chunk text.
+
+    Methods:
+        missing: This method is used to get the texts that have no embedding yet.
+        add: This method is used to save new embeddings.
+        get: This method is used to get the embeddings of texts as a matrix.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.embeddings = {}
+        os.makedirs(directory, exist_ok=True)
+        for file_path in sorted(glob.glob(os.path.join(directory, "embeddings_*.npz"))):
+            with np.load(file_path) as shard:
+                self.embeddings.update(zip(shard["keys"].tolist(), shard["vectors"]))
+
+    def missing(self, texts):
+        keyed = {hash_text(text): text for text in texts}
+        return [(key, text) for key, text in keyed.items() if key not in self.embeddings]
+
+    def add(self, keys, vectors):
+        '''
+        Save the embeddings of a batch of texts in a new file, the file is written atomically so that an interrupted
+        run keeps the embeddings of the batches before.
+
+        Args:
+            keys (list): hashes of the texts
+            vectors (np.ndarray): embeddings of the texts, one row per text
+
+        Returns:
+            None
+        '''
+
+        file_path = os.path.join(self.directory, f"embeddings_{len(glob.glob(os.path.join(self.directory, 'embeddings_*.npz'))):05d}.npz")
+        with open(file_path + ".tmp", "wb") as f:
+            np.savez(f, keys=np.array(keys), vectors=np.asarray(vectors, dtype=np.float32))
+        os.replace(file_path + ".tmp", file_path)
+        self.embeddings.update(zip(keys, np.asarray(vectors, dtype=np.float32)))
+
+    def get(self, texts):
+        return np.stack([self.embeddings[hash_text(text)] for text in texts])
+
+def embed_chunks(chunks_files, cache_directory, retriever, batch_size=5000):
+    """
+    Function to embed the chunks of all configurations that are not in the embedding cache yet. Chunks shared by
+    several configurations, e.g. the same split length with a different overlap for short pages, are embedded once.
+
+    Args:
+        chunks_files (list): paths of the chunks of every configuration
+        cache_directory (str): Directory of the embedding cache
+        retriever (DensePassageRetriever): passage encoder
+        batch_size (int): Number of chunks embedded and saved at once
+
+    Returns:
+        int: number of chunks embedded
+        int: number of chunks whose embedding was reused
+    """
+
+    cache = embedding_cache(cache_directory)
+    texts = set(record["content"] for chunks_file in chunks_files for record in read_records(chunks_file))
+    missing = cache.missing(texts)
+    logger.info(f"{len(texts) - len(missing)} of {len(texts)} distinct chunks already embedded")
+
+    for batch in batched(missing, batch_size):
+        keys = [key for key, _ in batch]
+        cache.add(keys, retriever.embed_documents([Document(text) for _, text in batch]))
+        logger.info(f"{len(cache.embeddings)} chunks embedded")
+
+    return len(missing), len(texts) - len(missing)
+
+def embed_questions(questions, retriever):
+    """
+    Function to embed the test questions one at a time, as the chatbot does for a request, and time the encoder.
+
+    Args:
+        questions (list): test questions
+        retriever (DensePassageRetriever): question encoder
+
+    Returns:
+        dict: question to its embedding and the encoding time in seconds
+    """
+
+    embeddings = {}
+    for question in questions:
+        start = time.perf_counter()
+        embedding = retriever.embed_queries([question])[0]
+        embeddings[question] = (embedding, time.perf_counter() - start)
+    return embeddings
+
+def reciprocal_rank(documents, groups, k):
+    """
+    Function to get the reciprocal rank of the first relevant document among the first k documents.
+
+    Args:
+        documents (list): retrieved documents, best first
+        groups (list): groups of equivalent relevant source paths
+        k (int): cut-off
+
+    Returns:
+        float: 1 / rank of the first relevant document, 0 if there is none
+    """
+
+    relevant = set().union(*groups)
+    for rank, document in enumerate(documents[:k], start=1):
+        if document.meta.get("source") in relevant:
+            return 1.0 / rank
+    return 0.0
+
+def init_worker():
+    # every process searches on one core, the sweep runs one configuration per core
+    torch.set_num_threads(1)
+
+def evaluate_config(chunks_file, cache_directory, retriever_type, top_ks, labels, question_embeddings, hybrid_top_k, rrf_k):
+    """
+    Function to index the chunks of one configuration in memory and retrieve the documents of every test question
+    with one retriever type at every top_k.
+
+    Args:
+        chunks_file (str): path of the chunks
+        cache_directory (str): Directory of the embedding cache
+        retriever_type (str): "bm25", "dpr" or "hybrid"
+        top_ks (list): numbers of documents retrieved
+        labels (dict): question to a list of groups of equivalent source paths
+        question_embeddings (dict): question to its embedding and encoding time, needed for dpr and hybrid
+        hybrid_top_k (int): minimum number of documents every retriever returns to the fusion
+        rrf_k (int): damping constant of the fusion
+
+    Returns:
+        list: one row per question and top_k with recall, hit, reciprocal rank and latency
+    """
+
+    records = list(read_records(chunks_file))
+    dense = retriever_type in ("dpr", "hybrid")
+    embeddings = embedding_cache(cache_directory).get([record["content"] for record in records]) if dense else None
+
+    # in-memory index of the chunks, with BM25 statistics and the cached embeddings
+    document_store = InMemoryDocumentStore(
+        use_bm25=retriever_type in ("bm25", "hybrid"), similarity="dot_product", embedding_dim=768, use_gpu=False, progress_bar=False
+    )
+    document_store.write_documents([
+        Document(record["content"], id=record["id"], meta={"source": record["source"]}, embedding=embeddings[i] if dense else None)
+        for i, record in enumerate(records)
+    ])
+    bm25_retriever = BM25Retriever(document_store=document_store) if retriever_type in ("bm25", "hybrid") else None
+
+    def bm25(question, top_k):
+        start = time.perf_counter()
+        documents = bm25_retriever.retrieve(query=question, top_k=top_k)
+        return documents, time.perf_counter() - start
+
+    def dpr(question, top_k):
+        embedding, encoding_seconds = question_embeddings[question]
+        start = time.perf_counter()
+        documents = document_store.query_by_embedding(query_emb=embedding, top_k=top_k, return_embedding=False)
+        return documents, encoding_seconds + time.perf_counter() - start
+
+    def hybrid(question, top_k):
+        # bm25 and dpr run at the same time in the chatbot, so the slower of the two counts
+        depth = max(top_k, hybrid_top_k)
+        (sparse, sparse_seconds), (dense_documents, dense_seconds) = bm25(question, depth), dpr(question, depth)
+        start = time.perf_counter()
+        documents = reciprocal_rank_fusion([sparse, dense_documents], k=rrf_k, top_k=top_k)
+        return documents, max(sparse_seconds, dense_seconds) + time.perf_counter() - start
+
+    retrieve_fn = {"bm25": bm25, "dpr": dpr, "hybrid": hybrid}[retriever_type]
+
+    rows = []
+    for top_k in top_ks:
+        for question, groups in labels.items():
+            documents, seconds = retrieve_fn(question, top_k)
+            recall = recall_at_k(documents, groups, top_k)
+            rows.append({
+                "chunks": os.path.basename(chunks_file),
+                "retriever": retriever_type,
+                "top_k": top_k,
+                "question": question,
+                "recall": recall,
+                "hit": float(recall > 0),
+                "mrr": reciprocal_rank(documents, groups, top_k),
+                "latency_ms": seconds * 1000,
+                "num_chunks": len(records)
+            })
+    return rows
+
+def sweep(labels_file_path, data_directory, snapshot_directory, boilerplate_file, chunk_settings, top_ks, retriever_types, hybrid_top_k=10, rrf_k=60, workers=None, rebuild=False):
+    """
+    Function to evaluate every combination of chunk settings, retriever type and top_k over the labelled test
+    questions on a local snapshot of the corpus, without Elasticsearch.
+
+    The corpus is cleaned once into the snapshot, every chunk setting is split once, and every distinct chunk is
+    embedded once. Chunking and the evaluation of the configurations run in parallel, one process per core.
+    Latencies of configurations that run at the same time affect each other, use workers=1 to compare them exactly.
+
+    Args:
+        labels_file_path (str): Path to the .csv file with the relevant sources of the test questions
+        data_directory (str): Directory where the scraped webpages are stored
+        snapshot_directory (str): Directory of the snapshot, its chunks and the embedding cache
+        boilerplate_file (str): Path of the json file with the learned boilerplate phrases
+        chunk_settings (list): (split_length, split_overlap) pairs
+        top_ks (list): numbers of documents retrieved
+        retriever_types (list): retriever types, any of "bm25", "dpr" and "hybrid"
+        hybrid_top_k (int): minimum number of documents every retriever returns to the fusion
+        rrf_k (int): damping constant of the fusion
+        workers (int): number of processes, None uses one per core
+        rebuild (bool): Clean the corpus again even if a snapshot exists
+
+    Returns:
+        pd.DataFrame: mean recall, hit rate, MRR and mean, median and p95 latency per configuration
+    """
+
+    labels = load_labels(labels_file_path, data_directory)
+    chunk_settings = list(dict.fromkeys(chunk_settings))
+    build_snapshot(data_directory, snapshot_directory, boilerplate_file, rebuild)
+    cache_directory = os.path.join(snapshot_directory, "embeddings")
+
+    # a fresh process per worker, so that the models of the parent are not copied into it
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker) as executor:
+        chunks_files = list(executor.map(chunk_snapshot, itertools.repeat(snapshot_directory), *zip(*chunk_settings)))
+        logger.info(f"Chunked the snapshot with {len(chunk_settings)} settings")
+
+        # embed the new chunks and the questions once for all configurations
+        question_embeddings = None
+        if any(retriever_type in ("dpr", "hybrid") for retriever_type in retriever_types):
+            retriever = DensePassageRetriever(
+                document_store=None,
+                query_embedding_model="facebook/dpr-question_encoder-single-nq-base",
+                passage_embedding_model="facebook/dpr-ctx_encoder-single-nq-base"
+            )
+            embed_chunks(chunks_files, cache_directory, retriever)
+            question_embeddings = embed_questions(list(labels), retriever)
+            del retriever
+
+        configurations = list(itertools.product(chunks_files, retriever_types))
+        futures = [
+            executor.submit(evaluate_config, chunks_file, cache_directory, retriever_type, top_ks, labels, question_embeddings, hybrid_top_k, rrf_k)
+            for chunks_file, retriever_type in configurations
+        ]
+        results = pd.DataFrame([row for future in futures for row in future.result()])
+
+    # split length and overlap back from the name of the chunks file
+    results[["split_length", "split_overlap"]] = results["chunks"].str.extract(r"chunks_(\d+)_(\d+)").astype(int)
+    grouped = results.groupby(["split_length", "split_overlap", "retriever", "top_k"])
+    summary = grouped[["recall", "hit", "mrr"]].mean()
+    summary["latency_mean_ms"] = grouped["latency_ms"].mean()
+    summary["latency_p50_ms"] = grouped["latency_ms"].median()
+    summary["latency_p95_ms"] = grouped["latency_ms"].quantile(0.95)
+    summary["num_chunks"] = grouped["num_chunks"].first()
+    return summary
+
+def parse_chunk_settings(values):
+    """
+    Function to parse chunk settings given as "split_length:split_overlap", e.g. "250:10".
+
+    Args:
+        values (list): chunk settings as strings
+
+    Returns:
+        list: (split_length, split_overlap) pairs
+    """
+
+    settings = []
+    for value in values:
+        split_length, _, split_overlap = value.partition(":")
+        settings.append((int(split_length), int(split_overlap or PREPROCESSOR_SETTINGS["split_overlap"])))
+    return settings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='evaluate_retrieval',
+                    description='This script sweeps chunk settings, top_k and retriever types over a local snapshot of the corpus and reports recall@k, MRR and retrieval latency of every configuration.')
+    parser.add_argument('--labels_file_path', type=str, default="../performance_testing/retrieval_labels.csv", help='Path to the .csv file with the relevant sources of the test questions')
+    parser.add_argument('--data_directory', type=str, default="../data", help='Directory where the scraped webpages are stored')
+    parser.add_argument('--snapshot_directory', type=str, default="../retrieval_snapshot", help='Directory of the cleaned corpus, its chunks and the embedding cache')
+    parser.add_argument('--boilerplate_file', type=str, default="../boilerplate_patterns.json", help='Path of the json file with the learned boilerplate phrases')
+    parser.add_argument('--chunk_settings', type=str, nargs="+", default=["100:10", "250:10", "500:20"], help='Chunk settings as split_length:split_overlap')
+    parser.add_argument('--top_ks', type=int, nargs="+", default=[1, 3, 5, 10, 20], help='Numbers of documents retrieved')
+    parser.add_argument('--retrievers', type=str, nargs="+", default=RETRIEVERS, choices=RETRIEVERS, help='Retriever types')
+    parser.add_argument('--hybrid_top_k', type=int, default=int(os.environ.get("HYBRID_RETRIEVER_TOP_K", 10)), help='Minimum number of documents every retriever returns to the fusion')
+    parser.add_argument('--rrf_k', type=int, default=int(os.environ.get("HYBRID_RRF_K", 60)), help='Damping constant of the fusion')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes, one per core by default')
+    parser.add_argument('--rebuild', action='store_true', help='Clean the corpus again, e.g. after scraping or learning the boilerplate again')
+    parser.add_argument('--output_file_path', type=str, default="../performance_testing/retrieval_sweep.csv", help='Path of the .csv file the results are saved to')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # run the sweep, save and print the results
+    summary = sweep(
+        args.labels_file_path, args.data_directory, args.snapshot_directory, args.boilerplate_file,
+        parse_chunk_settings(args.chunk_settings), args.top_ks, args.retrievers, args.hybrid_top_k, args.rrf_k, args.workers, args.rebuild
+    )
+    summary.round(3).to_csv(args.output_file_path)
+    print(summary.round(3).to_string())
@@ -0,0 +1,121 @@
+# library imports
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import argparse
+import json
+import random
+import time
+import uuid
+import uvicorn
+
+# define fake openai api
+app = FastAPI()
+
+# simulated upstream latency (until the first token when streaming) and time between streamed tokens, and the share
+# of requests that fail with error_status or take slow_ms longer, can be changed from the command line or by a
+# harness that imports this module
+settings = {"latency_ms": 500, "token_latency_ms": 20, "error_rate": 0.0, "error_status": 500, "slow_rate": 0.0, "slow_ms": 0}
+
+# the injected failures are drawn from a seeded generator, so that a harness sees the same failures in every run
+rng = random.Random(0)
+
+async def stream_completion(completion_id, model, content, latency_ms):
+    '''
+    Stream a completion word by word in the OpenAI server-sent events format.
+
+    Args:
+        completion_id (str): id shared by all chunks.
+        model (str): model name.
+        content (str): answer to stream.
+        latency_ms (float): delay before the first chunk.
+
+    Returns:
+        generator: server-sent events.
+    '''
+
+    def chunk(delta, finish_reason=None):
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    await asyncio.sleep(latency_ms / 1000)
+    yield chunk({"role": "assistant"})
+    for i, word in enumerate(content.split(" ")):
+        if i > 0:
+            await asyncio.sleep(settings["token_latency_ms"] / 1000)
+        yield chunk({"content": word if i == 0 else " " + word})
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict):
+    '''
+    Fake OpenAI chat completion endpoint that answers after a configurable delay, or streams the answer if asked to.
+    A configurable share of the requests fails or is slow.
+
+    Args:
+        body (dict): OpenAI chat completion request body.
+
+    Returns:
+        dict: OpenAI chat completion response, or a stream of completion chunks.
+    '''
+
+    question = body["messages"][-1]["content"].strip().split("Question:")[-1].strip()
+    content = f"This is a fake answer to: {question}"
+    completion_id = "chatcmpl-" + uuid.uuid4().hex
+
+    # inject failures and latency spikes
+    if rng.random() < settings["error_rate"]:
+        return JSONResponse(content={"error": {"message": "injected error", "type": "server_error"}}, status_code=settings["error_status"])
+    latency_ms = settings["latency_ms"] + (settings["slow_ms"] if rng.random() < settings["slow_rate"] else 0)
+
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(completion_id, body.get("model", "gpt-3.5-turbo"), content, latency_ms), media_type="text/event-stream")
+
+    # a complete answer takes as long as streaming all of its tokens
+    await asyncio.sleep((latency_ms + settings["token_latency_ms"] * (len(content.split(" ")) - 1)) / 1000)
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+            }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='fake_openai_server',
+                    description='This script runs a local OpenAI compatible server with a configurable latency for load testing.')
+    parser.add_argument('--port', type=int, default=8099, help='Port to listen on')
+    parser.add_argument('--latency_ms', type=float, default=500, help='Delay before every completion (or its first streamed token) is returned')
+    parser.add_argument('--token_latency_ms', type=float, default=20, help='Delay between generated tokens')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Share of the requests that fail')
+    parser.add_argument('--error_status', type=int, default=500, help='Status code of the failed requests, e.g. 429 or 503')
+    parser.add_argument('--slow_rate', type=float, default=0.0, help='Share of the requests that take slow_ms longer')
+    parser.add_argument('--slow_ms', type=float, default=0, help='Additional delay of the slow requests')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the injected failures and latency spikes')
+
+    # parse arguments
+    args = parser.parse_args()
+    settings["latency_ms"] = args.latency_ms
+    settings["token_latency_ms"] = args.token_latency_ms
+    settings["error_rate"] = args.error_rate
+    settings["error_status"] = args.error_status
+    settings["slow_rate"] = args.slow_rate
+    settings["slow_ms"] = args.slow_ms
+    rng.seed(args.seed)
+
+    # start the server, point OPENAI_API_BASE to http://127.0.0.1:<port>/v1 to use it
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
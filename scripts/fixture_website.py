@@ -0,0 +1,94 @@
+# library imports
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
+import asyncio
+import argparse
+import uvicorn
+
+# define fixture website
+app = FastAPI()
+
+# number of pages and simulated response time, can be changed from the command line or by a harness that imports this module
+settings = {"pages": 500, "latency_ms": 20}
+
+def page_links(i, base):
+    """
+    Function to get the links on a page of the fixture website, including links a crawler has to skip or normalize.
+
+    Args:
+        i (int): page number
+        base (str): website link, e.g. http://127.0.0.1:8098
+
+    Returns:
+        list: href values
+    """
+
+    pages = settings["pages"]
+    links = [f"/page/{child}" for child in (2 * i + 1, 2 * i + 2) if child < pages]
+    links += [
+        f"{base}/page/{(7 * i + 3) % pages}",
+        f"/page/{i}#top",
+        "https://example.com/outside",
+        "//cdn.example.com/script.js",
+        "relative.html"
+    ]
+    if i % 10 == 0:
+        links.append(f"/files/report{i}.pdf")
+    return links
+
+def expected_links(base):
+    """
+    Function to get the links a crawler should find on the fixture website.
+
+    Args:
+        base (str): website link
+
+    Returns:
+        set: links
+    """
+
+    links = {base}
+    for i in range(settings["pages"]):
+        links.add(f"{base}/page/{i}")
+        if i % 10 == 0:
+            links.add(f"{base}/files/report{i}.pdf")
+    return links
+
+def render(links):
+    return "<html><body>" + "".join(f'<a href="{link}">{link}</a>' for link in links) + "</body></html>"
+
+@app.get("/", response_class=HTMLResponse)
+async def home():
+    await asyncio.sleep(settings["latency_ms"] / 1000)
+    return render(["/page/0"])
+
+@app.get("/page/{i}", response_class=HTMLResponse)
+async def page(i: int, request: Request):
+    await asyncio.sleep(settings["latency_ms"] / 1000)
+
+    # pages only change with the size of the website, so scrapers can skip them with conditional requests
+    etag = f'"{i}-{settings["pages"]}"'
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return HTMLResponse(render(page_links(i, str(request.base_url).rstrip("/"))), headers={"ETag": etag})
+
+@app.get("/files/{name}")
+async def file(name: str):
+    await asyncio.sleep(settings["latency_ms"] / 1000)
+    return Response(content=b"%PDF-1.4", media_type="application/pdf")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='fixture_website',
+                    description='This script runs a local website with a known link graph for testing and benchmarking the crawler.')
+    parser.add_argument('--port', type=int, default=8098, help='Port to listen on')
+    parser.add_argument('--pages', type=int, default=500, help='Number of pages of the website')
+    parser.add_argument('--latency_ms', type=float, default=20, help='Delay before every page is returned')
+
+    # parse arguments
+    args = parser.parse_args()
+    settings["pages"] = args.pages
+    settings["latency_ms"] = args.latency_ms
+
+    # start the server, crawl it with: python get_subpages.py http://127.0.0.1:<port> <json_file_name>
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -1,140 +1,231 @@
 # library imports
-import requests
 from bs4 import BeautifulSoup
-from tqdm import tqdm
+from urllib.parse import urldefrag
+import aiohttp
+import asyncio
 import json
 import argparse
+import os
+import time
 
-def getdata(url):
-    """
-    Function to get html data of a website
-
-    Args:
-        url (str): website link
-
-    Returns:
-        str: html data
-    """
-
-    # add header to prevent being blocked (403 error) by wordpress websites
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
-    
-    r = requests.get(url, headers=headers)
-    return r.text
+# add header to prevent being blocked (403 error) by wordpress websites
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
 
-def get_links(website_link, website):
+def get_links(html_data, website):
     """
-    Function to get all links of a website
+    Function to get all links of a webpage that belong to the website
 
     Args:
-        website_link (str): website link
+        html_data (str): html data of the webpage
         website (str): website link
 
     Returns:
-        dict: dictionary of links
+        list: links in the order they appear on the webpage
     """
-    
-    # get html data
-    html_data = getdata(website_link)
 
+    list_links = []
     try:
         # parse html data
         soup = BeautifulSoup(html_data, "html.parser")
-        list_links = []
 
         # loop through all links
         for link in soup.find_all("a", href=True):
+            href = str(link["href"])
+
             # append to list if new link contains original link
-            if str(link["href"]).startswith((str(website))):
-                list_links.append(link["href"])
+            if href.startswith(website):
+                list_links.append(urldefrag(href)[0])
 
             # include all href that do not start with website link but with "/"
-            if str(link["href"]).startswith("/"):
-                if link["href"] not in dict_href_links:
-                    print(link["href"])
-                    dict_href_links[link["href"]] = None
-                    link_with_www = website + "/"+ link["href"][1:]
-                    print("adjusted link =", link_with_www)
-                    list_links.append(link_with_www)
-    except:
-        list_links = []
+            elif href.startswith("/") and not href.startswith("//"):
+                list_links.append(urldefrag(website + href)[0])
+    except Exception:
         pass
-    
-    # convert list of links to dictionary and define keys as the links and the values as "Not-checked"
-    dict_links = dict.fromkeys(list_links, "Not-checked")
-    return dict_links
 
-def get_subpage_links(l, website):
+    return list_links
+
+def load_links(file_name):
     """
-    Function to get all links of subpages of a website
+    Function to load the links saved by a previous, possibly interrupted, crawl
 
     Args:
-        l (dict): dictionary of links
-        website (str): website link
+        file_name (str): path of the json file
 
     Returns:
-        dict: updated dictionary of links
+        dict: dictionary of links, empty if the file does not exist
     """
 
-    # loop through all links
-    for link in tqdm(l):
-
-        # check if link is already crawled
-        if l[link] == "Not-checked":
-            # get all links of subpage
-            dict_links_subpages = get_links(link, website)
-            # update the dictionary value of the link to "Checked"
-            l[link] = "Checked"
-        else:
-            # create an empty dictionary in case every link is checked
-            dict_links_subpages = {}
-        
-        # add new dictionary to old dictionary
-        l = {**dict_links_subpages, **l}
-    return l
-
-def get_subpages(link, file_name):
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name) as f:
+        return json.load(f)
+
+def save_links(links, file_name):
+    """
+    Function to save the links, the file is replaced atomically so an interrupted save never corrupts it
+
+    Args:
+        links (dict): dictionary of links
+        file_name (str): path of the json file
+
+    Returns:
+        None
+    """
+
+    with open(file_name + ".tmp", "w") as f:
+        json.dump(links, f)
+    os.replace(file_name + ".tmp", file_name)
+
+class subpage_crawler():
+    """
+    This class is used to crawl all subpages of a website concurrently.
+
+    The links are kept in a dictionary of link to "Checked" or "Not-checked", the same format as the json output.
+    A link is only marked "Checked" after the links found on it were added, so a saved dictionary is also a checkpoint
+    the crawl can be resumed from.
+
+    Attributes:
+        website: The website link, only links starting with it (or with "/") are followed.
+        file_name: The json file the links are saved to.
+        concurrency: The number of webpages fetched at the same time.
+        per_host: The maximum number of connections to one host.
+        checkpoint_every: The number of checked webpages after which the links are saved.
+        timeout: The number of seconds after which a request is given up.
+        retries: The number of times a failed request is retried.
+
+    Methods:
+        crawl: This method is used to crawl the website, starting from the saved links if there are any.
+    """
+
+    def __init__(self, website, file_name, concurrency=16, per_host=8, checkpoint_every=100, timeout=30, retries=2):
+        self.website = website
+        self.file_name = file_name
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.checkpoint_every = checkpoint_every
+        self.timeout = timeout
+        self.retries = retries
+
+        self.links = {}
+        self.checked = 0
+        self.errors = 0
+
+    async def fetch(self, session, url):
+        '''
+        Get the html data of a webpage.
+
+        Args:
+            session (aiohttp.ClientSession): session with the connection pool
+            url (str): webpage link
+
+        Returns:
+            str: html data, empty for other content types and failed requests
+        '''
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.get(url, headers=HEADERS) as response:
+                    # files like pdfs and images are listed for scraping but have no links to follow
+                    if "html" not in response.content_type:
+                        return ""
+                    return await response.text(errors="replace")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    print("FAILED", url, repr(e))
+                    self.errors += 1
+                    return ""
+                await asyncio.sleep(2 ** attempt)
+
+    async def worker(self, session, frontier, start):
+        loop = asyncio.get_running_loop()
+        while True:
+            url = await frontier.get()
+            try:
+                html_data = await self.fetch(session, url)
+
+                # parse off the event loop so other requests keep flowing
+                for link in await loop.run_in_executor(None, get_links, html_data, self.website):
+                    if link not in self.links:
+                        self.links[link] = "Not-checked"
+                        frontier.put_nowait(link)
+                self.links[url] = "Checked"
+
+                self.checked += 1
+                if self.checked % self.checkpoint_every == 0:
+                    save_links(self.links, self.file_name)
+                    print(f"{self.checked} pages checked, {frontier.qsize()} queued, {self.checked / (time.perf_counter() - start):.1f} pages/s")
+            except Exception as e:
+                # e.g. a link that cannot be parsed, the worker goes on with the next url and the page stays
+                # "Not-checked" so that a resumed crawl tries it again
+                print("FAILED", url, repr(e))
+                self.errors += 1
+            finally:
+                frontier.task_done()
+
+    async def crawl(self, resume=False):
+        '''
+        Crawl the website and save the links.
+
+        Args:
+            resume (bool): continue from the links saved in file_name by an interrupted crawl
+
+        Returns:
+            dict: dictionary of links
+        '''
+
+        self.links = load_links(self.file_name) if resume else {}
+        if not self.links:
+            self.links = {self.website: "Not-checked"}
+
+        # every link that is not checked yet is on the frontier, the dictionary is the seen-set
+        frontier = asyncio.Queue()
+        for link, value in self.links.items():
+            if value == "Not-checked":
+                frontier.put_nowait(link)
+
+        start = time.perf_counter()
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            workers = [asyncio.create_task(self.worker(session, frontier, start)) for _ in range(self.concurrency)]
+            try:
+                await frontier.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+                # also save on interruption, so the crawl can be resumed
+                save_links(self.links, self.file_name)
+
+        return self.links
+
+def get_subpages(link, file_name, resume=False, **kwargs):
     """
     Function to get all subpages of a website
 
     Args:
         link (str): website link
+        file_name (str): path of the json file the links are saved to
+        resume (bool): continue from the links saved in file_name by an interrupted crawl
+        **kwargs: parameters of subpage_crawler
 
     Returns:
-        None
+        dict: summary of the crawl
     """
-    # get website link
-    website = link
-
-    # create dictionary of website
-    dict_links = {website:"Not-checked"}
-
-    # initialize counters
-    counter, counter2 = None, 0
-
-    # loop until all links are checked
-    while counter != 0:
-        counter2 += 1
-
-        # get links of all subpages
-        dict_links2 = get_subpage_links(dict_links, website)
-        
-        # count number of links that are not checked
-        counter = sum(value == "Not-checked" for value in dict_links2.values())
-
-        # print information
-        print("")
-        print("THIS IS LOOP ITERATION NUMBER", counter2)
-        print("LENGTH OF DICTIONARY WITH LINKS =", len(dict_links2))
-        print("NUMBER OF 'Not-checked' LINKS = ", counter)
-        print("")
-        dict_links = dict_links2
-
-        # save the links in json file
-        a_file = open(file_name, "w")
-        json.dump(dict_links, a_file)
-        a_file.close()
+
+    crawler = subpage_crawler(link, file_name, **kwargs)
+    start = time.perf_counter()
+    links = asyncio.run(crawler.crawl(resume))
+    seconds = time.perf_counter() - start
+
+    return {
+        "links": len(links),
+        "pages_checked": crawler.checked,
+        "errors": crawler.errors,
+        "seconds": seconds,
+        "pages_per_second": crawler.checked / seconds if seconds else 0.0
+    }
 
 if __name__ == "__main__":
     # create parser
@@ -143,14 +234,14 @@ if __name__ == "__main__":
                     description='This script gets all subpages of a website and saves them in a json file.')
     parser.add_argument('website_link', type=str, help='Website link')
     parser.add_argument('file_name', type=str, help='File name')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted crawl from the links saved in the json file')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of webpages fetched at the same time')
+    parser.add_argument('--per_host', type=int, default=8, help='Maximum number of connections to one host')
+    parser.add_argument('--checkpoint_every', type=int, default=100, help='Number of checked webpages after which the links are saved')
 
     # parse arguments
     args = parser.parse_args()
-    website_link = args.website_link
-    file_name = args.file_name
-
-    # initialize dictionary
-    dict_href_links = {}
 
     # call function to get all subpages
-    get_subpages(website_link, file_name)
\ No newline at end of file
+    summary = get_subpages(args.website_link, args.file_name, args.resume, concurrency=args.concurrency, per_host=args.per_host, checkpoint_every=args.checkpoint_every)
+    print(f"{summary['links']} links, {summary['pages_checked']} pages checked in {summary['seconds']:.1f}s ({summary['pages_per_second']:.1f} pages/s), {summary['errors']} errors")
@@ -1,5 +1,21 @@
 # library imports
-from haystack.document_stores import ElasticsearchDocumentStore
+from haystack.document_stores import ElasticsearchDocumentStore, FAISSDocumentStore
+import json
+import time
+import os
+
+# file touched after every reindex so that running servers can invalidate cached answers
+INDEX_VERSION_FILE = os.environ.get("INDEX_VERSION_FILE", "../index_version.txt")
+
+# document store used for dense (DPR) retrieval, either "elasticsearch" or the in-process "faiss" index
+DOCUMENT_STORE = os.environ.get("DOCUMENT_STORE", "elasticsearch")
+FAISS_INDEX_PATH = os.environ.get("FAISS_INDEX_PATH", "../faiss_index/document.faiss")
+
+# models run in PyTorch ("torch") or as int8 quantized ONNX models under ONNX Runtime on the CPU ("onnx"),
+# the ONNX models are exported by onnx_backend.py, 0 threads lets ONNX Runtime use all cores
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "../onnx_models")
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", 0))
 
 def get_elasticsearch_document_store(host, username="", password="", index="document"):
     
@@ -26,4 +42,104 @@ def get_elasticsearch_document_store(host, username="", password="", index="docu
         embedding_dim=768,
     )
     
-    return document_store
\ No newline at end of file
+    return document_store
+
+def get_faiss_paths(index_path):
+    
+    '''
+    Returns the paths of the files that make up a saved FAISSDocumentStore.
+
+    Args:
+        index_path (str): Path of the FAISS index file.
+
+    Returns:
+        tuple: Paths of the FAISS index, its config and the SQLite database holding the documents.
+    '''
+
+    base_path = os.path.splitext(index_path)[0]
+    return index_path, base_path + ".json", base_path + ".db"
+
+def get_faiss_document_store(index_path=FAISS_INDEX_PATH):
+    
+    '''
+    Returns a FAISSDocumentStore object loaded from disk, passage embeddings are searched in-process without re-embedding.
+
+    Args:
+        index_path (str): Path of the FAISS index file.
+
+    Returns:
+        FAISSDocumentStore: FAISSDocumentStore object.
+    '''
+
+    index_path, config_path, _ = get_faiss_paths(index_path)
+    return FAISSDocumentStore.load(index_path=index_path, config_path=config_path)
+
+def save_faiss_document_store(documents, index_path=FAISS_INDEX_PATH, batch_size=10000):
+    
+    '''
+    Builds an HNSW FAISSDocumentStore from documents that already have embeddings and saves it to disk.
+
+    Args:
+        documents (iterable): Documents with embeddings, e.g. from get_all_documents_generator(return_embedding=True).
+        index_path (str): Path of the FAISS index file.
+        batch_size (int): Number of documents written at once.
+
+    Returns:
+        None
+    '''
+
+    index_path, config_path, sql_path = get_faiss_paths(index_path)
+
+    # build the new index next to the live one, so that the chatbot keeps its index if building fails
+    base_path, extension = os.path.splitext(index_path)
+    tmp_index_path, tmp_config_path, tmp_sql_path = get_faiss_paths(base_path + ".tmp" + extension)
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    for path in (tmp_index_path, tmp_config_path, tmp_sql_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    # create FAISSDocumentStore with the same similarity as the Elasticsearch document store
+    document_store = FAISSDocumentStore(
+        sql_url=f"sqlite:///{tmp_sql_path}",
+        faiss_index_factory_str="HNSW",
+        similarity="dot_product",
+        embedding_dim=768,
+    )
+
+    # the embeddings of the documents are added to the index as they are, nothing is re-embedded
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            document_store.write_documents(batch)
+            batch = []
+    if batch:
+        document_store.write_documents(batch)
+
+    document_store.save(index_path=tmp_index_path, config_path=tmp_config_path)
+
+    # the config names the database the documents are loaded from, which is renamed below
+    with open(tmp_config_path) as f:
+        config = json.load(f)
+    config["sql_url"] = f"sqlite:///{sql_path}"
+    with open(tmp_config_path, "w") as f:
+        json.dump(config, f)
+
+    # replace the live files, the config last
+    for tmp_path, path in ((tmp_sql_path, sql_path), (tmp_index_path, index_path), (tmp_config_path, config_path)):
+        os.replace(tmp_path, path)
+
+def mark_index_updated(index_version_file=INDEX_VERSION_FILE):
+    
+    '''
+    Records that the document index has been rebuilt, running chatbot servers drop their cached answers when this file changes.
+
+    Args:
+        index_version_file (str): Path of the index version file.
+
+    Returns:
+        None
+    '''
+
+    with open(index_version_file, "w") as f:
+        f.write(str(time.time()))
@@ -0,0 +1,78 @@
+# library imports
+import asyncio
+
+def document_key(document):
+    """
+    Key that identifies a retrieved document across retrievers.
+
+    Args:
+        document (haystack.Document): retrieved document
+
+    Return:
+        str: id of the document, or its text if it has no id
+    """
+
+    return document.id or document.content
+
+def reciprocal_rank_fusion(result_lists, k=60, top_k=None):
+    """
+    Fuses ranked lists of documents with reciprocal-rank fusion, a document scores the sum of 1 / (k + rank) over the lists
+    it appears in. Only ranks are used, so BM25 and DPR scores, which are on different scales, never have to be compared.
+
+    Args:
+        result_lists (list): ranked lists of documents, e.g. of a sparse and a dense retriever
+        k (int): damping constant, larger values give lower ranks more weight
+        top_k (int): number of fused documents returned, None returns all of them
+
+    Return:
+        list: documents found by any retriever, without duplicates, best first
+    """
+
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = document_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+
+            # keep the copy of the first list, e.g. the one with the BM25 score
+            documents.setdefault(key, document)
+
+    # sort by fused score, ties keep the order in which the documents were first seen
+    keys = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [documents[key] for key in keys]
+
+class hybrid_retriever():
+    """
+    This class is used to retrieve documents with a sparse and a dense retriever at the same time and to fuse their results.
+
+    Attributes:
+        retrieve_fns: Async functions that take a question and top_k and return ranked documents, e.g. of BM25 and DPR.
+        top_k: The number of documents every retriever returns.
+        rrf_k: The damping constant of the reciprocal-rank fusion.
+
+    Methods:
+        retrieve: This method is used to get the fused documents of a question.
+    """
+
+    def __init__(self, retrieve_fns, top_k=10, rrf_k=60):
+        self.retrieve_fns = retrieve_fns
+        self.top_k = top_k
+        self.rrf_k = rrf_k
+
+    async def retrieve(self, question, top_k=5):
+        '''
+        Query all retrievers concurrently and fuse their results.
+
+        Args:
+            question (str): question string.
+            top_k (int): number of fused documents returned.
+
+        Returns:
+            list: fused documents, best first.
+        '''
+
+        # BM25 waits on Elasticsearch while DPR encodes the question, so both run at the same time
+        result_lists = await asyncio.gather(*[retrieve_fn(question, self.top_k) for retrieve_fn in self.retrieve_fns])
+
+        return reciprocal_rank_fusion(result_lists, self.rrf_k, top_k)
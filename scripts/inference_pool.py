@@ -0,0 +1,69 @@
+#library imports
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+class server_busy(Exception):
+    """
+    Raised when the inference pool has no room left for another call, the API answers it with a 503.
+    """
+
+class inference_pool():
+    """
+    This class is used to run blocking model and pipeline calls on a bounded thread pool outside of the event loop.
+
+    The torch models release the GIL while they compute, so threads give real parallelism while sharing
+    a single copy of the weights. Calls beyond max_workers wait in the pool, and once max_pending calls
+    are waiting new calls are rejected right away instead of queueing without limit.
+
+    Attributes:
+        executor: The thread pool the blocking calls run on.
+        max_workers: The number of calls running at the same time.
+        max_pending: The number of calls allowed to wait for a free worker.
+
+    Methods:
+        run: This method is used to run a blocking function in the pool and await its result.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(0, int(max_pending))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+
+        # only touched from the event loop thread, so no lock is needed
+        self.in_flight = 0
+
+    def check_capacity(self):
+        '''
+        Raise server_busy if no more calls can be accepted.
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+
+        if self.in_flight >= self.max_workers + self.max_pending:
+            raise server_busy()
+
+    async def run(self, fn, *args, **kwargs):
+        '''
+        Run a blocking function in the pool without blocking the event loop.
+
+        Args:
+            fn (function): Blocking function to run.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Return value of the function.
+        '''
+
+        self.check_capacity()
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
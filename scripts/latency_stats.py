@@ -0,0 +1,42 @@
+# library imports
+from collections import deque
+import numpy as np
+
+class latency_stats():
+    """
+    This class is used to keep counts and recent latencies of named events, e.g. the time to first token of an endpoint.
+
+    Attributes:
+        window: The number of most recent latencies kept per name for the percentiles.
+        counts: Dictionary of name to the number of recorded events.
+        latencies: Dictionary of name to the most recent latencies in seconds.
+
+    Methods:
+        record: This method is used to record the latency of an event.
+        summary: This method is used to report the count and latency percentiles of a name.
+        stats: This method is used to report the summaries of all names.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.counts = {}
+        self.latencies = {}
+
+    def record(self, name, seconds):
+        if name not in self.latencies:
+            self.counts[name] = 0
+            self.latencies[name] = deque(maxlen=self.window)
+        self.counts[name] += 1
+        self.latencies[name].append(seconds)
+
+    def summary(self, name):
+        latencies = np.array(self.latencies[name]) * 1000
+        return {
+            "count": self.counts[name],
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "mean_ms": float(latencies.mean())
+        }
+
+    def stats(self):
+        return {name: self.summary(name) for name in self.latencies}
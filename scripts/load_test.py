@@ -0,0 +1,369 @@
+# library imports
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+import pandas as pd
+import numpy as np
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import urllib.parse
+
+from chat_logging import read_chat_log
+
+ENDPOINTS = ["chat_v0", "chat_v1", "chat_v2"]
+
+# metrics where a higher value is worse, used to flag regressions when comparing two reports
+LOWER_IS_BETTER = ["p50_ms", "p95_ms", "p99_ms", "ttfb_p50_ms", "error_rate"]
+
+def load_questions(test_questions_file_path, endpoints):
+    """
+    Function to get a request for every test question on every endpoint.
+
+    Args:
+        test_questions_file_path (str): Path to the .csv file containing the test questions
+        endpoints (list): endpoints the questions are sent to
+
+    Returns:
+        list: (endpoint, question, arrival offset in seconds) tuples, without arrival offsets
+    """
+
+    questions = pd.read_csv(test_questions_file_path).iloc[:, 0].astype(str).tolist()
+    return [(endpoint, question, None) for question in questions for endpoint in endpoints]
+
+def load_chat_log(log_file_pattern, endpoints, since=None, until=None):
+    """
+    Function to get the requests of a chat log with the time they arrived, to replay the logged query stream.
+
+    Args:
+        log_file_pattern (str): Path or glob pattern of the chat logs
+        endpoints (list): endpoints to keep, None keeps all
+        since (str): ISO time, earlier records are skipped
+        until (str): ISO time, later records are skipped
+
+    Returns:
+        list: (endpoint, question, arrival offset in seconds) tuples
+    """
+
+    requests, first = [], None
+    for record in read_chat_log(log_file_pattern, endpoints, since, until):
+        arrived = datetime.fromisoformat(record["time"]).timestamp()
+        first = arrived if first is None else first
+        requests.append((record["endpoint"], record["question"], arrived - first))
+    return requests
+
+async def send(session, base_url, endpoint, question):
+    """
+    Function to send a question to an endpoint and read the whole response, e.g. all events of a streaming endpoint.
+
+    Args:
+        session (aiohttp.ClientSession): client session with the api key header
+        base_url (str): url of the server
+        endpoint (str): endpoint the question is sent to
+        question (str): question string
+
+    Returns:
+        int: status code, 0 if the request failed without a response
+        float: seconds until the first byte of the body
+        bytes: body of the response
+    """
+
+    start = time.perf_counter()
+    try:
+        async with session.get(f"{base_url}/{endpoint}/{urllib.parse.quote(question, safe='')}") as response:
+            first = await response.content.readany()
+            ttfb = time.perf_counter() - start
+            body = first + await response.read()
+            return response.status, ttfb, body
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return 0, time.perf_counter() - start, b""
+
+async def run_load(base_url, api_key, requests, mode, concurrency, rate, duration, speedup, timeout):
+    """
+    Function to send requests in a closed loop, where a fixed number of clients send their next request once they have
+    the answer to the previous one, or in an open loop, where requests arrive at a fixed rate or at the times they
+    were logged, whether or not the server keeps up. In the open loop, the latency is measured from the time a request
+    was due, so a server that falls behind is not hidden by requests that were sent late.
+
+    Args:
+        base_url (str): url of the server
+        api_key (str): api key of the server
+        requests (list): (endpoint, question, arrival offset) tuples, sent in turn
+        mode (str): "closed" or "open"
+        concurrency (int): number of clients in the closed loop, maximum number of open connections in the open loop
+        rate (float): requests per second in the open loop, 0 replays the logged arrival times
+        duration (float): seconds to send requests for, 0 sends every request once
+        speedup (float): factor the logged arrival times are replayed faster with
+        timeout (float): seconds a request may take at most
+
+    Returns:
+        pd.DataFrame: endpoint, status, latency and time to first byte of every request
+        float: seconds the test took
+    """
+
+    results = []
+    started = time.perf_counter()
+
+    def next_requests():
+        # loop over the requests again until the duration is over
+        while True:
+            for request in requests:
+                yield request
+            if not duration:
+                return
+
+    def running():
+        return not duration or time.perf_counter() - started < duration
+
+    async def timed_send(session, endpoint, question, due):
+        sent = time.perf_counter()
+        status, ttfb, _ = await send(session, base_url, endpoint, question)
+        results.append((endpoint, status, time.perf_counter() - due, sent - due + ttfb))
+
+    connector = aiohttp.TCPConnector(limit=concurrency if mode == "open" else 0)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, headers={"api-key": api_key}, timeout=client_timeout) as session:
+
+        if mode == "closed":
+            pending = next_requests()
+
+            async def client():
+                for endpoint, question, _ in pending:
+                    if not running():
+                        return
+                    await timed_send(session, endpoint, question, time.perf_counter())
+
+            await asyncio.gather(*[client() for _ in range(concurrency)])
+
+        else:
+            # poisson arrivals at the given rate, or the logged arrival times, which repeat after the last one
+            if not rate and (requests[-1][2] is None or (duration and not requests[-1][2])):
+                raise ValueError("the open loop needs a rate, or a logged query stream that spans some time")
+            replay_length = (requests[-1][2] or 0.0) / speedup
+
+            tasks = []
+            rng = random.Random(0)
+            due = started
+            for i, (endpoint, question, offset) in enumerate(next_requests()):
+                if rate:
+                    due += rng.expovariate(rate)
+                else:
+                    due = started + offset / speedup + (i // len(requests)) * replay_length
+                if duration and due - started >= duration:
+                    break
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                tasks.append(asyncio.ensure_future(timed_send(session, endpoint, question, due)))
+            await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    return pd.DataFrame(results, columns=["endpoint", "status", "latency", "ttfb"]), elapsed
+
+def summarize(results, elapsed):
+    """
+    Function to summarize the requests of a load test per endpoint and over all endpoints.
+
+    Args:
+        results (pd.DataFrame): output of run_load
+        elapsed (float): seconds the test took
+
+    Returns:
+        dict: requests, throughput, error rate and latency percentiles in milliseconds per endpoint and "all"
+    """
+
+    def summary(group):
+        ok = group[group["status"] == 200]
+        latencies, ttfbs = ok["latency"] * 1000, ok["ttfb"] * 1000
+        return {
+            "requests": int(len(group)),
+            "errors": int((group["status"] != 200).sum()),
+            "error_rate": float((group["status"] != 200).mean()) if len(group) else 0.0,
+            "throughput_rps": float(len(ok) / elapsed),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(ok) else None,
+            "p95_ms": float(np.percentile(latencies, 95)) if len(ok) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(ok) else None,
+            "ttfb_p50_ms": float(np.percentile(ttfbs, 50)) if len(ok) else None,
+            "status_codes": {str(status): int(count) for status, count in group["status"].value_counts().items()}
+        }
+
+    summaries = {endpoint: summary(group) for endpoint, group in results.groupby("endpoint")}
+    summaries["all"] = summary(results)
+    return summaries
+
+def compare(baseline, candidate, threshold):
+    """
+    Function to compare the summaries of two load test reports.
+
+    Args:
+        baseline (dict): report of the earlier run
+        candidate (dict): report of the later run
+        threshold (float): relative change of a latency or the error rate above which it counts as a regression, e.g. 0.1
+
+    Returns:
+        pd.DataFrame: baseline, candidate and relative change of every metric per endpoint, and whether it regressed
+    """
+
+    rows = []
+    for endpoint in baseline["summary"]:
+        if endpoint not in candidate["summary"]:
+            continue
+        for metric in ["throughput_rps"] + LOWER_IS_BETTER:
+            before, after = baseline["summary"][endpoint][metric], candidate["summary"][endpoint][metric]
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else (0.0 if after == before else float("inf"))
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            rows.append({"endpoint": endpoint, "metric": metric, "baseline": before, "candidate": after, "change": change, "regression": worse})
+
+    return pd.DataFrame(rows)
+
+async def wait_until_ready(base_url, timeout):
+    """
+    Function to wait until the readiness endpoint of the server answers 200.
+
+    Args:
+        base_url (str): url of the server
+        timeout (float): seconds to wait at most
+
+    Returns:
+        None
+    """
+
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            try:
+                async with session.get(f"{base_url}/readyz") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+
+    raise TimeoutError(f"{base_url} not ready after {timeout} seconds")
+
+@contextmanager
+def stub_server(port, openai_port, openai_latency_ms):
+    """
+    Function to run the chatbot with stubbed models and search backend, and a stubbed OpenAI service, so that the
+    load test runs offline.
+
+    Args:
+        port (int): port of the chatbot
+        openai_port (int): port of the stubbed OpenAI service
+        openai_latency_ms (float): time the stubbed OpenAI service takes until its first token
+
+    Returns:
+        context manager: the servers run inside the with block
+    """
+
+    openai_server = subprocess.Popen(
+        [sys.executable, "fake_openai_server.py", "--port", str(openai_port), "--latency_ms", str(openai_latency_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    env = dict(os.environ, STUB_MODELS="1", OPENAI_API_BASE=f"http://127.0.0.1:{openai_port}/v1")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "chatbot:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    try:
+        yield
+    finally:
+        for process in (server, openai_server):
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+
+def run(args):
+    """
+    Function to run a load test and write its report.
+
+    Args:
+        args (argparse.Namespace): arguments of the run command
+
+    Returns:
+        dict: report
+    """
+
+    endpoints = args.endpoints.split(",") if args.endpoints else None
+    if args.log_file_pattern:
+        requests = load_chat_log(args.log_file_pattern, endpoints, args.since, args.until)
+    else:
+        requests = load_questions(args.test_questions_file_path, endpoints or ENDPOINTS)
+    if not requests:
+        raise ValueError("no requests to send")
+
+    with open("../config.json") as f:
+        api_key = json.load(f)["api_key"]
+
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    with stub_server(args.port, args.openai_port, args.openai_latency_ms) if args.stub else nullcontext():
+        asyncio.run(wait_until_ready(base_url, args.startup_timeout))
+        results, elapsed = asyncio.run(run_load(
+            base_url, api_key, requests, args.mode, args.concurrency, args.rate, args.duration, args.speedup, args.timeout
+        ))
+
+    config = {key: value for key, value in vars(args).items() if key != "command"}
+    return {
+        "started": datetime.now(timezone.utc).isoformat(),
+        "config": config,
+        "elapsed_s": elapsed,
+        "summary": summarize(results, elapsed)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='load_test',
+                    description='This script load tests the chat endpoints with the test questions or a logged query stream, writes a JSON report and compares two reports.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run a load test and write its report')
+    run_parser.add_argument('--test_questions_file_path', type=str, default="../performance_testing/test_questions.csv", help='Path to the .csv file containing the test questions')
+    run_parser.add_argument('--log_file_pattern', type=str, help='Path or glob pattern of chat logs to replay instead of the test questions')
+    run_parser.add_argument('--since', type=str, help='ISO time, earlier logged requests are skipped')
+    run_parser.add_argument('--until', type=str, help='ISO time, later logged requests are skipped')
+    run_parser.add_argument('--endpoints', type=str, help='Comma separated endpoints, by default the test questions are sent to chat_v0, chat_v1 and chat_v2 and all logged requests are replayed')
+    run_parser.add_argument('--mode', type=str, choices=["closed", "open"], default="closed", help='Closed loop with a fixed number of clients, or open loop with a fixed arrival rate')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='Number of clients in the closed loop, maximum number of connections in the open loop')
+    run_parser.add_argument('--rate', type=float, default=0, help='Requests per second in the open loop, 0 replays the logged arrival times')
+    run_parser.add_argument('--speedup', type=float, default=1, help='Factor the logged arrival times are replayed faster with')
+    run_parser.add_argument('--duration', type=float, default=0, help='Seconds to send requests for, 0 sends every request once')
+    run_parser.add_argument('--timeout', type=float, default=60, help='Seconds a request may take at most')
+    run_parser.add_argument('--url', type=str, help='Url of the server, e.g. http://localhost:8060')
+    run_parser.add_argument('--port', type=int, default=8060, help='Port of the server on this machine')
+    run_parser.add_argument('--stub', action='store_true', help='Start the chatbot with stubbed models, search backend and OpenAI service, to run offline')
+    run_parser.add_argument('--openai_port', type=int, default=8099, help='Port of the stubbed OpenAI service')
+    run_parser.add_argument('--openai_latency_ms', type=float, default=500, help='Time the stubbed OpenAI service takes until its first token')
+    run_parser.add_argument('--startup_timeout', type=float, default=600, help='Seconds to wait at most for the server to be ready')
+    run_parser.add_argument('--output_file_path', type=str, help='Path of the JSON report, by default ../performance_testing/load_test_<time>.json')
+
+    compare_parser = commands.add_parser('compare', help='Compare two reports')
+    compare_parser.add_argument('baseline_file_path', type=str, help='Path to the report of the earlier run')
+    compare_parser.add_argument('candidate_file_path', type=str, help='Path to the report of the later run')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='Relative change above which a latency or error rate counts as a regression')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    if args.command == "run":
+        # run the load test, save the report and print the summary
+        report = run(args)
+        output_file_path = args.output_file_path or f"../performance_testing/load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(output_file_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(pd.DataFrame(report["summary"]).T.drop(columns="status_codes").astype(float).round(1).to_string())
+        print(f"Report saved to {output_file_path}")
+
+    else:
+        # compare the reports, exit with 1 if anything regressed so that the comparison can gate a change
+        with open(args.baseline_file_path) as f:
+            baseline = json.load(f)
+        with open(args.candidate_file_path) as f:
+            candidate = json.load(f)
+        comparison = compare(baseline, candidate, args.threshold)
+        print(comparison.round(3).to_string(index=False))
+        sys.exit(1 if comparison["regression"].any() else 0)
@@ -0,0 +1,136 @@
+#library imports
+import asyncio
+
+from inference_pool import server_busy
+
+class micro_batcher():
+    """
+    This class is used to collect concurrent requests for a few milliseconds and run them through a model as one batch.
+
+    Attributes:
+        batch_fn: Function that takes a list of argument tuples and returns a list of results in the same order.
+        max_batch_size: Maximum number of requests grouped into a single batch.
+        max_wait: Maximum time (in seconds) the first request of a batch waits for more requests to arrive.
+        executor: Executor used to run the batch function, None uses the default executor of the event loop.
+        max_queue_size: Maximum number of requests waiting for a batch, 0 means no limit.
+
+    Methods:
+        submit: This method is used to queue a request and wait for its own result.
+        stats: This method is used to report the number and sizes of the batches run so far.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, executor=None, max_queue_size=0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.executor = executor
+        self.max_queue_size = max(0, int(max_queue_size))
+
+        self.counts = {"batches": 0, "requests": 0, "largest_batch": 0}
+
+        # queue and worker task are bound to the event loop that submits the first request
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, *args):
+        '''
+        Queue a request and wait until the batch containing it has been processed.
+
+        Args:
+            *args: Arguments of a single request (e.g. question and context).
+
+        Returns:
+            Result of the batch function for this request.
+        '''
+
+        loop = asyncio.get_running_loop()
+
+        # start the batching worker on first use
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        # reject the request right away instead of letting the queue grow without limit
+        if self.max_queue_size and self._queue.qsize() >= self.max_queue_size:
+            raise server_busy()
+
+        future = loop.create_future()
+        await self._queue.put((args, future))
+        return await future
+
+    async def _collect(self):
+        '''
+        Wait for the first request and then keep collecting until the batch is full or max_wait has passed.
+
+        Args:
+            None
+
+        Returns:
+            list: List of (args, future) tuples.
+        '''
+
+        loop = asyncio.get_running_loop()
+
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # take whatever is already waiting without yielding to the event loop
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        '''
+        Worker loop that forms batches and hands every result back to its own request.
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+
+            # skip requests whose client has already gone away
+            batch = [(args, future) for args, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self.counts["batches"] += 1
+            self.counts["requests"] += len(batch)
+            self.counts["largest_batch"] = max(self.counts["largest_batch"], len(batch))
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, [args for args, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            **self.counts,
+            "mean_batch_size": self.counts["requests"] / self.counts["batches"] if self.counts["batches"] else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
@@ -0,0 +1,186 @@
+#library imports
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger("startup")
+
+class model_registry():
+    """
+    This class is used to load models in the background, in parallel, and to load models that were not preloaded on first use.
+
+    Every model is loaded at most once at a time, by whichever thread asks for it first: a background loader, a request or
+    the loader of another model that depends on it. A model that failed to load is loaded again the next time it is needed.
+    A model that a request queued on the loader threads is loaded right away by a loader that depends on it, so that loaders
+    never wait for a queued load that has no free thread to run on.
+
+    Attributes:
+        executor: The thread pool the background loads run on.
+        entries: Dictionary of model name to its loader, state, load time and result.
+        preloaded: The names of the models loaded at startup, the server is ready once all of them are loaded.
+
+    Methods:
+        register: This method is used to add the loader of a model.
+        start: This method is used to load models in the background.
+        get: This method is used to get a model from a worker thread, loading it if needed.
+        aget: This method is used to get a model from the event loop without blocking it, loading it if needed.
+        ready: This method is used to check whether all preloaded models are loaded.
+        status: This method is used to report the state and load time of every model.
+    """
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="model-loader")
+        self.entries = {}
+        self.preloaded = []
+        self.started = None
+        self.lock = threading.Lock()
+
+    def register(self, name, loader):
+        self.entries[name] = {"loader": loader, "state": "not_loaded", "seconds": None, "error": None, "future": Future()}
+
+    def start(self, names=None):
+        '''
+        Load models in the background.
+
+        Args:
+            names (list): Names of the models to load, None loads all registered models.
+
+        Returns:
+            None
+        '''
+
+        self.preloaded = list(self.entries) if names is None else list(names)
+        self.started = time.perf_counter()
+        for name in self.preloaded:
+            self.executor.submit(self.load_if_needed, name)
+
+    def claim(self, name):
+        '''
+        Get the future of a model and whether the caller has to load it.
+
+        Args:
+            name (str): Name of the model.
+
+        Returns:
+            Future: Resolves to the model.
+            bool: True if nobody is loading the model yet and the caller has to.
+        '''
+
+        with self.lock:
+            entry = self.entries[name]
+            if entry["state"] == "failed":
+                entry["future"] = Future()
+                entry["state"] = "not_loaded"
+
+            # a queued load is taken over, it may wait behind the loader that needs the model
+            claimed = entry["state"] in ("not_loaded", "queued")
+            if claimed:
+                entry["state"] = "loading"
+            return entry["future"], claimed
+
+    def queue(self, name):
+        '''
+        Get the future of a model, queueing its load on the loader threads if nobody is loading it yet.
+
+        Args:
+            name (str): Name of the model.
+
+        Returns:
+            Future: Resolves to the model.
+        '''
+
+        with self.lock:
+            entry = self.entries[name]
+            if entry["state"] == "failed":
+                entry["future"] = Future()
+                entry["state"] = "not_loaded"
+            if entry["state"] == "not_loaded":
+                entry["state"] = "queued"
+                self.executor.submit(self.load_queued, name, entry["future"])
+            return entry["future"]
+
+    def load_queued(self, name, future):
+        with self.lock:
+            # a loader that needed the model in the meantime has loaded it itself
+            if self.entries[name]["state"] != "queued" or self.entries[name]["future"] is not future:
+                return
+            self.entries[name]["state"] = "loading"
+        self.load(name, future)
+
+    def load(self, name, future):
+        '''
+        Run the loader of a model and resolve its future.
+
+        Args:
+            name (str): Name of the model.
+            future (Future): Future of the model.
+
+        Returns:
+            None
+        '''
+
+        entry = self.entries[name]
+        start = time.perf_counter()
+        try:
+            model = entry["loader"]()
+        except Exception as e:
+            entry.update(state="failed", seconds=time.perf_counter() - start, error=repr(e))
+            logger.exception(f"Loading {name} failed after {entry['seconds']:.1f} seconds")
+            future.set_exception(e)
+            return
+
+        entry.update(state="ready", seconds=time.perf_counter() - start, error=None)
+        logger.info(f"Loaded {name} in {entry['seconds']:.1f} seconds")
+        future.set_result(model)
+
+        # log once, when the last preloaded model is loaded
+        with self.lock:
+            all_ready = self.started is not None and name in self.preloaded and self.ready()
+            if all_ready:
+                self.started, started = None, self.started
+        if all_ready:
+            logger.info(f"All preloaded models ready {time.perf_counter() - started:.1f} seconds after startup")
+
+    def load_if_needed(self, name):
+        future, claimed = self.claim(name)
+        if claimed:
+            self.load(name, future)
+        return future
+
+    def get(self, name):
+        '''
+        Get a model from a worker thread, loading it in the calling thread if nobody has started to load it yet.
+
+        Args:
+            name (str): Name of the model.
+
+        Returns:
+            The loaded model.
+        '''
+
+        return self.load_if_needed(name).result()
+
+    async def aget(self, name):
+        '''
+        Get a model from the event loop, loading it on the loader threads if nobody has started to load it yet.
+
+        Args:
+            name (str): Name of the model.
+
+        Returns:
+            The loaded model.
+        '''
+
+        return await asyncio.wrap_future(self.queue(name))
+
+    def ready(self, names=None):
+        names = self.preloaded if names is None else names
+        return all(self.entries[name]["state"] == "ready" for name in names)
+
+    def status(self):
+        return {
+            name: {"state": entry["state"], "seconds": entry["seconds"], "error": entry["error"], "preloaded": name in self.preloaded}
+            for name, entry in self.entries.items()
+        }
@@ -0,0 +1,389 @@
+# library imports
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import DPRQuestionEncoder, DPRQuestionEncoderTokenizerFast
+from haystack.nodes import FARMReader
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from pathlib import Path
+import onnxruntime
+import numpy as np
+import torch
+import argparse
+import logging
+import os
+import time
+
+from helper_functions import ONNX_MODEL_DIR, ONNX_INTRA_OP_THREADS
+from t5_qa import t5_qa, T5_MODEL_NAME
+
+DPR_QUERY_MODEL_NAME = "facebook/dpr-question_encoder-single-nq-base"
+READER_MODEL_NAME = "deepset/roberta-base-squad2"
+
+# every exported T5 decoder step passes on four cached tensors per layer
+T5_PAST_NAMES = ("self_key", "self_value", "cross_key", "cross_value")
+
+logger = logging.getLogger("ONNX Export")
+logger.setLevel(logging.INFO)
+
+def onnx_session(model_path, intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """
+    Creates an ONNX Runtime session on the CPU.
+
+    Args:
+        model_path (str): Path of the .onnx file
+        intra_op_threads (int): Number of threads a single operator may use, 0 lets ONNX Runtime use all cores
+
+    Return:
+        onnxruntime.InferenceSession: session
+    """
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads > 0:
+        options.intra_op_num_threads = intra_op_threads
+
+    return onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+def quantize(model_path):
+    """
+    Replaces an ONNX model by its int8 dynamically quantized version, weights are stored as int8 and activations are
+    quantized on the fly, so no calibration data is needed.
+
+    Args:
+        model_path (str): Path of the .onnx file
+
+    Return:
+        None
+    """
+
+    quantized_path = model_path + ".int8"
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    os.replace(quantized_path, model_path)
+
+def export(module, args, model_path, input_names, output_names, dynamic_axes, int8=True):
+    """
+    Exports a PyTorch module to ONNX and quantizes it.
+
+    Args:
+        module (torch.nn.Module): module to export
+        args (tuple): example inputs of the module
+        model_path (str): Path of the .onnx file
+        input_names (list): names of the inputs
+        output_names (list): names of the outputs
+        dynamic_axes (dict): input or output name to the axes whose size can change
+        int8 (bool): quantize the exported model
+
+    Return:
+        None
+    """
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            module.eval(),
+            args,
+            model_path,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes={name: axes for name, axes in dynamic_axes.items() if name in input_names + output_names},
+            opset_version=13,
+            do_constant_folding=True
+        )
+    if int8:
+        quantize(model_path)
+    logger.info(f"Exported {model_path} in {time.perf_counter() - start:.1f} seconds")
+
+class t5_encoder(torch.nn.Module):
+    """
+    T5 encoder returning only the hidden states, the graph run once per input.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+
+    def forward(self, input_ids, attention_mask):
+        return self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+class t5_decoder(torch.nn.Module):
+    """
+    One T5 decoding step with the past keys and values passed as flat tensors, the graph run once per generated token.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.lm_head = model.lm_head
+        self.scale = model.model_dim ** -0.5 if model.config.tie_word_embeddings else 1.0
+
+    def forward(self, decoder_input_ids, attention_mask, encoder_hidden_states, *past):
+        past_key_values = tuple(past[i:i + len(T5_PAST_NAMES)] for i in range(0, len(past), len(T5_PAST_NAMES))) or None
+        outputs = self.decoder(
+            input_ids=decoder_input_ids,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            use_cache=True
+        )
+        logits = self.lm_head(outputs.last_hidden_state[:, -1] * self.scale)
+        return (logits,) + tuple(tensor for layer in outputs.past_key_values for tensor in layer)
+
+def export_t5(output_directory, int8=True):
+    """
+    Exports the T5 answer generator as an encoder, a first decoder step and a decoder step that reuses past keys and values.
+
+    Args:
+        output_directory (str): Directory the models, tokenizer and config are saved to
+        int8 (bool): quantize the exported models
+
+    Return:
+        None
+    """
+
+    os.makedirs(output_directory, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(T5_MODEL_NAME)
+    model = AutoModelForSeq2SeqLM.from_pretrained(T5_MODEL_NAME).eval()
+    tokenizer.save_pretrained(output_directory)
+    model.config.save_pretrained(output_directory)
+
+    # example inputs, only their rank matters since all sequence lengths are dynamic
+    input_ids = torch.tensor([[tokenizer.eos_token_id] * 8] * 2)
+    attention_mask = torch.ones_like(input_ids)
+    export(
+        t5_encoder(model), (input_ids, attention_mask), os.path.join(output_directory, "encoder.onnx"),
+        ["input_ids", "attention_mask"], ["encoder_hidden_states"],
+        {"input_ids": {0: "batch", 1: "encoder_sequence"}, "attention_mask": {0: "batch", 1: "encoder_sequence"},
+         "encoder_hidden_states": {0: "batch", 1: "encoder_sequence"}},
+        int8
+    )
+
+    with torch.no_grad():
+        encoder_hidden_states = t5_encoder(model)(input_ids, attention_mask)
+        decoder_input_ids = torch.full((2, 1), model.config.decoder_start_token_id)
+        past = t5_decoder(model)(decoder_input_ids, attention_mask, encoder_hidden_states)[1:]
+
+    layers = model.config.num_decoder_layers
+    past_names = [f"past.{layer}.{name}" for layer in range(layers) for name in T5_PAST_NAMES]
+    present_names = [f"present.{layer}.{name}" for layer in range(layers) for name in T5_PAST_NAMES]
+    decoder_axes = {
+        "decoder_input_ids": {0: "batch"},
+        "attention_mask": {0: "batch", 1: "encoder_sequence"},
+        "encoder_hidden_states": {0: "batch", 1: "encoder_sequence"},
+        "logits": {0: "batch"}
+    }
+    for past_name, present_name in zip(past_names, present_names):
+        sequence = "encoder_sequence" if "cross" in past_name else "past_sequence"
+        decoder_axes[past_name] = {0: "batch", 2: sequence}
+        decoder_axes[present_name] = {0: "batch", 2: sequence if "cross" in present_name else "present_sequence"}
+
+    # the first step has no past, the following steps feed back what the previous step returned
+    export(
+        t5_decoder(model), (decoder_input_ids, attention_mask, encoder_hidden_states), os.path.join(output_directory, "decoder_init.onnx"),
+        ["decoder_input_ids", "attention_mask", "encoder_hidden_states"], ["logits"] + present_names,
+        decoder_axes, int8
+    )
+    export(
+        t5_decoder(model), (decoder_input_ids, attention_mask, encoder_hidden_states) + tuple(past), os.path.join(output_directory, "decoder_step.onnx"),
+        ["decoder_input_ids", "attention_mask", "encoder_hidden_states"] + past_names, ["logits"] + present_names,
+        decoder_axes, int8
+    )
+
+class t5_qa_onnx(t5_qa):
+    """
+    This class is used to generate answers with the exported T5 model under ONNX Runtime. Answers are generated with greedy
+    decoding, the same way the streaming endpoints do, instead of beam search.
+
+    Attributes:
+        tokenizer: The tokenizer to be used for the model.
+        config: The config of the exported model.
+        encoder: The ONNX Runtime session of the encoder.
+        decoder_init: The ONNX Runtime session of the first decoding step.
+        decoder_step: The ONNX Runtime session of the following decoding steps.
+        max_length: The maximum number of input tokens passed to the model.
+        length_buckets: The sorted input lengths a batch is padded to, the smallest one that fits the longest input is used.
+
+    Methods:
+        decode_steps: This method is used to run greedy decoding on a batch, yielding the next token of every input at each step.
+        generate_answers: This method is used to generate answers for a batch of questions and contexts.
+    """
+    def __init__(self, model_directory=os.path.join(ONNX_MODEL_DIR, "t5"), intra_op_threads=ONNX_INTRA_OP_THREADS, max_length=1024, length_buckets=(128, 256, 512, 768, 1024)):
+
+        # the inputs are encoded on the CPU and handed to ONNX Runtime as numpy arrays
+        self.device = torch.device("cpu")
+
+        # load tokenizer, config and sessions
+        self.tokenizer = AutoTokenizer.from_pretrained(model_directory)
+        self.config = AutoConfig.from_pretrained(model_directory)
+        self.encoder = onnx_session(os.path.join(model_directory, "encoder.onnx"), intra_op_threads)
+        self.decoder_init = onnx_session(os.path.join(model_directory, "decoder_init.onnx"), intra_op_threads)
+        self.decoder_step = onnx_session(os.path.join(model_directory, "decoder_step.onnx"), intra_op_threads)
+
+        # the exporter drops inputs a graph does not use, e.g. the encoder states once the cross attention keys are cached
+        self.step_inputs = set(input.name for input in self.decoder_step.get_inputs())
+        self.past_names = [output.name.replace("present.", "past.", 1) for output in self.decoder_init.get_outputs()[1:]]
+
+        # set input length limits
+        self.max_length = max_length
+        self.length_buckets = sorted(set([min(bucket, max_length) for bucket in length_buckets] + [max_length]))
+
+    def decode_steps(self, input_tokenized, max_length=50, min_length=20):
+
+        # encode the input once, every decoding step only runs the decoder on the newest token
+        eos_token_id = self.tokenizer.eos_token_id
+        attention_mask = input_tokenized["attention_mask"].numpy()
+        encoder_hidden_states = self.encoder.run(None, {
+            "input_ids": input_tokenized["input_ids"].numpy(),
+            "attention_mask": attention_mask
+        })[0]
+
+        decoder_input_ids = np.full((len(attention_mask), 1), self.config.decoder_start_token_id, dtype=np.int64)
+        inputs = {"attention_mask": attention_mask, "encoder_hidden_states": encoder_hidden_states}
+        outputs = self.decoder_init.run(None, {"decoder_input_ids": decoder_input_ids, **inputs})
+
+        for step in range(1, max_length):
+            logits = outputs[0]
+
+            # like generate(min_length=...), the answer cannot end before min_length tokens
+            if step < min_length - 1:
+                logits[:, eos_token_id] = -np.inf
+
+            next_tokens = logits.argmax(-1)
+            yield next_tokens.tolist()
+
+            feed = {"decoder_input_ids": next_tokens[:, None].astype(np.int64), **inputs, **dict(zip(self.past_names, outputs[1:]))}
+            outputs = self.decoder_step.run(None, {name: value for name, value in feed.items() if name in self.step_inputs})
+
+    def generate_answers(self, questions, contexts):
+
+        # encode questions and contexts as one padded batch
+        input_tokenized = self.encode(questions, contexts)
+
+        # decode greedily until every answer has ended
+        generated = [[] for _ in questions]
+        finished = [False] * len(questions)
+        for next_tokens in self.decode_steps(input_tokenized):
+            for i, next_token in enumerate(next_tokens):
+                if next_token == self.tokenizer.eos_token_id:
+                    finished[i] = True
+                elif not finished[i]:
+                    generated[i].append(next_token)
+            if all(finished):
+                break
+
+        # decode output strings
+        return [str(self.tokenizer.decode(ids, clean_up_tokenization_spaces=True, skip_special_tokens=True)) for ids in generated]
+
+class dpr_query_encoder(torch.nn.Module):
+    """
+    DPR question encoder returning the question embedding.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).pooler_output
+
+def export_dpr_query_encoder(output_directory, int8=True):
+    """
+    Exports the DPR question encoder. Passages are embedded offline by index_in_es.py and keep their PyTorch embeddings.
+
+    Args:
+        output_directory (str): Directory the model and tokenizer are saved to
+        int8 (bool): quantize the exported model
+
+    Return:
+        None
+    """
+
+    os.makedirs(output_directory, exist_ok=True)
+    tokenizer = DPRQuestionEncoderTokenizerFast.from_pretrained(DPR_QUERY_MODEL_NAME)
+    model = DPRQuestionEncoder.from_pretrained(DPR_QUERY_MODEL_NAME).eval()
+    tokenizer.save_pretrained(output_directory)
+
+    inputs = tokenizer(["example question", "another example question"], padding=True, return_tensors="pt")
+    export(
+        dpr_query_encoder(model), (inputs["input_ids"], inputs["attention_mask"]), os.path.join(output_directory, "model.onnx"),
+        ["input_ids", "attention_mask"], ["embeddings"],
+        {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}, "embeddings": {0: "batch"}},
+        int8
+    )
+
+class onnx_query_encoder():
+    """
+    This class is used to embed questions with the exported DPR question encoder under ONNX Runtime.
+
+    Attributes:
+        tokenizer: The DPR question tokenizer.
+        session: The ONNX Runtime session of the encoder.
+        max_length: The maximum number of question tokens, as in the haystack DPR retriever.
+
+    Methods:
+        embed_queries: This method is used to embed a batch of questions.
+    """
+
+    def __init__(self, model_directory=os.path.join(ONNX_MODEL_DIR, "dpr_query_encoder"), intra_op_threads=ONNX_INTRA_OP_THREADS, max_length=64):
+        self.tokenizer = DPRQuestionEncoderTokenizerFast.from_pretrained(model_directory)
+        self.session = onnx_session(os.path.join(model_directory, "model.onnx"), intra_op_threads)
+        self.max_length = max_length
+
+    def embed_queries(self, queries):
+        inputs = self.tokenizer(list(queries), padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        return self.session.run(None, {
+            "input_ids": inputs["input_ids"].astype(np.int64),
+            "attention_mask": inputs["attention_mask"].astype(np.int64)
+        })[0]
+
+def export_reader(output_directory, int8=True):
+    """
+    Exports the reader with haystack, which also saves the processor and config files the FARMReader needs to load it.
+
+    Args:
+        output_directory (str): Directory the model is saved to
+        int8 (bool): quantize the exported model
+
+    Return:
+        None
+    """
+
+    start = time.perf_counter()
+    FARMReader.convert_to_onnx(model_name=READER_MODEL_NAME, output_path=Path(output_directory), task_type="question_answering")
+    if int8:
+        quantize(os.path.join(output_directory, "model.onnx"))
+    logger.info(f"Exported {output_directory} in {time.perf_counter() - start:.1f} seconds")
+
+def load_onnx_reader(model_directory=os.path.join(ONNX_MODEL_DIR, "reader"), intra_op_threads=ONNX_INTRA_OP_THREADS):
+    """
+    Loads the exported reader as a FARMReader running under ONNX Runtime.
+
+    Args:
+        model_directory (str): Directory of the exported reader
+        intra_op_threads (int): Number of threads a single operator may use, 0 lets ONNX Runtime use all cores
+
+    Return:
+        FARMReader: reader
+    """
+
+    reader = FARMReader(model_name_or_path=model_directory, use_gpu=False)
+
+    # haystack always gives ONNX Runtime one thread per core, replace its session with one that uses the configured threads
+    reader.inferencer.model.onnx_session = onnx_session(os.path.join(model_directory, "model.onnx"), intra_op_threads)
+
+    return reader
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='onnx_backend',
+                    description='This script exports the T5 answer generator, the DPR question encoder and the reader to int8 quantized ONNX models for INFERENCE_BACKEND=onnx.')
+    parser.add_argument('--output_directory', type=str, default=ONNX_MODEL_DIR, help='Directory the ONNX models are saved to')
+    parser.add_argument('--models', type=str, nargs="+", default=["t5", "dpr_query_encoder", "reader"], choices=["t5", "dpr_query_encoder", "reader"], help='Models to export')
+    parser.add_argument('--fp32', action='store_true', help='Keep the exported models in fp32 instead of quantizing them to int8')
+
+    # parse arguments
+    args = parser.parse_args()
+    logging.basicConfig()
+
+    # export the models
+    exporters = {"t5": export_t5, "dpr_query_encoder": export_dpr_query_encoder, "reader": export_reader}
+    for name in args.models:
+        exporters[name](os.path.join(args.output_directory, name), int8=not args.fp32)
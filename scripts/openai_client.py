@@ -0,0 +1,434 @@
+#library imports
+from collections import deque
+import aiohttp
+import asyncio
+import json
+import os
+import random
+import time
+
+from latency_stats import latency_stats
+
+# OpenAI compatible endpoint, e.g. the fake server of the load tests, and the limits of every call
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+OPENAI_TIMEOUT_S = float(os.environ.get("OPENAI_TIMEOUT_S", 20))
+OPENAI_DEADLINE_S = float(os.environ.get("OPENAI_DEADLINE_S", 30))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 3))
+OPENAI_POOL_SIZE = int(os.environ.get("OPENAI_POOL_SIZE", 32))
+OPENAI_HEDGE = os.environ.get("OPENAI_HEDGE", "0") == "1"
+OPENAI_HEDGE_MIN_MS = float(os.environ.get("OPENAI_HEDGE_MIN_MS", 1000))
+OPENAI_BREAKER_FAILURE_RATE = float(os.environ.get("OPENAI_BREAKER_FAILURE_RATE", 0.5))
+OPENAI_BREAKER_WINDOW = int(os.environ.get("OPENAI_BREAKER_WINDOW", 50))
+OPENAI_BREAKER_MIN_CALLS = int(os.environ.get("OPENAI_BREAKER_MIN_CALLS", 20))
+OPENAI_BREAKER_RESET_S = float(os.environ.get("OPENAI_BREAKER_RESET_S", 30))
+
+# rate limits, timeouts and server errors are worth another attempt, other client errors are not
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class openai_unavailable(Exception):
+    """
+    Raised when OpenAI gave no answer within the deadline, failed for good, or is not called because the circuit
+    breaker is open. The caller can answer with the local T5 model instead.
+    """
+
+class openai_status_error(Exception):
+    """
+    Raised for an attempt that OpenAI answered with an error status.
+    """
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"OpenAI answered with status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+class circuit_breaker():
+    """
+    This class is used to stop calling a failing service for a while. The breaker opens when at least failure_rate of
+    the last window attempts failed, once at least min_calls attempts were made, and then rejects calls right away.
+    After reset_timeout seconds a single trial call is let through (half open), its success closes the breaker and its
+    failure opens it again.
+
+    A rate over a window instead of a number of failures in a row keeps the breaker closed under transient errors,
+    e.g. rate limits of a few percent of the calls, which many concurrent calls turn into streaks of failures.
+
+    Attributes:
+        failure_rate: The share of failed attempts in the window that opens the breaker.
+        window: The number of recent attempts the failure rate is computed over.
+        min_calls: The minimum number of attempts in the window before the breaker can open.
+        reset_timeout: The number of seconds the breaker stays open before a trial call is let through.
+        state: "closed", "open" or "half_open".
+
+    Methods:
+        allow: This method is used to check if a call may be made.
+        record_success: This method is used to record a successful attempt.
+        record_failure: This method is used to record a failed attempt.
+        stats: This method is used to report the state, the recent failure rate and how often the breaker opened.
+    """
+
+    def __init__(self, failure_rate=0.5, window=50, min_calls=20, reset_timeout=30):
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.counts = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        '''
+        Check if a call may be made, while the breaker is half open only one trial call at a time is allowed.
+
+        Args:
+            None
+
+        Returns:
+            bool: True if the call may be made.
+        '''
+
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+
+        if self.state == "closed" or (self.state == "half_open" and not self.trial_running):
+            self.trial_running = self.state == "half_open"
+            return True
+
+        self.counts["rejected"] += 1
+        return False
+
+    def open(self):
+        if self.state != "open":
+            self.counts["opened"] += 1
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+        # the window starts over once the breaker closes again
+        self.outcomes.clear()
+
+    def record_success(self):
+        if self.state == "half_open":
+            self.state = "closed"
+        self.outcomes.append(False)
+        self.trial_running = False
+
+    def record_failure(self):
+        self.outcomes.append(True)
+        failures = sum(self.outcomes)
+        if self.state == "half_open" or (len(self.outcomes) >= self.min_calls and failures >= self.failure_rate * len(self.outcomes)):
+            self.open()
+        self.trial_running = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "recent_failure_rate": sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0,
+            **self.counts
+        }
+
+class openai_client():
+    """
+    This class is used to call the OpenAI chat completion API over a pool of kept-alive connections, with a deadline
+    for every call, retries with jittered exponential backoff, a circuit breaker and optional hedged requests.
+
+    Attributes:
+        api_key: The OpenAI api key.
+        api_base: The url of the OpenAI compatible API.
+        timeout: The maximum number of seconds of a single attempt (of a stream: between two chunks).
+        deadline: The maximum number of seconds of a call, including all retries.
+        max_retries: The maximum number of attempts after the first one.
+        backoff_base: The backoff in seconds before the first retry, it doubles with every retry.
+        backoff_max: The maximum backoff in seconds.
+        pool_size: The maximum number of open connections.
+        hedge: Whether a second request is sent when the first one is slower than the recent p95 latency.
+        hedge_min_ms: The minimum delay in milliseconds before a hedged request is sent.
+        breaker: The circuit breaker of the API.
+
+    Methods:
+        chat_completion: This method is used to get the answer of a chat completion.
+        stream_chat_completion: This method is used to get the answer of a chat completion in pieces.
+        close: This method is used to close the connections.
+        stats: This method is used to report attempts, retries, hedges, the breaker state and latencies.
+    """
+
+    def __init__(self, api_key, api_base=OPENAI_API_BASE, timeout=OPENAI_TIMEOUT_S, deadline=OPENAI_DEADLINE_S,
+                 max_retries=OPENAI_MAX_RETRIES, backoff_base=0.5, backoff_max=8.0, pool_size=OPENAI_POOL_SIZE,
+                 hedge=OPENAI_HEDGE, hedge_min_ms=OPENAI_HEDGE_MIN_MS, breaker=None):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.breaker = breaker or circuit_breaker(OPENAI_BREAKER_FAILURE_RATE, OPENAI_BREAKER_WINDOW, OPENAI_BREAKER_MIN_CALLS, OPENAI_BREAKER_RESET_S)
+
+        self.latencies = latency_stats(window=200)
+        self.counts = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "errors": 0, "hedges": 0, "hedge_wins": 0, "unavailable": 0}
+
+        # the session and its connections are bound to the event loop of the first call
+        self._session = None
+        self._loop = None
+
+    def session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def backoff(self, retry, retry_after=None):
+        # full jitter, so that clients that failed at the same time do not retry at the same time
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def hedge_delay(self):
+        '''
+        Get the delay after which a second request is sent, the recent p95 latency of successful attempts.
+
+        Args:
+            None
+
+        Returns:
+            float: Delay in seconds, None if hedging is off or too few latencies were recorded.
+        '''
+
+        if not self.hedge or self.latencies.counts.get("completion", 0) < 20:
+            return None
+        return max(self.hedge_min_ms, self.latencies.summary("completion")["p95_ms"]) / 1000
+
+    async def attempt(self, payload, timeout):
+        '''
+        Send a single chat completion request.
+
+        Args:
+            payload (dict): Request body.
+            timeout (float): Maximum number of seconds of the attempt.
+
+        Returns:
+            str: Content of the answer.
+        '''
+
+        start = time.perf_counter()
+        async with self.session().post(
+            f"{self.api_base}/chat/completions", json=payload, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            if response.status != 200:
+                raise openai_status_error(response.status, parse_retry_after(response))
+            body = await response.json(content_type=None)
+        content = body["choices"][0]["message"]["content"]
+        if content is None:
+            raise ValueError("OpenAI answered without content")
+        self.latencies.record("completion", time.perf_counter() - start)
+        return content
+
+    async def hedged_attempt(self, payload, timeout):
+        '''
+        Send a chat completion request, and a second one if the first is slower than usual. The first answer wins and
+        the other request is cancelled.
+
+        Args:
+            payload (dict): Request body.
+            timeout (float): Maximum number of seconds of the attempt.
+
+        Returns:
+            str: Content of the answer.
+        '''
+
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await self.attempt(payload, timeout)
+
+        first = asyncio.ensure_future(self.attempt(payload, timeout))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.counts["hedges"] += 1
+        second = asyncio.ensure_future(self.attempt(payload, timeout - delay))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.counts["hedge_wins"] += 1
+                        return task.result()
+
+            # both requests failed
+            raise first.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def with_retries(self, send):
+        '''
+        Run attempts until one succeeds, the retries are used up, the deadline passes or the breaker opens.
+
+        Args:
+            send (function): Coroutine function that takes the timeout of an attempt and makes the attempt.
+
+        Returns:
+            Result of the successful attempt.
+        '''
+
+        self.counts["calls"] += 1
+        deadline = time.monotonic() + self.deadline
+
+        for retry in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                break
+            trial = self.breaker.state == "half_open"
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self.counts["attempts"] += 1
+            retry_after = None
+            try:
+                result = await send(min(self.timeout, remaining))
+                self.breaker.record_success()
+                return result
+            except asyncio.TimeoutError:
+                self.counts["timeouts"] += 1
+            except openai_status_error as error:
+                self.counts["errors"] += 1
+                if error.status not in RETRYABLE_STATUS:
+                    # the request itself is wrong, e.g. a bad api key, trying again does not help
+                    break
+                retry_after = error.retry_after
+            except Exception:
+                # connection errors, and answers that are not a chat completion, e.g. a body that is not json, an
+                # answer without content or a stream that ends before its first piece
+                self.counts["errors"] += 1
+            finally:
+                # also when the caller went away, the trial call of a half open breaker has to be given back
+                if trial:
+                    self.breaker.trial_running = False
+            self.breaker.record_failure()
+
+            # wait before the next attempt, unless the wait would go past the deadline
+            if retry < self.max_retries:
+                wait = self.backoff(retry, retry_after)
+                if time.monotonic() + wait >= deadline:
+                    break
+                self.counts["retries"] += 1
+                await asyncio.sleep(wait)
+
+        self.counts["unavailable"] += 1
+        raise openai_unavailable()
+
+    async def chat_completion(self, messages, model="gpt-3.5-turbo"):
+        '''
+        Get the answer of a chat completion.
+
+        Args:
+            messages (list): Chat messages.
+            model (str): Model name.
+
+        Returns:
+            str: Content of the answer.
+        '''
+
+        payload = {"model": model, "messages": messages}
+        return await self.with_retries(lambda timeout: self.hedged_attempt(payload, timeout))
+
+    async def stream_chat_completion(self, messages, model="gpt-3.5-turbo"):
+        '''
+        Get the answer of a chat completion in pieces as OpenAI generates it. Attempts are retried until the first
+        piece arrives, a stream that breaks off after that raises openai_unavailable.
+
+        Args:
+            messages (list): Chat messages.
+            model (str): Model name.
+
+        Returns:
+            async generator: Pieces of the answer.
+        '''
+
+        payload = {"model": model, "messages": messages, "stream": True}
+
+        async def open_stream(timeout):
+            # wait at most timeout seconds for the response and its first piece
+            response = await self.session().post(
+                f"{self.api_base}/chat/completions", json=payload, timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+            )
+            try:
+                if response.status != 200:
+                    raise openai_status_error(response.status, parse_retry_after(response))
+                chunks = read_chunks(response)
+                first = await asyncio.wait_for(chunks.__anext__(), timeout)
+                return response, chunks, first
+            except BaseException:
+                response.release()
+                raise
+
+        response, chunks, first = await self.with_retries(open_stream)
+        try:
+            if first:
+                yield first
+            async for content in chunks:
+                if content:
+                    yield content
+        except Exception:
+            self.breaker.record_failure()
+            self.counts["unavailable"] += 1
+            raise openai_unavailable()
+        finally:
+            response.release()
+
+    def stats(self):
+        return {
+            **self.counts,
+            "breaker": self.breaker.stats(),
+            "latency": self.latencies.summary("completion") if "completion" in self.latencies.latencies else None
+        }
+
+def parse_retry_after(response):
+    """
+    Function to get the number of seconds a response asks the client to wait before trying again.
+
+    Args:
+        response (aiohttp.ClientResponse): response with an error status
+
+    Returns:
+        float: seconds to wait, None if the response does not say
+    """
+
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+async def read_chunks(response):
+    """
+    Function to read the content of the chunks of a streamed chat completion.
+
+    Args:
+        response (aiohttp.ClientResponse): response in the OpenAI server-sent events format
+
+    Returns:
+        async generator: content of every chunk, "" for chunks without content, e.g. the first one with only the role
+    """
+
+    async for line in response.content:
+        line = line.decode("utf-8").strip()
+        if not line.startswith("data: "):
+            continue
+        data = line[len("data: "):]
+        if data == "[DONE]":
+            return
+        yield json.loads(data)["choices"][0].get("delta", {}).get("content") or ""
@@ -0,0 +1,83 @@
+#library imports
+from collections import OrderedDict
+import asyncio
+
+from answer_cache import normalize_question
+from micro_batcher import micro_batcher
+
+class query_embedding_cache():
+    """
+    This class is used to share DPR query embeddings across requests. Embeddings are kept in a bounded LRU keyed on the
+    normalized question, and the questions that miss are encoded together in one forward pass of the query encoder.
+
+    Attributes:
+        max_entries: The maximum number of cached embeddings, the least recently used embedding is dropped first.
+        batcher: The micro batcher that groups cache misses of concurrent requests into one call of the encoder.
+        entries: OrderedDict of normalized question to embedding.
+        pending: Dictionary of normalized question to the embedding being computed, so the same question is encoded once.
+
+    Methods:
+        embed: This method is used to get the embedding of a question.
+        stats: This method is used to report hit, miss and batch counts.
+    """
+
+    def __init__(self, embed_fn, max_entries=4096, max_batch_size=16, max_wait_ms=5, executor=None, max_queue_size=0):
+        self.max_entries = max_entries
+        self.batcher = micro_batcher(
+            lambda batch: list(embed_fn([question for question, in batch])),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            executor=executor,
+            max_queue_size=max_queue_size
+        )
+
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.counts = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def embed(self, question):
+        '''
+        Get the embedding of a question from the cache, from a running encoder call for the same question, or from a new batch.
+
+        Args:
+            question (str): question string.
+
+        Returns:
+            np.ndarray: Question embedding.
+        '''
+
+        key = normalize_question(question)
+        if key in self.entries:
+            self.counts["hits"] += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        # another request is already waiting for the embedding of the same question
+        if key in self.pending:
+            self.counts["coalesced"] += 1
+            return await asyncio.shield(self.pending[key])
+
+        self.counts["misses"] += 1
+        future = asyncio.ensure_future(self.batcher.submit(question))
+        self.pending[key] = future
+
+        def store(future):
+            # cache the embedding even if the request that asked for it has gone away
+            self.pending.pop(key, None)
+            if not future.cancelled() and future.exception() is None:
+                self.entries[key] = future.result()
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        future.add_done_callback(store)
+        return await asyncio.shield(future)
+
+    def stats(self):
+        lookups = self.counts["hits"] + self.counts["misses"] + self.counts["coalesced"]
+        return {
+            **self.counts,
+            "hit_rate": (self.counts["hits"] + self.counts["coalesced"]) / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "batches": self.batcher.stats()
+        }
@@ -1,26 +1,59 @@
 # library imports
 from bs4 import BeautifulSoup
-import requests
+from concurrent.futures import ProcessPoolExecutor
 import html2text
+import aiohttp
+import asyncio
+import hashlib
 import json
-from tqdm import tqdm
 import os
+import time
 import argparse
 
-def scrape_subdomain(json_file_name, directory):
+from get_subpages import HEADERS
+
+def get_file_name(url, directory):
     """
-    This function scrapes all subpages of a website and saves them as text files.
+    This function returns the path of the text file of a webpage.
 
     Args:
-        json_file_name (str): Path to json file containing all subpages of a website.
-        directory (str): Path to directory where the text files should be saved.
-    
+        url (str): webpage link
+        directory (str): Path to directory where the text files are saved.
+
+    Returns:
+        str: path of the text file
+    """
+
+    return directory + "/" + url.replace('https://', '') + '.txt'
+
+def write_atomically(file_name, text):
+    """
+    This function writes a file through a temporary file, so readers never see a partially written file.
+
+    Args:
+        file_name (str): path of the file
+        text (str): content of the file
+
     Returns:
         None
     """
 
-    # get the urls of all subpages
-    url_list = [i for i in json.load(open(json_file_name)).keys()]    
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(file_name + ".tmp", file_name)
+
+def convert_and_write(content, file_name):
+    """
+    This function converts the html of a webpage to text and saves it, it runs in a worker process.
+
+    Args:
+        content (bytes): html of the webpage
+        file_name (str): path of the text file
+
+    Returns:
+        int: number of characters written
+    """
 
     # initialize html2text
     h = html2text.HTML2Text()
@@ -29,30 +62,174 @@ def scrape_subdomain(json_file_name, directory):
     h.ignore_links = True
     h.ignore_tables = True
 
-    # loop through all urls
-    for i in tqdm(url_list):
-
-        # get html data
-        session = requests.session()
-        req = session.get(i)
-        doc = BeautifulSoup(req.content)
-        
-        # get the file name
-        file_name = directory + "/" + i.replace('https://', '') + '.txt'
-        print(file_name)
-        
-        # create directory if it doesn't exist
+    # parse the html and convert it to text
+    doc = BeautifulSoup(content, "html.parser")
+    text = h.handle(str(doc))
+
+    write_atomically(file_name, text)
+    return len(text)
+
+def load_cache(cache_file):
+    """
+    This function loads the ETag, Last-Modified header and content hash of every scraped webpage.
+
+    Args:
+        cache_file (str): path of the json cache file
+
+    Returns:
+        dict: url to metadata, empty if the file does not exist
+    """
+
+    if not os.path.exists(cache_file):
+        return {}
+    with open(cache_file) as f:
+        return json.load(f)
+
+class subdomain_scraper():
+    """
+    This class is used to scrape the webpages of a website with pooled, concurrent fetches that feed a process pool converting html to text.
+
+    Attributes:
+        directory: The directory the text files are saved to.
+        cache: Dictionary of url to the ETag, Last-Modified header and content hash of the last scrape.
+        concurrency: The number of webpages fetched at the same time.
+        executor: The process pool converting html to text.
+        max_conversions: The number of fetched webpages that are converted or wait for the process pool at the same time.
+        force: Whether every webpage is scraped again, ignoring the metadata of the last scrape.
+        timeout: The number of seconds after which a request is given up.
+        counts: The number of webpages per outcome.
+
+    Methods:
+        scrape: This method is used to scrape a list of webpages.
+    """
+
+    def __init__(self, directory, cache, concurrency, executor, max_conversions=None, force=False, timeout=30):
+        self.directory = directory
+        self.cache = cache
+        self.concurrency = concurrency
+        self.executor = executor
+        self.max_conversions = max_conversions or 2 * (os.cpu_count() or 1)
+        self.force = force
+        self.timeout = timeout
+        self.counts = {"converted": 0, "not_modified": 0, "unchanged": 0, "errors": 0}
+
+    async def scrape_page(self, session, semaphore, conversions, url):
+        file_name = get_file_name(url, self.directory)
+        cached = self.cache.get(url, {}) if os.path.exists(file_name) and not self.force else {}
+
+        # ask the server to only send the page if it changed since the last scrape
+        headers = dict(HEADERS)
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with semaphore:
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        self.counts["not_modified"] += 1
+                        return
+                    if response.status >= 400:
+                        print("FAILED", url, response.status)
+                        self.counts["errors"] += 1
+                        return
+                    content = await response.read()
+                    metadata = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print("FAILED", url, repr(e))
+                self.counts["errors"] += 1
+                return
+
+            # servers without conditional requests still send the same bytes for an unchanged page
+            metadata["sha1"] = hashlib.sha1(content).hexdigest()
+            if cached.get("sha1") == metadata["sha1"]:
+                self.cache[url] = metadata
+                self.counts["unchanged"] += 1
+                return
+
+            # wait for a conversion slot before giving back the fetch slot, so that fetched pages cannot pile up
+            # while the process pool is busy
+            await conversions.acquire()
+
+        # convert in the process pool while the next pages are fetched, a page that fails to convert or write
+        # (e.g. a file name that is too long) is skipped
         try:
-            os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        except:
-            pass
+            await asyncio.get_running_loop().run_in_executor(self.executor, convert_and_write, content, file_name)
+        except Exception as e:
+            print("FAILED", url, repr(e))
+            self.counts["errors"] += 1
+            return
+        finally:
+            conversions.release()
+        self.cache[url] = metadata
+        self.counts["converted"] += 1
+
+    async def scrape(self, url_list):
+        '''
+        Scrape a list of webpages.
+
+        Args:
+            url_list (list): webpage links
+
+        Returns:
+            None
+        '''
+
+        # a single session keeps connections alive between requests
+        semaphore = asyncio.Semaphore(self.concurrency)
+        conversions = asyncio.Semaphore(self.max_conversions)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            await asyncio.gather(*[self.scrape_page(session, semaphore, conversions, url) for url in url_list])
 
-        # write the file
+def scrape_subdomain(json_file_name, directory, cache_file="../scrape_cache.json", concurrency=16, processes=None, force=False):
+    """
+    This function scrapes all subpages of a website and saves them as text files.
+
+    Webpages that did not change since the last scrape, according to the server (ETag/Last-Modified) or to the hash
+    of their html, are skipped.
+
+    Args:
+        json_file_name (str): Path to json file containing all subpages of a website.
+        directory (str): Path to directory where the text files should be saved.
+        cache_file (str): Path to the json file with the metadata of the last scrape.
+        concurrency (int): Number of webpages fetched at the same time.
+        processes (int): Number of processes converting html to text, defaults to the number of cores.
+        force (bool): Scrape every webpage, ignoring the metadata of the last scrape.
+
+    Returns:
+        dict: summary of the scrape
+    """
+
+    # get the urls of all subpages
+    with open(json_file_name) as f:
+        url_list = list(json.load(f).keys())
+
+    # the cache is shared by all websites, --force only ignores the entries of this website
+    cache = load_cache(cache_file)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        scraper = subdomain_scraper(directory, cache, concurrency, executor, 2 * (processes or os.cpu_count() or 1), force)
         try:
-            with open(file_name, 'w') as f:
-                f.write(h.handle(str(doc)))
-        except:
-            pass
+            asyncio.run(scraper.scrape(url_list))
+        finally:
+            # keep the metadata of the webpages scraped so far, also when interrupted, merged into the cache as it is
+            # now so that the entries written by a scrape of another website in the meantime are kept
+            merged = load_cache(cache_file)
+            merged.update({url: cache[url] for url in url_list if url in cache})
+            write_atomically(os.path.abspath(cache_file), json.dumps(merged))
+    seconds = time.perf_counter() - start
+
+    skipped = scraper.counts["not_modified"] + scraper.counts["unchanged"]
+    return {
+        "pages": len(url_list),
+        **scraper.counts,
+        "seconds": seconds,
+        "pages_per_second": len(url_list) / seconds if seconds else 0.0,
+        "skip_ratio": skipped / len(url_list) if url_list else 0.0
+    }
 
 if __name__ == "__main__":
     # create parser
@@ -61,6 +238,10 @@ if __name__ == "__main__":
                     description='This script scrapes all subpages of a website and saves them as text files.')
     parser.add_argument('json_file_name', type=str, help='Path to json file containing all subpages of a website.')
     parser.add_argument('directory', type=str, help='Path to directory where the text files should be saved.')
+    parser.add_argument('--cache_file', type=str, default='../scrape_cache.json', help='Path to the json file with the ETag, Last-Modified header and hash of every scraped webpage.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of webpages fetched at the same time.')
+    parser.add_argument('--processes', type=int, default=None, help='Number of processes converting html to text, defaults to the number of cores.')
+    parser.add_argument('--force', action='store_true', help='Scrape every webpage, also the ones that did not change since the last scrape.')
 
     # parse arguments
     args = parser.parse_args()
@@ -68,4 +249,7 @@ if __name__ == "__main__":
     directory = args.directory
 
     # call function to start scraping
-    scrape_subdomain(json_file_name, directory)
\ No newline at end of file
+    summary = scrape_subdomain(json_file_name, directory, args.cache_file, args.concurrency, args.processes, args.force)
+    print(f"{summary['pages']} pages in {summary['seconds']:.1f}s ({summary['pages_per_second']:.1f} pages/s): "
+          f"{summary['converted']} converted, {summary['not_modified']} not modified, {summary['unchanged']} unchanged, {summary['errors']} errors, "
+          f"skip ratio {summary['skip_ratio']:.1%}")
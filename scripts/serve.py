@@ -0,0 +1,161 @@
+# library imports
+import argparse
+import gc
+import importlib
+import logging
+import os
+import signal
+import time
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+# models that are only weights, without threads, sockets or GPU state, and so can be loaded once and shared by forked workers
+SHARED_MODELS = ["reader", "dpr_retriever", "t5_qa"]
+
+def load_shared_models(app_module, names):
+    """
+    Function to load models in the parent process so that forked workers share their weights copy-on-write.
+
+    Weights are never written during inference, so their pages stay shared. The Python objects around them are moved out
+    of reach of the garbage collector, which would otherwise write to every object header and copy the pages holding them.
+
+    Args:
+        app_module (module): module of the app, with the model registry as "models"
+        names (list): names of the models to load
+
+    Returns:
+        None
+    """
+
+    # torch and the tokenizers must not start thread pools in the parent, threads do not survive a fork
+    import torch
+    torch.set_num_threads(1)
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    for name in names:
+        start = time.perf_counter()
+        app_module.models.get(name)
+        logger.info(f"Loaded shared {name} in {time.perf_counter() - start:.1f} seconds")
+
+    # a forked child can not use CUDA initialized by its parent
+    if torch.cuda.is_initialized():
+        raise RuntimeError("shared models must run on the CPU, serve a GPU with a single worker instead")
+
+    gc.collect()
+    gc.freeze()
+
+def run_worker(app, sock, port, torch_threads):
+    """
+    Function to serve the app on the inherited socket in a forked worker process.
+
+    Args:
+        app (str or FastAPI): app, or "module:attribute" of the app if the worker imports it after the fork
+        sock (socket.socket): listening socket shared by all workers
+        port (int): port the socket is bound to
+        torch_threads (int): number of threads torch may use in this worker
+
+    Returns:
+        None
+    """
+
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="info"))
+    server.run(sockets=[sock])
+
+def serve(app_path, host, port, workers, shared, torch_threads):
+    """
+    Function to run several uvicorn workers on one port, either each with its own models or sharing the weights
+    of models loaded before the fork. Workers that exit are restarted until the server is stopped.
+
+    Args:
+        app_path (str): "module:attribute" of the app
+        host (str): host to bind to
+        port (int): port to bind to
+        workers (int): number of worker processes
+        shared (bool): load the models once before forking the workers
+        torch_threads (int): number of threads torch may use per worker
+
+    Returns:
+        None
+    """
+
+    module_name, app_name = app_path.split(":")
+    app = app_path
+
+    if shared:
+        app_module = importlib.import_module(module_name)
+        app = getattr(app_module, app_name)
+
+        # ONNX Runtime sessions start their thread pools when they are created, so they are loaded in every worker
+        if os.environ.get("INFERENCE_BACKEND", "torch") == "onnx":
+            logger.warning("ONNX Runtime sessions can not be shared, every worker loads its own models")
+        else:
+            load_shared_models(app_module, SHARED_MODELS)
+
+    # all workers accept connections on the same socket
+    sock = uvicorn.Config(app, host=host, port=port).bind_socket()
+
+    def fork_worker():
+        pid = os.fork()
+        if pid == 0:
+            # never return into the supervisor loop of the parent
+            status = 0
+            try:
+                run_worker(app, sock, port, torch_threads)
+            except BaseException:
+                logger.exception("Worker failed")
+                status = 1
+            finally:
+                os._exit(status)
+        logger.info(f"Started worker {pid}")
+        return pid
+
+    children = {fork_worker() for _ in range(workers)}
+
+    # forward SIGINT and SIGTERM to the workers and stop restarting them
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting it")
+
+            # do not spin if workers fail right after they start
+            time.sleep(1)
+            children.add(fork_worker())
+
+    sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='serve',
+                    description='This script runs the chatbot server in several worker processes, optionally sharing model weights loaded once before the workers are forked.')
+    parser.add_argument('--app', type=str, default="chatbot:app", help='App to serve as module:attribute')
+    parser.add_argument('--host', type=str, default="0.0.0.0", help='Host to bind to')
+    parser.add_argument('--port', type=int, default=8060, help='Port to bind to')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get("SERVER_WORKERS", 2)), help='Number of worker processes')
+    parser.add_argument('--shared', action='store_true', help='Load the models once and share their weights with the workers')
+    parser.add_argument('--torch_threads', type=int, default=0, help='Number of threads torch may use per worker, 0 splits the cores between the workers')
+
+    # parse arguments
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    torch_threads = args.torch_threads or max(1, os.cpu_count() // args.workers)
+
+    # serve the app until stopped
+    serve(args.app, args.host, args.port, args.workers, args.shared, torch_threads)
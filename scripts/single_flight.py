@@ -0,0 +1,64 @@
+#library imports
+import asyncio
+
+class single_flight():
+    """
+    This class is used to let concurrent requests for the same key share one computation, e.g. identical questions to
+    the same endpoint arriving while the first one is still being answered. The first request (the leader) starts the
+    computation, the requests that arrive before it finishes (the followers) wait for its result.
+
+    Only running computations are shared. A key is released as soon as its computation finishes, so a failed
+    computation is never handed to later requests, the next request with the same key starts a new one.
+
+    Attributes:
+        pending: Dictionary of key to the running computation.
+        counts: The number of computations started, requests that joined a running computation, and failures.
+
+    Methods:
+        run: This method is used to get the result of a computation, started by this request or by an earlier one.
+        stats: This method is used to report how many computations were started and avoided.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.counts = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+    async def run(self, key, compute):
+        '''
+        Get the result of the running computation of a key, or start one.
+
+        The computation runs as its own task, so a leader that goes away (e.g. a client that disconnects) does not
+        cancel it for its followers. Followers get the same result, or the same exception, as the leader.
+
+        Args:
+            key (hashable): Key of the computation, e.g. endpoint and normalized question.
+            compute (function): Coroutine function without arguments that computes the result.
+
+        Returns:
+            Result of the computation.
+        '''
+
+        if key in self.pending:
+            self.counts["coalesced"] += 1
+            return await asyncio.shield(self.pending[key])
+
+        self.counts["leaders"] += 1
+        future = asyncio.ensure_future(compute())
+        self.pending[key] = future
+
+        def release(future):
+            # the next request with the same key starts a new computation
+            self.pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                self.counts["errors"] += 1
+
+        future.add_done_callback(release)
+        return await asyncio.shield(future)
+
+    def stats(self):
+        requests = self.counts["leaders"] + self.counts["coalesced"]
+        return {
+            **self.counts,
+            "coalesced_rate": self.counts["coalesced"] / requests if requests else 0.0,
+            "in_flight": len(self.pending)
+        }
@@ -0,0 +1,124 @@
+#library imports
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import time
+
+from prometheus_client import CollectorRegistry, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+
+# stages of the pipelines take from a few milliseconds (answer selection) to tens of seconds (OpenAI)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# timings of the request being handled, every request and the tasks it starts see their own
+current_request = ContextVar("current_request", default=None)
+
+class stage_timer():
+    """
+    This class is used to time the stages of the pipelines, e.g. retrieval, the reader, answer selection and generation,
+    and to export the timings as Prometheus histograms labeled with the endpoint and the stage.
+
+    Stages may overlap, e.g. BM25 and DPR run at the same time during hybrid retrieval, so the stages of a request
+    do not add up to its total time.
+
+    Attributes:
+        stage_seconds: Histogram of the time spent in a stage, per endpoint and stage.
+        request_seconds: Histogram of the time until the response starts, per endpoint and status code.
+
+    Methods:
+        begin: This method is used to start timing a request.
+        end: This method is used to record the total time of a request.
+        span: This method is used to time a stage of the current request.
+        stages_ms: This method is used to get the stage timings of a request in milliseconds.
+        elapsed_ms: This method is used to get the time since a request arrived in milliseconds.
+        server_timing: This method is used to format the stages of the current request as a Server-Timing header.
+        metrics: This method is used to export the histograms in the Prometheus text format.
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.stage_seconds = Histogram(
+            "chatbot_stage_seconds", "Time spent in a pipeline stage", ["endpoint", "stage"], buckets=BUCKETS, registry=registry
+        )
+        self.request_seconds = Histogram(
+            "chatbot_request_seconds", "Time until the response starts", ["endpoint", "status"], buckets=BUCKETS, registry=registry
+        )
+
+    def begin(self, endpoint):
+        '''
+        Start timing a request, the stages timed until it ends are recorded under its endpoint.
+
+        Args:
+            endpoint (str): Name of the endpoint.
+
+        Returns:
+            dict: Timings of the request.
+        '''
+
+        timings = {"endpoint": endpoint, "start": time.perf_counter(), "stages": {}}
+        current_request.set(timings)
+        return timings
+
+    def end(self, timings, status):
+        self.request_seconds.labels(timings["endpoint"], str(status)).observe(time.perf_counter() - timings["start"])
+
+    @contextmanager
+    def span(self, stage):
+        '''
+        Time a stage of the current request, a stage run several times for a request adds up.
+
+        Args:
+            stage (str): Name of the stage.
+
+        Returns:
+            context manager: Times the code inside the with block.
+        '''
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            timings = current_request.get()
+            endpoint = timings["endpoint"] if timings is not None else "none"
+            self.stage_seconds.labels(endpoint, stage).observe(seconds)
+            if timings is not None:
+                timings["stages"][stage] = timings["stages"].get(stage, 0.0) + seconds
+
+    def stages_ms(self, timings):
+        return {stage: round(seconds * 1000, 1) for stage, seconds in timings["stages"].items()}
+
+    def elapsed_ms(self, timings):
+        return round((time.perf_counter() - timings["start"]) * 1000, 1)
+
+    def server_timing(self, timings):
+        '''
+        Format the stages of a request finished so far, and its total time, as a Server-Timing header.
+
+        Args:
+            timings (dict): Timings of the request.
+
+        Returns:
+            str: Header value, e.g. "retrieval;dur=12.3, reader;dur=45.6, total;dur=60.2".
+        '''
+
+        stages = list(timings["stages"].items()) + [("total", time.perf_counter() - timings["start"])]
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages)
+
+    def metrics(self):
+        '''
+        Export the histograms in the Prometheus text format. If PROMETHEUS_MULTIPROC_DIR is set, the histograms of all
+        worker processes are added up, so any worker can be scraped.
+
+        Args:
+            None
+
+        Returns:
+            bytes: Metrics.
+            str: Content type of the metrics.
+        '''
+
+        registry = self.registry
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
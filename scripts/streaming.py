@@ -0,0 +1,70 @@
+# library imports
+import json
+import time
+import uuid
+
+def sse_event(event, data):
+    """
+    Formats a server-sent event.
+
+    Args:
+        event (str): event name
+        data (dict): event data, sent as json
+
+    Return:
+        str: server-sent event
+    """
+
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def iterate_in_pool(pool, generator):
+    """
+    Iterates a blocking generator, such as token by token model output, on the inference pool.
+
+    Args:
+        pool (inference_pool): pool the steps of the generator run on
+        generator (generator): blocking generator
+
+    Return:
+        async generator: items of the generator
+    """
+
+    done = object()
+    while True:
+        item = await pool.run(next, generator, done)
+        if item is done:
+            return
+        yield item
+
+async def sse_answer(tokens, stats, name, start, on_answer=None):
+    """
+    Streams the pieces of an answer as "token" events and ends with an "answer" event holding the
+    {"id", "choices"} envelope of the non-streaming endpoints.
+
+    Args:
+        tokens (async generator): pieces of the answer
+        stats (latency_stats): records the time to first token and the total time under name
+        name (str): name of the endpoint
+        start (float): time.perf_counter() when the request arrived
+        on_answer (function): called with the complete answer, e.g. to log or cache it
+
+    Return:
+        async generator: server-sent events
+    """
+
+    answer = ""
+    try:
+        async for token in tokens:
+            if not answer:
+                stats.record(name + ":time_to_first_token", time.perf_counter() - start)
+            answer += token
+            yield sse_event("token", {"text": token})
+    except Exception as e:
+        # the status code is already sent, so the client learns about the failure from an event
+        yield sse_event("error", {"message": str(e)})
+        return
+
+    stats.record(name + ":total", time.perf_counter() - start)
+    if on_answer is not None:
+        on_answer(answer)
+    yield sse_event("answer", {"id": str(uuid.uuid4()), "choices": [{"text": answer}]})
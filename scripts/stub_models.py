@@ -0,0 +1,163 @@
+# library imports
+from haystack.schema import Answer, Document, Span
+import numpy as np
+import hashlib
+import os
+import time
+
+from context_assembly import token_counter
+
+def stub_latencies():
+    """
+    Function to get the latencies of the stubbed models from the STUB_LATENCY_MS environment variable,
+    e.g. "bm25=20,dpr=15,embedding=10,reader=80,t5=150,t5_token=15".
+
+    Args:
+        None
+
+    Returns:
+        dict: latency in milliseconds per stubbed model
+    """
+
+    latencies = {"bm25": 20, "dpr": 15, "embedding": 10, "reader": 80, "t5": 150, "t5_token": 15}
+    for item in os.environ.get("STUB_LATENCY_MS", "").split(","):
+        if "=" in item:
+            name, milliseconds = item.split("=", 1)
+            latencies[name.strip()] = float(milliseconds)
+    return latencies
+
+def seed(text):
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+def stub_documents(text, top_k, corpus_size=1000):
+    """
+    Function to get the same made up documents for the same query every time.
+
+    Args:
+        text (str): query the documents are made up for
+        top_k (int): number of documents
+        corpus_size (int): number of different documents
+
+    Returns:
+        list: documents, best first
+    """
+
+    rng = np.random.default_rng(seed(text))
+    indices = rng.choice(corpus_size, size=min(top_k, corpus_size), replace=False)
+    return [
+        Document(
+            content=f"Stub passage {i} about Duke. " * 40,
+            id=f"stub-{i}",
+            score=1.0 - rank / (top_k + 1),
+            meta={"source": f"stub/{i}.txt"}
+        )
+        for rank, i in enumerate(indices)
+    ]
+
+class stub_document_store():
+    """
+    This class is used to stand in for the Elasticsearch or FAISS document store without a search backend.
+    """
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def query_by_embedding(self, query_emb, top_k=10, **kwargs):
+        time.sleep(self.latencies["dpr"] / 1000)
+        return stub_documents(np.asarray(query_emb).round(3).tobytes().hex(), top_k)
+
+class stub_bm25_retriever():
+    """
+    This class is used to stand in for the BM25 retriever without a search backend.
+    """
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def retrieve(self, query, top_k=10, **kwargs):
+        time.sleep(self.latencies["bm25"] / 1000)
+        return stub_documents(query, top_k)
+
+class stub_query_encoder():
+    """
+    This class is used to stand in for the DPR question encoder, the same question always gets the same embedding.
+    """
+
+    def __init__(self, latencies, dimension=768):
+        self.latencies = latencies
+        self.dimension = dimension
+
+    def embed_queries(self, queries):
+        # one forward pass for the whole batch, like the real encoder
+        time.sleep(self.latencies["embedding"] / 1000)
+        embeddings = np.stack([np.random.default_rng(seed(query)).standard_normal(self.dimension) for query in queries])
+        return (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+
+class stub_reader():
+    """
+    This class is used to stand in for the FARM reader, about half of the questions get a confident answer.
+    """
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def predict(self, query, documents, top_k=5):
+        time.sleep(self.latencies["reader"] / 1000)
+        answers = []
+        for i, document in enumerate(documents[:top_k]):
+            answers.append(Answer(
+                answer=document.content[:30],
+                type="extractive",
+                score=(seed(query + document.id) % 1000) / 1000,
+                context=document.content[:200],
+                offsets_in_document=[Span(0, 30)],
+                offsets_in_context=[Span(0, 30)],
+                document_ids=[document.id]
+            ))
+        return {"query": query, "answers": answers}
+
+class stub_t5_qa():
+    """
+    This class is used to stand in for the T5 answer generator, batched and streamed like the real model.
+    """
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def generate_answers(self, questions, contexts):
+        # one batch takes as long as a single question, like the padded batches of the real model
+        time.sleep(self.latencies["t5"] / 1000)
+        return [f"Stub answer to: {question}" for question in questions]
+
+    def generate_answer(self, question, context):
+        return self.generate_answers([question], [context])[0]
+
+    def stream_answer(self, question, context):
+        for i, word in enumerate(f"Stub answer to: {question}".split(" ")):
+            time.sleep(self.latencies["t5_token"] / 1000)
+            yield word if i == 0 else " " + word
+
+def register_stub_models(models):
+    """
+    Function to register stubs in place of the document stores, retrievers, reader, answer generator and tokenizers, so that the
+    server runs offline without models or a search backend, e.g. to load test it.
+
+    Args:
+        models (model_registry): Registry the loaders are added to.
+
+    Returns:
+        None
+    """
+
+    latencies = stub_latencies()
+    models.register("document_store", lambda: stub_document_store(latencies))
+    models.register("dense_document_store", lambda: stub_document_store(latencies))
+    models.register("bm25_retriever", lambda: stub_bm25_retriever(latencies))
+    models.register("dpr_retriever", lambda: stub_query_encoder(latencies))
+    models.register("reader", lambda: stub_reader(latencies))
+    models.register("query_encoder", lambda: stub_query_encoder(latencies))
+    models.register("t5_qa", lambda: stub_t5_qa(latencies))
+
+    # whitespace tokens in place of the tokenizers of T5 and ChatGPT
+    models.register("t5_token_counter", lambda: token_counter(lambda texts: [len(text.split()) for text in texts]))
+    models.register("gpt_token_counter", lambda: token_counter(lambda texts: [len(text.split()) for text in texts]))
@@ -3,39 +3,131 @@ from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 from transformers import pipeline
 import torch
 
+T5_MODEL_NAME = "consciousAI/question-answering-generative-t5-v1-base-s-q-c"
+
 class t5_qa():
     """
     This class is used to generate answers to questions based on the context provided using T5 based model from Conscious AI.
-    
+
     Attributes:
         device: The device to be used for the model.
         tokenizer: The tokenizer to be used for the model.
         model: The model to be used for the pipeline.
+        max_length: The maximum number of input tokens passed to the model.
+        length_buckets: The sorted input lengths a batch is padded to, the smallest one that fits the longest input is used.
 
     Methods:
+        encode: This method is used to tokenize questions and contexts, truncating the context first and padding only to the nearest length bucket.
         generate_answer: This method is used to generate answers to questions based on the context provided.
+        generate_answers: This method is used to generate answers for a batch of questions and contexts in one model call.
+        decode_steps: This method is used to run greedy decoding on a batch, yielding the next token of every input at each step.
+        encode_step: This method is used to run the encoder without gradients.
+        decoder_step: This method is used to run one decoder step without gradients, returning the logits of the newest token and the cache.
+        stream_answer: This method is used to generate an answer token by token with greedy decoding, yielding the text as it is produced.
     """
-    def __init__(self):
-        
+    def __init__(self, max_length=1024, length_buckets=(128, 256, 512, 768, 1024)):
+
         # set device
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        
+
         # load tokenizer and model
-        self.tokenizer = AutoTokenizer.from_pretrained("consciousAI/question-answering-generative-t5-v1-base-s-q-c")
-        self.model = AutoModelForSeq2SeqLM.from_pretrained("consciousAI/question-answering-generative-t5-v1-base-s-q-c").to(self.device)
+        self.tokenizer = AutoTokenizer.from_pretrained(T5_MODEL_NAME)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(T5_MODEL_NAME).to(self.device)
+
+        # set input length limits
+        self.max_length = max_length
+        self.length_buckets = sorted(set([min(bucket, max_length) for bucket in length_buckets] + [max_length]))
+
+    def encode(self, questions, contexts):
+
+        # tokenize the question part and the context part separately so that only the context gets truncated
+        prefix_ids = self.tokenizer(["question: " + question + "</s> question_context: " for question in questions], add_special_tokens=False)["input_ids"]
+        context_ids = self.tokenizer(list(contexts), add_special_tokens=False)["input_ids"]
+
+        input_ids = []
+        for prefix, context in zip(prefix_ids, context_ids):
+            # keep room for the closing </s> token, a question longer than the limit is cut as a last resort
+            prefix = prefix[:self.max_length - 1]
+            context = context[:self.max_length - 1 - len(prefix)]
+            input_ids.append(prefix + context + [self.tokenizer.eos_token_id])
+
+        # pad to the smallest bucket that fits the longest input of the batch
+        longest = max(len(ids) for ids in input_ids)
+        padded_length = next(bucket for bucket in self.length_buckets if bucket >= longest)
+
+        attention_mask = [[1] * len(ids) + [0] * (padded_length - len(ids)) for ids in input_ids]
+        input_ids = [ids + [self.tokenizer.pad_token_id] * (padded_length - len(ids)) for ids in input_ids]
+
+        return {
+            "input_ids": torch.tensor(input_ids, device=self.device),
+            "attention_mask": torch.tensor(attention_mask, device=self.device)
+        }
 
     def generate_answer(self, question, context):
+        return self.generate_answers([question], [context])[0]
+
+    def generate_answers(self, questions, contexts):
 
-        # create input string
-        input_text = "question: " + question + "</s> question_context: " + context
+        # encode questions and contexts as one padded batch
+        input_tokenized = self.encode(questions, contexts)
 
-        # encode input string using tokenizer
-        input_tokenized = self.tokenizer.encode(input_text, return_tensors='pt', truncation=True, padding='max_length', max_length=1024).to(self.device)
+        # generate answers
+        summary_ids = self.model.generate(input_tokenized["input_ids"], attention_mask=input_tokenized["attention_mask"], max_length=50, min_length=20, num_beams=5, early_stopping=True)
 
-        # generate answer
-        summary_ids = self.model.generate(input_tokenized, max_length=50, min_length=20, num_beams=5, early_stopping=True)
-        
-        # decode output string
+        # decode output strings
         output = [self.tokenizer.decode(id, clean_up_tokenization_spaces=True, skip_special_tokens=True) for id in summary_ids]
-        
-        return str(output[0])
\ No newline at end of file
+
+        return [str(answer) for answer in output]
+
+    def decode_steps(self, input_tokenized, max_length=50, min_length=20):
+
+        # encode the input once, every decoding step only runs the decoder on the newest token
+        eos_token_id = self.tokenizer.eos_token_id
+        batch_size = input_tokenized["input_ids"].shape[0]
+
+        # the steps can run on different threads of the inference pool, and grad mode is set per thread, so every
+        # model call turns off gradients itself instead of the generator as a whole
+        encoder_outputs = self.encode_step(input_tokenized)
+        decoder_input_ids = torch.full((batch_size, 1), self.model.config.decoder_start_token_id, device=self.device)
+        past_key_values = None
+
+        for step in range(1, max_length):
+            logits, past_key_values = self.decoder_step(encoder_outputs, input_tokenized["attention_mask"], decoder_input_ids, past_key_values)
+
+            # like generate(min_length=...), the answer cannot end before min_length tokens
+            if step < min_length - 1:
+                logits[:, eos_token_id] = -float("inf")
+
+            next_tokens = logits.argmax(-1)
+            yield next_tokens.tolist()
+            decoder_input_ids = next_tokens[:, None]
+
+    @torch.no_grad()
+    def encode_step(self, input_tokenized):
+        return self.model.get_encoder()(**input_tokenized)
+
+    @torch.no_grad()
+    def decoder_step(self, encoder_outputs, attention_mask, decoder_input_ids, past_key_values):
+        outputs = self.model(
+            encoder_outputs=encoder_outputs,
+            attention_mask=attention_mask,
+            decoder_input_ids=decoder_input_ids,
+            past_key_values=past_key_values,
+            use_cache=True
+        )
+        return outputs.logits[:, -1], outputs.past_key_values
+
+    def stream_answer(self, question, context, max_length=50, min_length=20):
+
+        generated, text = [], ""
+        for next_tokens in self.decode_steps(self.encode([question], [context]), max_length, min_length):
+            next_token = next_tokens[0]
+            if next_token == self.tokenizer.eos_token_id:
+                break
+            generated.append(next_token)
+
+            # decode the whole answer and yield what was added, sentencepiece only knows the spacing of a token in context
+            new_text = self.tokenizer.decode(generated, clean_up_tokenization_spaces=True, skip_special_tokens=True)
+            if new_text.startswith(text) and len(new_text) > len(text):
+                yield new_text[len(text):]
+                text = new_text
@@ -1,34 +1,69 @@
 # library imports
 import pandas as pd
+import aiohttp
 import argparse
-import requests
+import asyncio
+import json
 from tqdm import tqdm
 
-def get_answers(test_questions_file_path):
+from load_test import send, ENDPOINTS
+
+async def fetch_answers(questions, base_url, api_key, concurrency):
+    """
+    Function to get the answers of all endpoints to the test questions, sending several requests at the same time.
+
+    Args:
+        questions (list): test questions
+        base_url (str): url of the server
+        api_key (str): api key of the server
+        concurrency (int): number of requests sent at the same time
+
+    Returns:
+        dict: list of answers in the order of the questions per endpoint
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = tqdm(total=len(questions) * len(ENDPOINTS))
+
+    async with aiohttp.ClientSession(headers={"api-key": api_key}) as session:
+
+        async def answer(endpoint, question):
+            async with semaphore:
+                status, _, body = await send(session, base_url, endpoint, question)
+            progress.update()
+            return json.loads(body)["choices"][0]["text"] if status == 200 else None
+
+        answers = {
+            endpoint: asyncio.gather(*[answer(endpoint, question) for question in questions]) for endpoint in ENDPOINTS
+        }
+        answers = dict(zip(answers, await asyncio.gather(*answers.values())))
+
+    progress.close()
+    return answers
+
+def get_answers(test_questions_file_path, base_url="http://0.0.0.0:8060", concurrency=4):
     """
     Function to get the answers using different QnA Pipelines to the test questions.
 
     Args:
         test_questions_file_path (str): Path to the .csv file containing the test questions
-    
+        base_url (str): url of the server
+        concurrency (int): number of requests sent at the same time
+
     Returns:
         None
     """
-    # read test questions
+    # read test questions and the api key
     test_questions = pd.read_csv(test_questions_file_path)
+    with open("../config.json") as f:
+        api_key = json.load(f)["api_key"]
 
     # send requests to the QnA Pipelines and get the answers
-    for i in tqdm(range(len(test_questions))):
-        answer_ndl = requests.get('http://0.0.0.0:8060/chat_v0/'+str(test_questions.iloc[i, 0])).json()
-        answer_dl_1 = requests.get('http://0.0.0.0:8060/chat_v1/'+str(test_questions.iloc[i, 0])).json()
-        answer_dl_2 = requests.get('http://0.0.0.0:8060/chat_v2/'+str(test_questions.iloc[i, 0])).json()
-        answer_ndl = answer_ndl["choices"][0]["text"]
-        answer_dl_1 = answer_dl_1["choices"][0]["text"]
-        answer_dl_2 = answer_dl_2["choices"][0]["text"]
-
-        test_questions.iloc[i, 1] = answer_ndl
-        test_questions.iloc[i, 2] = answer_dl_1
-        test_questions.iloc[i, 3] = answer_dl_2
+    answers = asyncio.run(fetch_answers(test_questions.iloc[:, 0].astype(str).tolist(), base_url, api_key, concurrency))
+
+    # replace whole columns, the empty answer columns are read as floats
+    for column, endpoint in zip(test_questions.columns[1:4], ENDPOINTS):
+        test_questions[column] = answers[endpoint]
 
     # save the answers to the test questions
     test_questions.to_csv("../performance_testing/test_answers.csv", index=False)
@@ -38,10 +73,12 @@ if __name__ == "__main__":
                     prog='testing',
                     description='This script is used to get the answers using different QnA Pipelines to the test questions.')
     parser.add_argument('test_questions_file_path', type=str, help='Path to the .csv file containing the test questions')
-    
+    parser.add_argument('--url', type=str, default="http://0.0.0.0:8060", help='Url of the server')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of requests sent at the same time')
+
     # parse arguments
     args = parser.parse_args()
     test_questions_file_path = args.test_questions_file_path
 
     # call function to get the answers to the test questions
-    get_answers(test_questions_file_path)
\ No newline at end of file
+    get_answers(test_questions_file_path, args.url, args.concurrency)
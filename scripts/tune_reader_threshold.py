@@ -0,0 +1,104 @@
+# library imports
+from haystack import Pipeline
+from haystack.nodes import FARMReader, DensePassageRetriever
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import os
+from tqdm import tqdm
+
+from helper_functions import get_elasticsearch_document_store
+from answer_selection import best_answer, span_window
+
+logging.getLogger("haystack").setLevel(logging.ERROR)
+
+def reader_pipeline():
+    """
+    Function to initialize the DPR retriever and reader pipeline used by chat_v1 and chat_v2.
+
+    Args:
+        None
+
+    Returns:
+        haystack.Pipeline: retriever and reader pipeline
+    """
+
+    document_store = get_elasticsearch_document_store(os.environ.get("ELASTICSEARCH_HOST", "localhost"), "document")
+    dpr_retriever = DensePassageRetriever(
+        document_store=document_store,
+        query_embedding_model="facebook/dpr-question_encoder-single-nq-base",
+        passage_embedding_model="facebook/dpr-ctx_encoder-single-nq-base"
+    )
+    reader = FARMReader(model_name_or_path="deepset/roberta-base-squad2", use_gpu=True)
+
+    pipeline = Pipeline()
+    pipeline.add_node(component=dpr_retriever, name="Retriever", inputs=["Query"])
+    pipeline.add_node(component=reader, name="Reader", inputs=["Retriever"])
+    return pipeline
+
+def reader_answers(test_questions_file_path, context_window):
+    """
+    Function to get the best reader answer, its confidence and the generator context of every test question.
+
+    Args:
+        test_questions_file_path (str): Path to the .csv file containing the test questions
+        context_window (int): Number of characters around the answer span passed to the generator
+
+    Returns:
+        pd.DataFrame: question, confidence, extractive answer and generator context
+    """
+
+    pipeline = reader_pipeline()
+    questions = pd.read_csv(test_questions_file_path).iloc[:, 0].tolist()
+
+    rows = []
+    for question in tqdm(questions):
+        prediction = pipeline.run(query=question, params={"Retriever": {"top_k": 10}, "Reader": {"top_k": 5}})
+        answer, document = best_answer(prediction["answers"], prediction["documents"])
+        rows.append({
+            "questions": question,
+            "confidence": answer.score if answer is not None else np.nan,
+            "extractive_answer": answer.answer if answer is not None else None,
+            "generator_context": span_window(document.content, answer, context_window) if answer is not None else None
+        })
+
+    return pd.DataFrame(rows)
+
+def sweep(answers, thresholds):
+    """
+    Function to get the share of questions answered by the reader span for every threshold.
+
+    Args:
+        answers (pd.DataFrame): output of reader_answers
+        thresholds (list): confidence thresholds
+
+    Returns:
+        pd.DataFrame: share of extractive answers per threshold
+    """
+
+    return pd.DataFrame([
+        {"threshold": threshold, "extractive_share": (answers["confidence"] >= threshold).mean()}
+        for threshold in thresholds
+    ])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='tune_reader_threshold',
+                    description='This script gets the reader confidence of the test questions to tune READER_CONFIDENCE_THRESHOLD.')
+    parser.add_argument('test_questions_file_path', type=str, help='Path to the .csv file containing the test questions')
+    parser.add_argument('--test_answers_file_path', type=str, default='../performance_testing/test_answers.csv', help='Path to the .csv file with the generated answers to compare with')
+    parser.add_argument('--output', type=str, default='../performance_testing/reader_confidence.csv', help='Path of the .csv file the answers are saved to')
+    parser.add_argument('--context_window', type=int, default=600, help='Number of characters around the answer span passed to the generator')
+
+    # parse arguments
+    args = parser.parse_args()
+
+    # get the reader answers, and put the generated answers next to them for manual comparison
+    answers = reader_answers(args.test_questions_file_path, args.context_window)
+    if os.path.exists(args.test_answers_file_path):
+        answers = answers.merge(pd.read_csv(args.test_answers_file_path)[["questions", "answer_dl1", "answer_dl2"]], on="questions", how="left")
+    answers.sort_values(by="confidence", ascending=False).to_csv(args.output, index=False)
+
+    # print how many questions skip the generator at every threshold
+    print(sweep(answers, [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99]).round(2).to_string())